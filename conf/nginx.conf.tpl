@@ -23,6 +23,14 @@ http {
   upstream web { server unix:/tmp/gunicorn-web.sock fail_timeout=0; }
   upstream websocket { server unix:/tmp/gunicorn-websocket.sock fail_timeout=0; }
 
+  # Anonymous search and badge responses which the app marks as cacheable for
+  # shared caches (see h.http_cache.ttl in conf/app.ini) are kept here for the
+  # response's s-maxage. Open source nginx can't purge entries by their
+  # Surrogate-Key, so set h.http_cache.purge_url only for a cache which can,
+  # such as Varnish with the xkey module.
+  proxy_cache_path /var/lib/hypothesis/nginx-cache levels=1:2 keys_zone=api:10m
+                   max_size=256m inactive=10m;
+
   server {
     listen 5000;
 
@@ -40,6 +48,31 @@ http {
       return 499;
     }
 
+    location ~ ^/api/(search|badge)$ {
+      proxy_cache api;
+      proxy_cache_key $scheme$host$request_uri;
+      proxy_cache_lock on;
+      # Requests with credentials always go to the app, and their responses
+      # aren't stored, so the Vary header (which downstream caches need) can
+      # be ignored here rather than splitting the cache by cookie.
+      proxy_cache_bypass $http_authorization $cookie_auth;
+      proxy_no_cache $http_authorization $cookie_auth;
+      proxy_ignore_headers Vary;
+      proxy_hide_header Surrogate-Key;
+      add_header X-Cache-Status $upstream_cache_status;
+
+      proxy_pass http://web;
+      proxy_http_version 1.1;
+      proxy_connect_timeout 10s;
+      proxy_send_timeout 10s;
+      proxy_read_timeout 10s;
+      proxy_redirect off;
+      proxy_set_header Host $host;
+      proxy_set_header X-Forwarded-Server $http_host;
+      proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+      proxy_set_header X-Request-Start "t=${msec}";
+    }
+
     location ~ ^/(|_status|a|u|t|account|admin|api|app|app.html|assets|docs/help|embed\.js.*|forgot-password|login|logout|activate|groups|notification|robots\.txt|search|signup|stream|stream\.atom|stream\.rss|users|viewer|welcome)(/|$) {
       proxy_pass http://web;
       proxy_http_version 1.1;
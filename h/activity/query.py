@@ -115,7 +115,8 @@ def execute(request, query, page_size):
 
     # Load all referenced annotations from the database, bucket them, and add
     # the buckets to result.timeframes.
-    anns = fetch_annotations(request.db, search_result.annotation_ids)
+    anns = fetch_annotations(request.db, search_result.annotation_ids,
+                             cache=request.find_service(name='annotation_cache'))
     result.timeframes.extend(bucketing.bucket(anns))
 
     # Fetch all groups
@@ -150,12 +151,12 @@ def aggregations_for(query):
 
 
 @newrelic.agent.function_trace()
-def fetch_annotations(session, ids):
+def fetch_annotations(session, ids, cache=None):
     def load_documents(query):
         return query.options(subqueryload(Annotation.document))
 
     annotations = storage.fetch_ordered_annotations(
-        session, ids, query_processor=load_documents)
+        session, ids, query_processor=load_documents, cache=cache)
 
     return annotations
 
@@ -164,8 +165,17 @@ def fetch_annotations(session, ids):
 def _execute_search(request, query, page_size):
     search = Search(request, stats=request.stats)
     search.append_filter(TopLevelAnnotationsFilter())
-    for agg in aggregations_for(query):
-        search.append_aggregation(agg)
+
+    # Facets don't depend on the page being viewed, so if we've already
+    # computed them for this query we can skip the aggregations entirely.
+    facet_cache = request.find_service(name='facet_cache')
+    facet_group = query['group'] if _single_entry(query, 'group') else None
+    facet_key = _facet_key(request, query)
+    facets, facet_generation = facet_cache.get(facet_group, facet_key)
+
+    if facets is None:
+        for agg in aggregations_for(query):
+            search.append_aggregation(agg)
 
     query = query.copy()
     page = request.params.get('page', 1)
@@ -183,6 +193,13 @@ def _execute_search(request, query, page_size):
     query['offset'] = (page - 1) * page_size
 
     search_result = search.run(query)
+
+    if facets is None:
+        facet_cache.set(facet_group, facet_key, search_result.aggregations,
+                        facet_generation)
+    else:
+        search_result = search_result._replace(aggregations=facets)
+
     return search_result
 
 
@@ -191,5 +208,11 @@ def _fetch_groups(session, pubids):
     return session.query(Group).filter(Group.pubid.in_(pubids))
 
 
+def _facet_key(request, query):
+    # The results of the search depend on who is searching, as the auth and
+    # NIPSA filters let users see their own private or NIPSA'd annotations.
+    return (request.authenticated_userid, tuple(sorted(query.items())))
+
+
 def _single_entry(query, key):
     return len(query.getall(key)) == 1
@@ -11,6 +11,7 @@ import transaction
 from pyramid.settings import asbool
 from pyramid.tweens import EXCVIEW
 
+from h import outbox
 from h.config import configure
 from h.views.client import DEFAULT_CLIENT_URL
 
@@ -54,10 +55,18 @@ def includeme(config):
 
     config.add_subscriber('h.subscribers.add_renderer_globals',
                           'pyramid.events.BeforeRender')
-    config.add_subscriber('h.subscribers.publish_annotation_event',
-                          'memex.events.AnnotationEvent')
-    config.add_subscriber('h.subscribers.send_reply_notifications',
-                          'memex.events.AnnotationEvent')
+    # With the outbox enabled, realtime messages for annotation events are
+    # published by the outbox drainer (see h.outbox).
+    for event in ('memex.events.AnnotationEvent',
+                  'memex.events.AnnotationBatchEvent'):
+        if not outbox.enabled(settings):
+            config.add_subscriber('h.subscribers.publish_annotation_event',
+                                  event)
+        config.add_subscriber('h.subscribers.send_reply_notifications', event)
+        config.add_subscriber('h.subscribers.invalidate_annotation_cache',
+                              event)
+        config.add_subscriber('h.subscribers.invalidate_facet_cache', event)
+        config.add_subscriber('h.subscribers.purge_http_cache', event)
 
     config.add_tween('h.tweens.conditional_http_tween_factory', under=EXCVIEW)
     config.add_tween('h.tweens.redirect_tween_factory')
@@ -65,7 +74,7 @@ def includeme(config):
     config.add_tween('h.tweens.auth_token')
     config.add_tween('h.tweens.security_header_tween_factory')
 
-    config.add_renderer('csv', 'h.renderers.CSV')
+    config.include('h.renderers')
     config.add_request_method(in_debug_mode, 'debug', reify=True)
 
     config.include('pyramid_jinja2')
@@ -61,6 +61,7 @@ celery.conf.update(
     CELERY_IMPORTS=(
         'h.tasks.admin',
         'h.tasks.cleanup',
+        'h.tasks.http_cache',
         'h.tasks.indexer',
         'h.tasks.mailer',
         'h.tasks.nipsa',
@@ -68,6 +69,7 @@ celery.conf.update(
     CELERY_ROUTES={
         'h.tasks.indexer.add_annotation': 'indexer',
         'h.tasks.indexer.delete_annotation': 'indexer',
+        'h.tasks.indexer.index_annotations': 'indexer',
     },
     CELERY_TASK_SERIALIZER='json',
     CELERY_QUEUES=[
@@ -82,8 +84,10 @@ celery.conf.update(
     ],
     # Only accept one task at a time. This also probably isn't what we want
     # (especially not for, say, a search indexer task) but it makes the
-    # behaviour consistent with the previous NSQ-based worker:
-    CELERYD_PREFETCH_MULTIPLIER=1,
+    # behaviour consistent with the previous NSQ-based worker. Workers
+    # consuming the indexer queue when batched indexing is enabled must raise
+    # this so that they can prefetch a whole batch (see h.tasks.indexer).
+    CELERYD_PREFETCH_MULTIPLIER=int(os.environ.get('CELERYD_PREFETCH_MULTIPLIER', 1)),
 )
 
 
@@ -105,7 +109,12 @@ def reset_feature_flags(sender, **kwargs):
 
 @signals.task_prerun.connect
 def reset_nipsa_cache(sender, **kwargs):
-    """Reset nipsa service cache before running each task."""
+    """
+    Reset nipsa service cache before running each task.
+
+    The flagged userids are shared by all the tasks run by a worker process,
+    so this only reloads them if they have changed.
+    """
     svc = sender.app.request.find_service(name='nipsa')
     svc.clear()
 
@@ -14,15 +14,18 @@ from h import __version__
 log = logging.getLogger('h')
 
 SUBCOMMANDS = (
+    'h.cli.commands.annotations.annotations',
     'h.cli.commands.authclient.authclient',
     'h.cli.commands.celery.celery',
     'h.cli.commands.devserver.devserver',
+    'h.cli.commands.export.export',
     'h.cli.commands.groups.groups',
     'h.cli.commands.init.init',
     'h.cli.commands.initdb.initdb',
     'h.cli.commands.migrate.migrate',
     'h.cli.commands.move_uri.move_uri',
     'h.cli.commands.normalize_uris.normalize_uris',
+    'h.cli.commands.outbox.outbox',
     'h.cli.commands.search.search',
     'h.cli.commands.shell.shell',
     'h.cli.commands.user.user',
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import itertools
+import multiprocessing
+
+import click
+import sqlalchemy as sa
+
+from memex import markdown
+from memex import models
+
+# The number of annotations which are rendered and updated at a time.
+BATCH_SIZE = 1000
+
+
+@click.group()
+def annotations():
+    """Manage annotations."""
+
+
+@annotations.command()
+@click.option('--processes', default=1, type=click.IntRange(min=1),
+              help='The number of worker processes to render with.')
+@click.option('--batch-size', default=BATCH_SIZE, type=click.IntRange(min=1),
+              help='The number of annotations to render and update at a '
+                   'time.')
+@click.pass_context
+def rerender(ctx, processes, batch_size):
+    """
+    Re-render the text of all annotations.
+
+    Renders the Markdown text of every annotation again, and updates the
+    stored HTML of those annotations whose rendering has changed. Run this
+    after changing the rules used to render or sanitize annotation text.
+    """
+    request = ctx.obj['bootstrap']()
+
+    count = rerender_annotations(request, processes=processes,
+                                 batch_size=batch_size)
+
+    click.echo('Re-rendered the text of {:d} annotations.'.format(count))
+
+
+def rerender_annotations(request, processes=1, batch_size=BATCH_SIZE):
+    """
+    Re-render the text of all annotations, in batches.
+
+    Each batch is committed separately. Rendering is done by ``processes``
+    worker processes, while the database is read and updated by this process.
+
+    :returns: the number of annotations whose rendered text changed
+    """
+    pool = multiprocessing.Pool(processes) if processes > 1 else None
+
+    try:
+        count = 0
+        last_id = None
+        while True:
+            request.tm.begin()
+            rows = _fetch_batch(request.db, last_id, batch_size)
+            if rows:
+                rendered = _render_many(pool, processes,
+                                        [text for _, text, _ in rows])
+                count += _update_changed(request.db, rows, rendered)
+            request.tm.commit()
+
+            if len(rows) < batch_size:
+                break
+            last_id = rows[-1][0]
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return count
+
+
+def _fetch_batch(session, last_id, batch_size):
+    table = models.Annotation.__table__
+    query = (sa.select([table.c.id, table.c.text, table.c.text_rendered])
+             .order_by(table.c.id)
+             .limit(batch_size))
+    if last_id is not None:
+        query = query.where(table.c.id > last_id)
+    return session.execute(query).fetchall()
+
+
+def _update_changed(session, rows, rendered):
+    table = models.Annotation.__table__
+    changed = [{'_id': id_, '_text_rendered': new}
+               for (id_, _, old), new in itertools.izip(rows, rendered)
+               if new != old]
+    if changed:
+        session.execute(
+            table.update()
+            .where(table.c.id == sa.bindparam('_id'))
+            .values(text_rendered=sa.bindparam('_text_rendered')),
+            changed)
+    return len(changed)
+
+
+def _render_many(pool, processes, texts):
+    if pool is None:
+        return [markdown.render(text) for text in texts]
+
+    # Hand each worker a few large chunks of the batch, rather than sending
+    # the texts to the pool one at a time.
+    chunksize = max(1, len(texts) // (processes * 4))
+    return pool.map(markdown.render, texts, chunksize)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+import click
+
+from h import export as export_
+from h import renderers
+from h.cli.commands.search import DateTime
+
+
+@click.command()
+@click.option('--user', help='Only export annotations by this userid.')
+@click.option('--group', help='Only export annotations in the group with '
+                              'this pubid.')
+@click.option('--uri', multiple=True,
+              help='Only export annotations of the document at this URI. '
+                   'May be given more than once.')
+@click.option('--since', type=DateTime(),
+              help='Only export annotations updated at or after this time.')
+@click.option('--until', type=DateTime(),
+              help='Only export annotations updated before this time.')
+@click.option('--output', '-o', type=click.File('wb'), default='-',
+              help='The file to write the export to (default: stdout).')
+@click.option('--batch-size', default=export_.DEFAULT_BATCH_SIZE,
+              type=click.IntRange(min=1),
+              help='The number of annotations to load and present at a time.')
+@click.pass_context
+def export(ctx, user, group, uri, since, until, output, batch_size):
+    """
+    Export annotations as newline-delimited JSON.
+
+    Writes every annotation which isn't deleted and which matches the given
+    filters, shared or not, one JSON object per line in the order they were
+    last updated.
+    """
+    request = ctx.obj['bootstrap']()
+
+    filters = {'userid': user, 'groupid': group, 'uris': list(uri),
+               'since': since, 'until': until}
+    lines = export_.export_annotations(request.registry['sqlalchemy.engine'],
+                                       filters,
+                                       request.find_service(name='links'),
+                                       request.auth_domain,
+                                       renderers.get_encoder(request.registry),
+                                       batch_size=batch_size)
+
+    count = 0
+    for line in lines:
+        output.write(line)
+        count += 1
+
+    click.echo('Exported {:d} annotations.'.format(count), err=True)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import click
+
+from h import outbox as outbox_
+
+
+@click.group()
+def outbox():
+    """Manage the annotation event outbox."""
+
+
+@outbox.command()
+@click.option('--batch-size', default=outbox_.DEFAULT_BATCH_SIZE,
+              type=click.IntRange(min=1),
+              help='The maximum number of events to publish at once.')
+@click.option('--interval', default=1.0, type=float,
+              help='Seconds to wait before checking an empty outbox again.')
+@click.option('--once', is_flag=True,
+              help='Exit once the outbox is empty.')
+@click.pass_context
+def drain(ctx, batch_size, interval, once):
+    """
+    Publish annotation events from the outbox.
+
+    Publishes events recorded in the outbox to the indexer queue and the
+    realtime exchange, in batches, until interrupted (or until the outbox is
+    empty if --once is given).
+    """
+    request = ctx.obj['bootstrap']()
+
+    while True:
+        try:
+            published = outbox_.drain(request, batch_size=batch_size)
+            request.tm.commit()
+        except Exception:
+            request.tm.abort()
+            raise
+
+        if published == batch_size:
+            continue
+        if once:
+            break
+        time.sleep(interval)
@@ -3,9 +3,31 @@
 import os
 
 import click
+from dateutil import parser
+from dateutil import tz
 
 from h import indexer
 from memex.search import config
+from memex.search.index import PG_FETCH_SIZE
+
+
+class DateTime(click.ParamType):
+
+    """A click parameter type for ISO 8601 dates and times."""
+
+    name = 'datetime'
+
+    def convert(self, value, param, ctx):
+        try:
+            result = parser.parse(value)
+        except ValueError:
+            self.fail('{} is not a valid date and time'.format(value),
+                      param, ctx)
+
+        # Annotation timestamps are naive UTC datetimes.
+        if result.tzinfo is not None:
+            result = result.astimezone(tz.tzutc()).replace(tzinfo=None)
+        return result
 
 
 @click.group()
@@ -14,21 +36,66 @@ def search():
 
 
 @search.command()
+@click.option('--processes', default=1, type=click.IntRange(min=1),
+              help='The number of worker processes to index with.')
+@click.option('--resume', is_flag=True,
+              help='Resume an interrupted reindex.')
+@click.option('--fetch-size', default=PG_FETCH_SIZE,
+              type=click.IntRange(min=1),
+              help='The number of annotations to fetch from the database at '
+                   'a time.')
 @click.pass_context
-def reindex(ctx):
+def reindex(ctx, processes, resume, fetch_size):
     """
     Reindex all annotations.
 
     Creates a new search index from the data in PostgreSQL and atomically
     updates the index alias. This requires that the index is aliased already,
     and will raise an error if it is not.
+
+    Progress is saved as the reindex runs, and a reindex which fails or is
+    interrupted can be continued with --resume.
     """
 
     os.environ['ELASTICSEARCH_CLIENT_TIMEOUT'] = '30'
 
     request = ctx.obj['bootstrap']()
 
-    indexer.reindex(request.db, request.es, request)
+    try:
+        indexer.reindex(request.db, request.es, request,
+                        processes=processes,
+                        resume=resume,
+                        fetch_size=fetch_size)
+    except RuntimeError as e:
+        raise click.ClickException(e.message)
+
+
+@search.command()
+@click.option('--since', type=DateTime(),
+              help='Only check annotations updated at or after this (UTC) '
+                   'date and time.')
+@click.pass_context
+def verify(ctx, since):
+    """
+    Find and repair differences between the database and the search index.
+
+    Compares annotations in the database with the documents in the search
+    index, window by window, and reindexes or deletes only the documents which
+    differ. Use --since to quickly check recent changes, e.g. after an
+    incident.
+    """
+
+    os.environ['ELASTICSEARCH_CLIENT_TIMEOUT'] = '30'
+
+    request = ctx.obj['bootstrap']()
+
+    result = indexer.verify(request.db, request.es, request, since=since)
+
+    click.echo('checked {} windows, {} differed: reindexed {} and deleted {} '
+               'annotations'.format(result.windows,
+                                    result.mismatched_windows,
+                                    result.reindexed,
+                                    result.deleted))
 
 
 @search.command('update-settings')
@@ -52,8 +52,11 @@ SETTINGS = [
     EnvSetting('es.client.max_retries', 'ELASTICSEARCH_CLIENT_MAX_RETRIES', type=int),
     EnvSetting('es.client.retry_on_timeout', 'ELASTICSEARCH_CLIENT_RETRY_ON_TIMEOUT', type=asbool),
     EnvSetting('es.client.timeout', 'ELASTICSEARCH_CLIENT_TIMEOUT', type=float),
+    EnvSetting('es.coalesce_searches', 'ELASTICSEARCH_COALESCE_SEARCHES', type=asbool),
     EnvSetting('es.host', 'ELASTICSEARCH_HOST'),
     EnvSetting('es.index', 'ELASTICSEARCH_INDEX'),
+    EnvSetting('es.slow_query_threshold', 'ELASTICSEARCH_SLOW_QUERY_THRESHOLD', type=int),
+    EnvSetting('es.query_report_interval', 'ELASTICSEARCH_QUERY_REPORT_INTERVAL', type=int),
     EnvSetting('es.aws.access_key_id', 'ELASTICSEARCH_AWS_ACCESS_KEY_ID'),
     EnvSetting('es.aws.region', 'ELASTICSEARCH_AWS_REGION'),
     EnvSetting('es.aws.secret_access_key', 'ELASTICSEARCH_AWS_SECRET_ACCESS_KEY'),
@@ -85,6 +88,11 @@ SETTINGS = [
     # *not* toggle functionality based on this value. It is intended as a
     # label only.
     EnvSetting('h.env', 'ENV'),
+    EnvSetting('h.http_cache.purge_url', 'HTTP_CACHE_PURGE_URL'),
+    EnvSetting('h.http_cache.ttl', 'HTTP_CACHE_TTL', type=int),
+    EnvSetting('h.indexer.batch', 'INDEXER_BATCH', type=asbool),
+    EnvSetting('h.nipsa.query_time', 'NIPSA_QUERY_TIME', type=asbool),
+    EnvSetting('h.outbox', 'OUTBOX', type=asbool),
     EnvSetting('h.proxy_auth', 'PROXY_AUTH', type=asbool),
     # Sentry DSNs for frontend code should be of the public kind, lacking the
     # password component in the DSN URI.
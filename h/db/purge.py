@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+"""
+Delete large numbers of rows without holding one huge transaction open.
+
+Deleting every row which matches a condition with a single ``DELETE``
+statement locks all of those rows until the transaction commits, writes all
+of the change to the WAL at once and holds back vacuum and replication. The
+:py:func:`purge` helper instead deletes the rows in small batches, each in its
+own transaction, optionally throttled and stopping after a time budget, so
+that any rows left over are deleted by the next run.
+"""
+
+from __future__ import division, unicode_literals
+
+import time
+
+import sqlalchemy as sa
+
+__all__ = ('purge',)
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def purge(query, commit, batch_size=DEFAULT_BATCH_SIZE, rate=None,
+          time_budget=None, clock=time.time, sleep=time.sleep):
+    """
+    Delete the rows matched by an ORM query, in batches.
+
+    The primary keys of up to ``batch_size`` matching rows are selected (and
+    locked, skipping rows locked by another transaction), those rows are
+    deleted, and ``commit`` is called to commit the batch before the next one
+    is selected. The query must be for a single mapped class with a
+    single-column primary key.
+
+    :param query: a query for the rows to delete
+    :param commit: a function which commits the current transaction
+    :param batch_size: the maximum number of rows to delete per transaction
+    :param rate: if given, the maximum number of rows to delete per second,
+        on average
+    :param time_budget: if given, the number of seconds after which no further
+        batches are started
+    :returns: the number of rows deleted
+    """
+    model = query.column_descriptions[0]['entity']
+    pk = sa.inspect(model).primary_key[0]
+    session = query.session
+
+    start = clock()
+    deleted = 0
+    while True:
+        ids = [id_ for id_, in (query.with_entities(pk)
+                                .order_by(pk)
+                                .limit(batch_size)
+                                .with_for_update(skip_locked=True))]
+        if not ids:
+            break
+
+        session.query(model) \
+            .filter(pk.in_(ids)) \
+            .delete(synchronize_session=False)
+        commit()
+        deleted += len(ids)
+
+        if len(ids) < batch_size:
+            break
+
+        elapsed = clock() - start
+        delay = deleted / rate - elapsed if rate else 0
+        if time_budget is not None and elapsed + max(delay, 0) >= time_budget:
+            break
+        if delay > 0:
+            sleep(delay)
+
+    return deleted
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+"""
+Export annotations as newline-delimited JSON.
+
+An export can cover any number of annotations, so rather than loading the
+matching annotations into memory and rendering them as one JSON document, the
+ids of the matching annotations are read from a server-side cursor, and each
+batch of annotations is loaded, presented and encoded as one JSON object per
+line before the next batch is read. However many annotations are exported,
+only one batch of them is held in memory at a time.
+
+An export is read in its own REPEATABLE READ transaction, on its own database
+connection, so that it sees a consistent snapshot of the annotations and can
+be streamed after the request which started it has finished with
+``request.db``.
+"""
+
+from __future__ import unicode_literals
+
+import contextlib
+import itertools
+
+from dateutil import parser
+from dateutil import tz
+import sqlalchemy as sa
+from sqlalchemy.orm import subqueryload
+
+from memex import models
+from memex import uri as uri_util
+
+from h import db
+from h import storage
+from h.presenters import AnnotationJSONBatchPresenter
+from h.services.groupfinder import GroupfinderService
+
+__all__ = (
+    'annotations_query',
+    'export_annotations',
+    'parse_datetime',
+    'snapshot_session',
+    'stream_annotations',
+)
+
+# The media type of an export.
+CONTENT_TYPE = 'application/x-ndjson'
+
+# The number of annotations which are loaded and presented at a time.
+DEFAULT_BATCH_SIZE = 500
+
+
+def annotations_query(session, userid=None, groupid=None, uris=None,
+                      since=None, until=None, readable_by=None,
+                      exclude_userids=None):
+    """
+    Return a query for the annotations to export.
+
+    Deleted annotations are never exported.
+
+    :param userid: only export annotations by this user
+    :param groupid: only export annotations in the group with this pubid
+    :param uris: only export annotations of the documents at these URIs
+    :type uris: list of unicode strings
+    :param since: only export annotations updated at or after this time
+    :type since: datetime.datetime
+    :param until: only export annotations updated before this time
+    :type until: datetime.datetime
+    :param readable_by: only export annotations which are shared, or which
+        were made by the user with this userid
+    :param exclude_userids: don't export the annotations of these users
+    :type exclude_userids: set of unicode strings
+    """
+    query = session.query(models.Annotation) \
+        .filter(models.Annotation.deleted.is_(False))
+
+    if userid is not None:
+        query = query.filter(models.Annotation.userid == userid)
+    if groupid is not None:
+        query = query.filter(models.Annotation.groupid == groupid)
+    if uris:
+        query = query.filter(models.Annotation.target_uri_normalized.in_(
+            _expand_uris(session, uris)))
+    if since is not None:
+        query = query.filter(models.Annotation.updated >= since)
+    if until is not None:
+        query = query.filter(models.Annotation.updated < until)
+    if readable_by is not None:
+        query = query.filter(sa.or_(models.Annotation.shared.is_(True),
+                                    models.Annotation.userid == readable_by))
+    if exclude_userids:
+        query = query.filter(
+            ~models.Annotation.userid.in_(list(exclude_userids)))
+
+    return query
+
+
+def stream_annotations(session, query, group_service, links_service, encoder,
+                       batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Yield the annotations matched by ``query`` as lines of JSON.
+
+    The annotations are exported in the order they were last updated, and
+    each one is presented as it would be by the API and encoded with
+    ``encoder`` as a line of UTF-8 encoded bytes.
+
+    :param query: a query for the annotations to export, as returned by
+        :py:func:`annotations_query`
+    :param encoder: the JSON encoder to use
+    :type encoder: h.renderers.JSONEncoder
+    """
+    ids = iter(query.with_entities(models.Annotation.id)
+               .order_by(models.Annotation.updated, models.Annotation.id)
+               .yield_per(batch_size))
+
+    while True:
+        batch = [id_ for id_, in itertools.islice(ids, batch_size)]
+        if not batch:
+            break
+
+        annotations = storage.fetch_ordered_annotations(
+            session, batch, query_processor=_eager_load_documents)
+        presenter = AnnotationJSONBatchPresenter(annotations,
+                                                 group_service,
+                                                 links_service)
+        for row in presenter.asdicts():
+            yield _utf8(encoder.dumps(row)) + b'\n'
+
+        # Don't let the session hold on to the annotations already exported.
+        session.expunge_all()
+
+
+def export_annotations(engine, filters, links_service, auth_domain, encoder,
+                       batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Yield the annotations matching ``filters`` as lines of JSON.
+
+    The export is read from its own database session, which is opened when
+    the first line is requested and closed when the last line has been
+    yielded (or the iterator is closed), so the iterator can be used as a
+    response's ``app_iter``.
+
+    :param engine: the engine to connect to the database with
+    :param filters: the keyword arguments to pass to
+        :py:func:`annotations_query`
+    :type filters: dict
+    """
+    with snapshot_session(engine) as session:
+        query = annotations_query(session, **filters)
+        group_service = GroupfinderService(session, auth_domain)
+        for line in stream_annotations(session, query, group_service,
+                                       links_service, encoder,
+                                       batch_size=batch_size):
+            yield line
+
+
+@contextlib.contextmanager
+def snapshot_session(engine):
+    """
+    Return a context manager for a read-only session on its own connection.
+
+    The session reads from a REPEATABLE READ transaction, so every query in it
+    sees the same snapshot of the database. The transaction is rolled back
+    and the connection returned to the pool on leaving the context.
+    """
+    connection = engine.connect().execution_options(
+        isolation_level='REPEATABLE READ')
+    transaction = connection.begin()
+    session = db.Session(bind=connection)
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+
+def parse_datetime(value):
+    """
+    Parse an ISO 8601 date and time as a naive UTC datetime.
+
+    :raises ValueError: if ``value`` isn't a valid date and time
+    """
+    try:
+        result = parser.parse(value)
+    except OverflowError:
+        raise ValueError('{} is out of range'.format(value))
+
+    # Annotation timestamps are naive UTC datetimes.
+    if result.tzinfo is not None:
+        result = result.astimezone(tz.tzutc()).replace(tzinfo=None)
+    return result
+
+
+def _expand_uris(session, uris):
+    normalized = set()
+    for uri in uris:
+        normalized.update(uri_util.normalize(u)
+                          for u in storage.expand_uri(session, uri))
+    return list(normalized)
+
+
+def _eager_load_documents(query):
+    return query.options(subqueryload(models.Annotation.document))
+
+
+def _utf8(text):
+    if isinstance(text, bytes):
+        return text
+    return text.encode('utf-8')
@@ -1,12 +1,23 @@
 # -*- coding: utf-8 -*-
 
+from pyramid.settings import asbool
+
 from h.indexer.reindexer import reindex
+from h.indexer.verifier import verify
 
 __all__ = (
     'reindex',
+    'verify',
 )
 
 
 def includeme(config):
+    # With the outbox enabled, indexer tasks for annotation events are queued
+    # by the outbox drainer (see h.outbox).
+    if asbool(config.registry.settings.get('h.outbox', False)):
+        return
+
     config.add_subscriber('h.indexer.subscribers.subscribe_annotation_event',
                           'memex.events.AnnotationEvent')
+    config.add_subscriber('h.indexer.subscribers.subscribe_annotation_event',
+                          'memex.events.AnnotationBatchEvent')
@@ -1,47 +1,215 @@
 # -*- coding: utf-8 -*-
 
+from __future__ import division
+
+import datetime
+import json
 import logging
+import multiprocessing
+import time
+
+from dateutil import parser
 
+from memex.search.client import get_client
 from memex.search.config import (
     configure_index,
     get_aliased_index,
     update_aliased_index,
 )
 from memex.search.index import BatchIndexer
+from memex.search.index import PG_FETCH_SIZE
+from memex.search.index import PG_WINDOW_SIZE
+from memex.search.index import Window
+from memex.search.index import annotation_windows
+
+from h.celery import celery
 
 log = logging.getLogger(__name__)
 
 SETTING_NEW_INDEX = u'reindex.new_index'
 
+# The celery remote control command broadcast to workers when a reindex starts
+# or finishes, so that they reload SETTING_NEW_INDEX (see h.tasks.indexer).
+REINDEX_STATE_CHANGED = 'reindex_state_changed'
+
+# The windows of annotations to reindex, and which of them have been indexed,
+# stored so that an interrupted reindex can be resumed.
+SETTING_PROGRESS = u'reindex.progress'
+
+# State of a reindex worker process, set up by _init_worker.
+_worker = {}
+
 
-def reindex(session, es, request):
-    """Reindex all annotations into a new index, and update the alias."""
+def reindex(session, es, request, processes=1, resume=False,
+            fetch_size=PG_FETCH_SIZE):
+    """
+    Reindex all annotations into a new index, and update the alias.
 
-    if get_aliased_index(es) is None:
+    Annotations are split into windows, which are indexed by ``processes``
+    worker processes. Each completed window is checkpointed in the settings
+    service, and if the reindex fails, calling this again with
+    ``resume=True`` indexes only the windows which weren't completed.
+
+    Annotations are read from server-side cursors, ``fetch_size`` rows at a
+    time.
+
+    Until the reindex is either completed or resumed and completed, the
+    indexer workers keep writing annotation updates to the new index as well
+    as the current one.
+    """
+    if not resume and get_aliased_index(es) is None:
         raise RuntimeError('cannot reindex if current index is not aliased')
 
     settings = request.find_service(name='settings')
 
-    new_index = configure_index(es)
+    if resume:
+        new_index = settings.get(SETTING_NEW_INDEX)
+        progress = settings.get(SETTING_PROGRESS)
+        if new_index is None or progress is None:
+            raise RuntimeError('there is no interrupted reindex to resume')
+        windows, done = _load_progress(progress)
+        log.info('resuming reindex into %s: %d of %d windows already indexed',
+                 new_index, len(done), len(windows))
+    else:
+        new_index = configure_index(es)
+        windows = annotation_windows(session)
+        done = set()
 
-    try:
         settings.put(SETTING_NEW_INDEX, new_index)
+        settings.put(SETTING_PROGRESS, _dump_progress(windows, done))
         request.tm.commit()
+        _broadcast_state_changed()
 
-        indexer = BatchIndexer(session, es, request, target_index=new_index, op_type='create')
+    pending = [(i, w) for i, w in enumerate(windows) if i not in done]
+    progress = _Progress(total=len(pending))
 
-        errored = indexer.index()
+    for i, errored in _index_windows(session, es, request, new_index,
+                                     pending, processes, fetch_size):
         if errored:
-            log.debug('failed to index {} annotations, retrying...'.format(
-                len(errored)))
-            errored = indexer.index(errored)
-            if errored:
-                log.warn('failed to index {} annotations: {!r}'.format(
-                    len(errored),
-                    errored))
+            log.warn('failed to index {} annotations: {!r}'.format(
+                len(errored),
+                errored))
+
+        done.add(i)
+        settings.put(SETTING_PROGRESS, _dump_progress(windows, done))
+        request.tm.commit()
 
-        update_aliased_index(es, new_index)
+        progress.update()
 
+    update_aliased_index(es, new_index)
+
+    settings.delete(SETTING_NEW_INDEX)
+    settings.delete(SETTING_PROGRESS)
+    request.tm.commit()
+    _broadcast_state_changed()
+
+
+def _broadcast_state_changed():
+    celery.control.broadcast(REINDEX_STATE_CHANGED)
+
+
+def _index_windows(session, es, request, new_index, windows, processes,
+                   fetch_size):
+    """
+    Index each of the ``(i, window)`` pairs in ``windows``.
+
+    :returns: an iterator of ``(i, errored)`` tuples, in the order in which the
+        windows finish being indexed
+    """
+    if processes <= 1:
+        indexer = _indexer(session, es, request, new_index, fetch_size)
+        for i, window in windows:
+            yield i, _index_window(indexer, window)
+        return
+
+    # Worker processes must not share the parent's database or Elasticsearch
+    # connections, so drop the pooled database connections before forking and
+    # give each worker its own Elasticsearch client.
+    session.get_bind().dispose()
+
+    pool = multiprocessing.Pool(processes,
+                                initializer=_init_worker,
+                                initargs=(request, new_index, fetch_size))
+    try:
+        for result in pool.imap_unordered(_worker_index_window, windows):
+            yield result
+        pool.close()
     finally:
-        settings.delete(SETTING_NEW_INDEX)
-        request.tm.commit()
+        pool.terminate()
+        pool.join()
+
+
+def _init_worker(request, new_index, fetch_size):
+    es = get_client(request.registry.settings)
+    _worker['indexer'] = _indexer(request.db, es, request, new_index,
+                                  fetch_size)
+
+
+def _worker_index_window(job):
+    i, window = job
+    return i, _index_window(_worker['indexer'], window)
+
+
+def _indexer(session, es, request, new_index, fetch_size):
+    return BatchIndexer(session, es, request,
+                        target_index=new_index,
+                        op_type='create',
+                        fetch_size=fetch_size)
+
+
+def _index_window(indexer, window):
+    errored = indexer.index_window(window)
+    if errored:
+        log.debug('failed to index {} annotations, retrying...'.format(
+            len(errored)))
+        errored = indexer.index(errored)
+    return sorted(errored)
+
+
+class _Progress(object):
+
+    """Logs the throughput and estimated time remaining of a reindex."""
+
+    def __init__(self, total, clock=time.time):
+        self.total = total
+        self.clock = clock
+        self.done = 0
+        self.started = clock()
+
+    def update(self):
+        self.done += 1
+
+        elapsed = self.clock() - self.started
+        rate = self.done * PG_WINDOW_SIZE / elapsed if elapsed else 0
+        eta = datetime.timedelta(
+            seconds=int(elapsed / self.done * (self.total - self.done)))
+
+        log.info('reindexed window {:d}/{:d}, rate={:.0f}/s, eta={}'.format(
+            self.done, self.total, rate, eta))
+
+
+def _dump_progress(windows, done):
+    return json.dumps({
+        'windows': [[_dump_bound(w.start), _dump_bound(w.end)]
+                    for w in windows],
+        'done': sorted(done),
+    })
+
+
+def _load_progress(value):
+    progress = json.loads(value)
+    windows = [Window(_load_bound(start), _load_bound(end))
+               for start, end in progress['windows']]
+    return windows, set(progress['done'])
+
+
+def _dump_bound(value):
+    if value is None:
+        return None
+    return value.isoformat()
+
+
+def _load_bound(value):
+    if value is None:
+        return None
+    return parser.parse(value)
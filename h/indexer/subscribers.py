@@ -1,10 +1,33 @@
 # -*- coding: utf-8 -*-
 
-from h.tasks.indexer import add_annotation, delete_annotation
+from pyramid.settings import asbool
+
+from memex.events import annotation_events
+
+from h.tasks.indexer import add_annotation, delete_annotation, index_annotations
 
 
 def subscribe_annotation_event(event):
-    if event.action in ['create', 'update']:
-        add_annotation.delay(event.annotation_id)
-    elif event.action == 'delete':
-        delete_annotation.delay(event.annotation_id)
+    for annotation_event in annotation_events(event):
+        queue_annotation_event(event.request.registry.settings,
+                               annotation_event.annotation_id,
+                               annotation_event.action)
+
+
+def queue_annotation_event(settings, annotation_id, action):
+    """Queue the indexer task(s) for an annotation event."""
+    if asbool(settings.get('h.indexer.batch', False)):
+        _queue_batched(annotation_id, action)
+        return
+
+    if action in ['create', 'update']:
+        add_annotation.delay(annotation_id)
+    elif action == 'delete':
+        delete_annotation.delay(annotation_id)
+
+
+def _queue_batched(annotation_id, action):
+    if action in ['create', 'update']:
+        index_annotations.delay(annotation_id, 'index')
+    elif action == 'delete':
+        index_annotations.delay(annotation_id, 'delete')
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+"""
+Incremental consistency checking between Postgres and the search index.
+
+Rather than rebuilding the whole index, :py:func:`verify` splits annotations
+into windows over ``Annotation.updated`` and compares a cheap digest of each
+window (the number of annotations and the sum of their ``updated``
+timestamps) between Postgres and Elasticsearch. Only windows whose digests
+differ are compared annotation by annotation, and only the annotations which
+differ are reindexed or marked as deleted.
+"""
+
+from __future__ import unicode_literals
+
+import collections
+import logging
+
+import sqlalchemy as sa
+from dateutil import parser
+from elasticsearch import helpers as es_helpers
+
+from h import models
+from memex.search.index import BatchIndexer
+from memex.search.index import Window
+from memex.search.index import annotation_windows
+from memex.util.query import column_window
+
+log = logging.getLogger(__name__)
+
+Result = collections.namedtuple('Result', ['windows',
+                                           'mismatched_windows',
+                                           'reindexed',
+                                           'deleted'])
+
+
+def verify(session, es, request, since=None):
+    """
+    Find and repair differences between Postgres and the search index.
+
+    :param since: only check annotations updated at or after this time
+    :type since: datetime.datetime
+
+    :returns: the number of windows checked and mismatched, and the number of
+        annotations reindexed and deleted
+    :rtype: Result
+    """
+    windows = _windows(session, since)
+    indexer = BatchIndexer(session, es, request)
+
+    mismatched = reindexed = deleted = 0
+    for window in windows:
+        if _db_digest(session, window) == _es_digest(es, window):
+            continue
+
+        mismatched += 1
+        to_index, to_delete = _diff(session, es, window)
+        log.info('window %s to %s differs: reindexing %d and deleting %d '
+                 'annotations', window.start, window.end,
+                 len(to_index), len(to_delete))
+
+        if to_index:
+            indexer.index(to_index)
+        if to_delete:
+            indexer.delete(to_delete)
+        reindexed += len(to_index)
+        deleted += len(to_delete)
+
+    return Result(windows=len(windows),
+                  mismatched_windows=mismatched,
+                  reindexed=reindexed,
+                  deleted=deleted)
+
+
+def _windows(session, since):
+    """
+    Return the windows to check.
+
+    Window bounds are truncated to milliseconds, the precision with which
+    Elasticsearch stores dates. The first window is extended back to ``since``
+    (or is open-ended) and the last is open-ended, so that documents in the
+    index with no corresponding annotation in Postgres are also found.
+    """
+    windows = [Window(_truncate(w.start), _truncate(w.end))
+               for w in annotation_windows(session, since=since)]
+
+    if not windows:
+        return [Window(_truncate(since), None)]
+
+    windows[0] = Window(_truncate(since), windows[0].end)
+    return windows
+
+
+def _db_digest(session, window):
+    # Sum whole milliseconds, as stored by Elasticsearch.
+    updated_ms = sa.func.round(sa.extract(
+        'epoch',
+        sa.func.date_trunc('milliseconds', models.Annotation.updated)) * 1000)
+    count, total = (session.query(sa.func.count(models.Annotation.id),
+                                  sa.func.sum(updated_ms))
+                    .filter(sa.not_(models.Annotation.deleted))
+                    .filter(_window_clause(window))
+                    .one())
+    return count, int(total or 0)
+
+
+def _es_digest(es, window):
+    result = es.conn.search(index=es.index,
+                            doc_type=es.t.annotation,
+                            body={
+                                'size': 0,
+                                'query': _es_window_query(window),
+                                'aggs': {
+                                    'updated': {'sum': {'field': 'updated'}},
+                                },
+                            })
+    total = result['aggregations']['updated']['value'] or 0
+    return result['hits']['total'], int(round(total))
+
+
+def _diff(session, es, window):
+    """
+    Compare a window annotation by annotation.
+
+    :returns: a ``(to_index, to_delete)`` tuple of lists of annotation ids
+    """
+    db_updated = dict(session.query(models.Annotation.id,
+                                    models.Annotation.updated)
+                      .filter(sa.not_(models.Annotation.deleted))
+                      .filter(_window_clause(window)))
+    db_updated = {id_: _truncate(u) for id_, u in db_updated.items()}
+
+    es_updated = {}
+    hits = es_helpers.scan(es.conn,
+                           index=es.index,
+                           doc_type=es.t.annotation,
+                           query={'query': _es_window_query(window),
+                                  '_source': ['updated']})
+    for hit in hits:
+        updated = parser.parse(hit['_source']['updated']).replace(tzinfo=None)
+        es_updated[hit['_id']] = _truncate(updated)
+
+    to_index = [id_ for id_, updated in db_updated.items()
+                if es_updated.get(id_) != updated]
+
+    # Documents in this window of the index which aren't in this window in
+    # Postgres are either stale copies of annotations which have since been
+    # updated (which are reindexed when their current window is checked, or
+    # here) or of annotations which have been deleted.
+    extra = [id_ for id_ in es_updated if id_ not in db_updated]
+    existing = _existing_ids(session, extra)
+    to_index.extend(id_ for id_ in extra if id_ in existing)
+    to_delete = [id_ for id_ in extra if id_ not in existing]
+
+    return sorted(to_index), sorted(to_delete)
+
+
+def _existing_ids(session, ids):
+    if not ids:
+        return set()
+    query = (session.query(models.Annotation.id)
+             .filter(sa.not_(models.Annotation.deleted))
+             .filter(models.Annotation.id.in_(ids)))
+    return set(id_ for id_, in query)
+
+
+def _window_clause(window):
+    return column_window(models.Annotation.updated, window.start, window.end)
+
+
+def _es_window_query(window):
+    bounds = {}
+    if window.start is not None:
+        bounds['gte'] = _es_date(window.start)
+    if window.end is not None:
+        bounds['lt'] = _es_date(window.end)
+
+    # Documents marked as deleted have no "updated" field, so they never match
+    # a range filter, and a window with no bounds must exclude them explicitly.
+    if bounds:
+        filter_ = {'range': {'updated': bounds}}
+    else:
+        filter_ = {'exists': {'field': 'updated'}}
+    return {'filtered': {'filter': filter_}}
+
+
+def _es_date(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%S.') + '{:03d}'.format(
+        value.microsecond // 1000)
+
+
+def _truncate(value):
+    if value is None:
+        return None
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
@@ -5,8 +5,14 @@ Provides links to different representations of annotations.
 """
 
 
+from pyramid.traversal import quote_path_segment
+
 from h._compat import urlparse, url_unquote
 
+# Stands in for the annotation id when generating the URL of an annotation
+# route once per request (see :py:func:`_annotation_route_url`).
+_ID_PLACEHOLDER = '__annotation_id__'
+
 
 def pretty_link(url):
     """
@@ -26,7 +32,7 @@ def pretty_link(url):
 
 def html_link(request, annotation):
     """Generate a link to an HTML representation of an annotation."""
-    return request.route_url('annotation', id=annotation.id)
+    return _annotation_route_url(request, 'annotation', annotation)
 
 
 def incontext_link(request, annotation):
@@ -52,11 +58,33 @@ def incontext_link(request, annotation):
 
 
 def json_link(request, annotation):
-    return request.route_url('api.annotation', id=annotation.id)
+    return _annotation_route_url(request, 'api.annotation', annotation)
 
 
 def jsonld_id_link(request, annotation):
-    return request.route_url('annotation', id=annotation.id)
+    return _annotation_route_url(request, 'annotation', annotation)
+
+
+def _annotation_route_url(request, route_name, annotation):
+    """
+    Return the URL of a route with an ``id`` for the given annotation.
+
+    Links are generated for every annotation in API responses, and generating
+    route URLs is relatively slow, so the URL is generated only once per route
+    and request, with a placeholder id, and the annotation id is substituted
+    into that.
+    """
+    templates = getattr(request, '_annotation_route_urls', None)
+    if templates is None:
+        templates = request._annotation_route_urls = {}
+
+    template = templates.get(route_name)
+    if template is None:
+        url = request.route_url(route_name, id=_ID_PLACEHOLDER)
+        template = templates[route_name] = url.split(_ID_PLACEHOLDER, 1)
+
+    prefix, suffix = template
+    return prefix + quote_path_segment(annotation.id, safe='/') + suffix
 
 
 def includeme(config):
@@ -0,0 +1,43 @@
+"""
+Add the outbox_event table.
+
+Revision ID: 3e1727613916
+Revises: e554d862135f
+Create Date: 2017-03-28 10:12:31.488312
+"""
+
+from __future__ import unicode_literals
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = '3e1727613916'
+down_revision = 'e554d862135f'
+
+
+def upgrade():
+    op.create_table(
+        'outbox_event',
+        sa.Column('id',
+                  sa.Integer(),
+                  autoincrement=True,
+                  primary_key=True),
+        sa.Column('created',
+                  sa.DateTime,
+                  server_default=sa.func.now(),
+                  nullable=False),
+        sa.Column('annotation_id',
+                  postgresql.UUID(),
+                  nullable=False),
+        sa.Column('action',
+                  sa.UnicodeText(),
+                  nullable=False),
+        sa.Column('src_client_id',
+                  sa.UnicodeText(),
+                  nullable=True))
+
+
+def downgrade():
+    op.drop_table('outbox_event')
@@ -43,6 +43,7 @@ from h.models.feature import Feature
 from h.models.feature_cohort import FeatureCohort
 from h.models.flag import Flag
 from h.models.group import Group
+from h.models.outbox_event import OutboxEvent
 from h.models.setting import Setting
 from h.models.subscriptions import Subscriptions
 from h.models.token import Token
@@ -61,6 +62,7 @@ __all__ = (
     'FeatureCohort',
     'Flag',
     'Group',
+    'OutboxEvent',
     'Setting',
     'Subscriptions',
     'Token',
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import datetime
+
+import sqlalchemy as sa
+
+from memex.db import types
+
+from h.db import Base
+
+
+class OutboxEvent(Base):
+    """
+    An annotation event waiting to be published.
+
+    Outbox events are written in the same transaction as the annotation change
+    they describe, and deleted by the outbox drainer (see :py:mod:`h.outbox`)
+    once they have been published to the indexer queue and the realtime
+    exchange. An event is therefore published if and only if the change is
+    committed, even if the web worker dies straight after the commit.
+    """
+
+    __tablename__ = 'outbox_event'
+
+    id = sa.Column(sa.Integer, autoincrement=True, primary_key=True)
+
+    created = sa.Column(sa.DateTime,
+                        default=datetime.datetime.utcnow,
+                        server_default=sa.func.now(),
+                        nullable=False)
+
+    #: The id of the annotation which was changed.
+    annotation_id = sa.Column(types.URLSafeUUID, nullable=False)
+
+    #: The change: one of "create", "update" or "delete".
+    action = sa.Column(sa.UnicodeText(), nullable=False)
+
+    #: The X-Client-Id of the client which made the change, if any, so that
+    #: the streamer doesn't echo the change back to it.
+    src_client_id = sa.Column(sa.UnicodeText())
+
+    def __repr__(self):
+        return '<OutboxEvent id=%s annotation_id=%s action=%s>' % (
+            self.id, self.annotation_id, self.action)
@@ -1,11 +1,25 @@
 # -*- coding: utf-8 -*-
 
+from pyramid.settings import asbool
+
+
+def query_time_filtering(settings):
+    """
+    Return whether NIPSA'd annotations are filtered out at query time.
+
+    When this is enabled, searches exclude the annotations of flagged users
+    by userid, and the "nipsa" field of annotations in the search index is no
+    longer written or updated.
+    """
+    return asbool(settings.get('h.nipsa.query_time'))
+
 
 def includeme(config):
     # Register the transform_annotation subscriber so that nipsa fields are
     # written into annotations on save.
-    config.add_subscriber('h.nipsa.subscribers.transform_annotation',
-                          'memex.events.AnnotationTransformEvent')
+    if not query_time_filtering(config.registry.settings):
+        config.add_subscriber('h.nipsa.subscribers.transform_annotation',
+                              'memex.events.AnnotationTransformEvent')
 
     # Register an additional filter with the API search module
     config.memex_add_search_filter('h.nipsa.search.Filter')
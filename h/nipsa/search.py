@@ -1,15 +1,23 @@
 # -*- coding: utf-8 -*-
 
+from h.nipsa import query_time_filtering
+
 
 class Filter(object):
     def __init__(self, request):
         self.request = request
 
     def __call__(self, _):
-        return nipsa_filter(self.request.authenticated_userid)
+        flagged_userids = None
+        if query_time_filtering(self.request.registry.settings):
+            nipsa_service = self.request.find_service(name='nipsa')
+            flagged_userids = nipsa_service.flagged_userids
+
+        return nipsa_filter(self.request.authenticated_userid,
+                            flagged_userids=flagged_userids)
 
 
-def nipsa_filter(userid=None):
+def nipsa_filter(userid=None, flagged_userids=None):
     """Return an Elasticsearch filter for filtering out NIPSA'd annotations.
 
     The returned filter is suitable for inserting into an Es query dict.
@@ -29,10 +37,21 @@ def nipsa_filter(userid=None):
         even if the annotations have the NIPSA flag.
     :type userid: unicode
 
+    :param flagged_userids: The IDs of all NIPSA'd users. If given, their
+        annotations are filtered out by userid, rather than by the NIPSA flag
+        on the annotations themselves.
+    :type flagged_userids: collection of unicode strings
+
     """
     # If any one of these "should" clauses is true then the annotation will
     # get through the filter.
-    should_clauses = [{"not": {"term": {"nipsa": True}}}]
+    if flagged_userids is None:
+        should_clauses = [{"not": {"term": {"nipsa": True}}}]
+    elif flagged_userids:
+        userids = sorted(u.lower() for u in flagged_userids)
+        should_clauses = [{"not": {"terms": {"user": userids}}}]
+    else:
+        should_clauses = [{"match_all": {}}]
 
     if userid is not None:
         # Always show the logged-in user's annotations even if they have nipsa.
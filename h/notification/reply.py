@@ -63,7 +63,9 @@ def get_notification(request, annotation, action):
     # Now we know we're dealing with a reply
     reply = annotation
 
-    parent = storage.fetch_annotation(request.db, parent_id)
+    parent = storage.fetch_annotation(
+        request.db, parent_id,
+        cache=request.find_service(name='annotation_cache'))
     if parent is None:
         return
 
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""
+Durable, batched publishing of annotation events.
+
+By default, the indexer tasks and realtime messages for an annotation change
+are published from a response callback once the request's transaction has
+been committed, so they are lost if the web worker dies in between, and every
+write waits for the message broker.
+
+When the ``h.outbox`` setting is enabled, the API instead records each change
+as an :py:class:`h.models.OutboxEvent` in the same transaction as the change
+itself, and a separate drainer process (``hypothesis outbox drain``) publishes
+the recorded events in batches.
+"""
+
+from __future__ import unicode_literals
+
+from pyramid.settings import asbool
+
+from h import models
+from h.indexer.subscribers import queue_annotation_event
+
+DEFAULT_BATCH_SIZE = 100
+
+
+def enabled(settings):
+    """Return whether annotation events are published through the outbox."""
+    return asbool(settings.get('h.outbox', False))
+
+
+def add(request, annotation_id, action):
+    """
+    Record an annotation event in the outbox.
+
+    The event is written in the request's transaction, so it is only
+    published if the transaction is committed.
+    """
+    request.db.add(models.OutboxEvent(
+        annotation_id=annotation_id,
+        action=action,
+        src_client_id=request.headers.get('X-Client-Id')))
+
+
+def drain(request, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Publish and delete the oldest events in the outbox.
+
+    Events are locked while they're published, and events locked by another
+    drainer are skipped, so several drainers can run at once. Each event is
+    queued for the indexer and published to the realtime exchange. The events
+    are only deleted when the caller commits the transaction, so events are
+    delivered at least once.
+
+    :param batch_size: the maximum number of events to publish
+    :returns: the number of events published
+    """
+    events = (request.db.query(models.OutboxEvent)
+              .order_by(models.OutboxEvent.id)
+              .limit(batch_size)
+              .with_for_update(skip_locked=True)
+              .all())
+    if not events:
+        return 0
+
+    settings = request.registry.settings
+    for event in events:
+        queue_annotation_event(settings, event.annotation_id, event.action)
+        request.realtime.publish_annotation({
+            'action': event.action,
+            'annotation_id': event.annotation_id,
+            'src_client_id': event.src_client_id,
+        })
+
+    ids = [event.id for event in events]
+    (request.db.query(models.OutboxEvent)
+     .filter(models.OutboxEvent.id.in_(ids))
+     .delete(synchronize_session=False))
+
+    return len(events)
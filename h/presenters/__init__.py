@@ -8,19 +8,23 @@ formats.
 from __future__ import unicode_literals
 
 from h.presenters.annotation_html import AnnotationHTMLPresenter
+from h.presenters.annotation_json import AnnotationJSONBatchPresenter
 from h.presenters.annotation_json import AnnotationJSONPresenter
 from h.presenters.annotation_jsonld import AnnotationJSONLDPresenter
 from h.presenters.annotation_searchindex import AnnotationSearchIndexPresenter
+from h.presenters.annotation_searchindex import search_index_row_asdict
 from h.presenters.document_html import DocumentHTMLPresenter
 from h.presenters.document_json import DocumentJSONPresenter
 from h.presenters.document_searchindex import DocumentSearchIndexPresenter
 
 __all__ = (
     'AnnotationHTMLPresenter',
+    'AnnotationJSONBatchPresenter',
     'AnnotationJSONPresenter',
     'AnnotationJSONLDPresenter',
     'AnnotationSearchIndexPresenter',
     'DocumentHTMLPresenter',
     'DocumentJSONPresenter',
     'DocumentSearchIndexPresenter',
+    'search_index_row_asdict',
 )
@@ -6,6 +6,8 @@ import copy
 
 from pyramid import security
 
+from memex.resources import AnnotationResource
+
 from h.presenters.annotation_base import AnnotationBasePresenter
 from h.presenters.document_json import DocumentJSONPresenter
 
@@ -49,6 +51,12 @@ class AnnotationJSONPresenter(AnnotationBasePresenter):
         complex permissions dict format that is still used in some places.
 
         """
+        return {'read': [self._read_principal()],
+                'admin': [self.annotation.userid],
+                'update': [self.annotation.userid],
+                'delete': [self.annotation.userid]}
+
+    def _read_principal(self):
         read = self.annotation.userid
         if self.annotation.shared:
             read = 'group:{}'.format(self.annotation.groupid)
@@ -58,7 +66,52 @@ class AnnotationJSONPresenter(AnnotationBasePresenter):
             if security.Everyone in principals:
                 read = 'group:__world__'
 
-        return {'read': [read],
-                'admin': [self.annotation.userid],
-                'update': [self.annotation.userid],
-                'delete': [self.annotation.userid]}
+        return read
+
+
+class AnnotationJSONBatchPresenter(object):
+
+    """
+    Present a list of annotations in the JSON format returned by API requests.
+
+    Gives the same results as presenting each annotation with
+    :py:class:`AnnotationJSONPresenter`, but works out the "read" permission
+    of shared annotations (which means looking up the group and checking its
+    ACL) only once per group.
+    """
+
+    def __init__(self, annotations, group_service, links_service):
+        self.annotations = annotations
+        self.group_service = group_service
+        self.links_service = links_service
+
+    def asdicts(self):
+        read_principals = {}
+        return [_BatchedAnnotationJSONPresenter(
+                    AnnotationResource(annotation,
+                                       self.group_service,
+                                       self.links_service),
+                    read_principals).asdict()
+                for annotation in self.annotations]
+
+
+class _BatchedAnnotationJSONPresenter(AnnotationJSONPresenter):
+    def __init__(self, annotation_resource, read_principals):
+        super(_BatchedAnnotationJSONPresenter, self).__init__(
+            annotation_resource)
+        self._read_principals = read_principals
+
+    def _read_principal(self):
+        # Only the read permission of shared annotations depends on the group.
+        if not self.annotation.shared:
+            return super(_BatchedAnnotationJSONPresenter,
+                         self)._read_principal()
+
+        key = (self.annotation.groupid, self.annotation.deleted)
+        try:
+            return self._read_principals[key]
+        except KeyError:
+            read = super(_BatchedAnnotationJSONPresenter,
+                         self)._read_principal()
+            self._read_principals[key] = read
+            return read
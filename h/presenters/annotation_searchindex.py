@@ -4,6 +4,7 @@ from __future__ import unicode_literals
 
 from h.presenters.annotation_base import AnnotationBasePresenter
 from h.presenters.document_searchindex import DocumentSearchIndexPresenter
+from h.util.datetime import utc_iso8601
 
 
 class AnnotationSearchIndexPresenter(AnnotationBasePresenter):
@@ -43,3 +44,48 @@ class AnnotationSearchIndexPresenter(AnnotationBasePresenter):
         # The search index presenter has no need to generate links, and so the
         # `links_service` parameter has been removed from the constructor.
         raise NotImplementedError("search index presenter doesn't have links")
+
+
+def search_index_row_asdict(row):
+    """
+    Present an annotation row in the JSON format used in the search index.
+
+    This returns the same data as :py:class:`AnnotationSearchIndexPresenter`,
+    but works from a row of annotation columns (as loaded for bulk indexing by
+    :py:class:`memex.search.index.BatchIndexer`) rather than an ``Annotation``
+    and its ``Document``. The row must have the ``Annotation`` attributes used
+    by the presenter, plus ``document_title`` and ``document_web_uri``.
+    """
+    tags = row.tags or []
+
+    target = {'source': row.target_uri,
+              'scope': [row.target_uri_normalized]}
+    if row.target_selectors:
+        target['selector'] = row.target_selectors
+
+    document = {}
+    if row.document_title:
+        document['title'] = [row.document_title]
+    if row.document_web_uri:
+        document['web_uri'] = row.document_web_uri
+
+    result = {
+        'id': row.id,
+        'created': utc_iso8601(row.created) if row.created else None,
+        'updated': utc_iso8601(row.updated) if row.updated else None,
+        'user': row.userid,
+        'user_raw': row.userid,
+        'uri': row.target_uri,
+        'text': row.text or '',
+        'tags': tags,
+        'tags_raw': tags,
+        'group': row.groupid,
+        'shared': row.shared,
+        'target': [target],
+        'document': document,
+    }
+
+    if row.references:
+        result['references'] = row.references
+
+    return result
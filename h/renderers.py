@@ -1,12 +1,38 @@
 # -*- coding: utf-8 -*-
-# Taken from:
-# https://pyramid-cookbook.readthedocs.io/en/latest/templates/customrenderers.html
-# with minor modifications
+
+"""
+Custom renderers for the h application.
+
+The ``json`` renderer is replaced by one which uses a :py:class:`JSONEncoder`.
+The encoder uses ujson_ when it is installed, because the standard library
+encoder is slow on Python 2. A ``json_stream`` renderer is also registered. It
+encodes list responses one row at a time as the response body is sent, instead
+of building the whole body in memory first.
+
+.. _ujson: https://pypi.python.org/pypi/ujson
+"""
+
+import json
+
+from pyramid import renderers
+from pyramid.settings import asbool
 import unicodecsv as csv
+
 from h._compat import StringIO
 
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+#: The approximate size, in bytes, of each chunk of a streamed JSON response.
+CHUNK_SIZE = 64 * 1024
+
 
 class CSV(object):
+    # Taken from:
+    # https://pyramid-cookbook.readthedocs.io/en/latest/templates/customrenderers.html
+    # with minor modifications
     def __init__(self, info):
         pass
 
@@ -32,3 +58,159 @@ class CSV(object):
         writer.writerows(value.get('rows', []))
 
         return fout.getvalue()
+
+
+class JSONEncoder(object):
+    """
+    Encodes values as compact JSON, with ujson if it is installed.
+
+    Values which ujson can't encode, such as objects which need converting
+    with a ``default`` function, are encoded with the standard library's
+    :py:mod:`json` module instead.
+    """
+
+    def __init__(self, fast=True):
+        self.fast = fast and ujson is not None
+
+    def dumps(self, value, default=None):
+        """Return the JSON encoding of ``value``."""
+        return self._encode_function(default)(value)
+
+    def iterencode(self, value, default=None, chunk_size=CHUNK_SIZE):
+        """
+        Return an iterator over the JSON encoding of ``value``, in chunks.
+
+        The lists in a list value, or in the values of a dict value, are
+        encoded a few items at a time, so that only about ``chunk_size`` bytes
+        of the encoding need to be held in memory at once. Everything else is
+        encoded whole. The chunks are UTF-8 encoded, and joining them gives
+        the same result as :py:meth:`dumps`.
+        """
+        encode = self._encode_function(default)
+        chunk = []
+        size = 0
+        for piece in _iterpieces(value, encode, chunk_size):
+            chunk.append(piece)
+            size += len(piece)
+            if size >= chunk_size:
+                yield _utf8(''.join(chunk))
+                chunk = []
+                size = 0
+        if chunk:
+            yield _utf8(''.join(chunk))
+
+    def _encode_function(self, default):
+        if default is None:
+            stdlib_encode = _compact_encoder.encode
+        else:
+            # json.dumps() builds a new encoder on every call when it is
+            # given any options, which is slow when encoding row by row.
+            stdlib_encode = json.JSONEncoder(separators=(',', ':'),
+                                             default=default).encode
+        if not self.fast:
+            return stdlib_encode
+
+        def encode(value):
+            try:
+                return ujson.dumps(value, escape_forward_slashes=False)
+            except (OverflowError, TypeError, ValueError):
+                return stdlib_encode(value)
+        return encode
+
+
+def _iterpieces(value, encode, chunk_size):
+    if isinstance(value, dict):
+        separator = '{'
+        for key, item in value.items():
+            yield separator + encode(key) + ':'
+            separator = ','
+            if isinstance(item, (list, tuple)):
+                for piece in _iterrows(item, encode, chunk_size):
+                    yield piece
+            else:
+                yield encode(item)
+        yield '}' if separator == ',' else '{}'
+    elif isinstance(value, (list, tuple)):
+        for piece in _iterrows(value, encode, chunk_size):
+            yield piece
+    else:
+        yield encode(value)
+
+
+def _iterrows(rows, encode, chunk_size):
+    if not rows:
+        yield '[]'
+        return
+
+    # Encoding each row separately has a noticeable overhead, so the rows
+    # after the first are encoded in slices of about chunk_size bytes, going
+    # by the size of the first.
+    first = encode(rows[0])
+    yield '[' + first
+    step = max(chunk_size // max(len(first), 1), 1)
+    for start in range(1, len(rows), step):
+        yield ',' + encode(list(rows[start:start + step]))[1:-1]
+    yield ']'
+
+
+def _utf8(text):
+    # The encoders return (ASCII) bytes on Python 2, and text on Python 3.
+    if isinstance(text, bytes):
+        return text
+    return text.encode('utf-8')
+
+
+_compact_encoder = json.JSONEncoder(separators=(',', ':'))
+
+
+class JSON(renderers.JSON):
+    """
+    A JSON renderer which encodes values with a :py:class:`JSONEncoder`.
+
+    Objects with a ``__json__`` method and adapters added with
+    :py:meth:`add_adapter` are supported as by Pyramid's own JSON renderer.
+    If ``stream`` is true the renderer returns an iterator over the encoded
+    value (see :py:meth:`JSONEncoder.iterencode`), which becomes the
+    response's ``app_iter``.
+    """
+
+    def __init__(self, encoder, stream=False, adapters=()):
+        super(JSON, self).__init__(serializer=encoder.dumps, adapters=adapters)
+        self.encoder = encoder
+        self.stream = stream
+
+    def __call__(self, info):
+        if not self.stream:
+            return super(JSON, self).__call__(info)
+
+        def _render(value, system):
+            request = system.get('request')
+            if request is not None:
+                response = request.response
+                if response.content_type == response.default_content_type:
+                    response.content_type = 'application/json'
+            default = self._make_default(request)
+            return self.encoder.iterencode(value, default=default)
+
+        return _render
+
+
+def get_encoder(registry):
+    """Return the application's :py:class:`JSONEncoder`."""
+    try:
+        return registry.json_encoder
+    except AttributeError:
+        return _default_encoder
+
+
+_default_encoder = JSONEncoder()
+
+
+def includeme(config):
+    settings = config.registry.settings
+    encoder = JSONEncoder(fast=asbool(settings.get('h.json.fast', True)))
+    config.registry.json_encoder = encoder
+
+    config.add_renderer('csv', CSV)
+    config.add_renderer('json', JSON(encoder))
+    config.add_renderer('json_stream', JSON(encoder, stream=True))
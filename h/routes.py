@@ -77,8 +77,10 @@ def includeme(config):
                      '/api/annotations/{id:[A-Za-z0-9_-]{20,22}}.jsonld',
                      factory='memex.resources:AnnotationResourceFactory',
                      traverse='/{id}')
+    config.add_route('api.bulk', '/api/bulk')
     config.add_route('api.profile', '/api/profile')
     config.add_route('api.debug_token', '/api/debug-token')
+    config.add_route('api.export', '/api/export')
     config.add_route('api.flags',
                      '/api/flags',
                      factory='memex.resources:AnnotationResourceFactory')
@@ -6,12 +6,15 @@ from __future__ import unicode_literals
 
 
 def includeme(config):
+    config.register_service_factory('.annotation_cache.annotation_cache_factory', name='annotation_cache')
     config.register_service_factory('.annotation_stats.annotation_stats_factory', name='annotation_stats')
     config.register_service_factory('.auth_ticket.auth_ticket_service_factory',
                                     iface='pyramid_authsanity.interfaces.IAuthService')
     config.register_service_factory('.auth_token.auth_token_service_factory', name='auth_token')
+    config.register_service_factory('.facet_cache.facet_cache_factory', name='facet_cache')
     config.register_service_factory('.flag.flag_service_factory', name='flag')
     config.register_service_factory('.group.groups_factory', name='group')
+    config.register_service_factory('.http_cache.http_cache_factory', name='http_cache')
     config.register_service_factory('.authority_group.authority_group_factory', name='authority_group')
     config.register_service_factory('.nipsa.nipsa_factory', name='nipsa')
     config.register_service_factory('.oauth.oauth_service_factory', name='oauth')
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import collections
+import copy
+import itertools
+import threading
+import time
+
+import sqlalchemy as sa
+from pyramid.path import DottedNameResolver
+from pyramid.settings import asbool
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.session import make_transient_to_detached
+
+from memex import models
+
+# The key under which the process-wide cache is stored in the registry.
+REGISTRY_KEY = 'h.services.annotation_cache'
+
+DEFAULT_TTL = 60
+DEFAULT_MAX_ENTRIES = 10000
+
+
+class NullBackend(object):
+
+    """
+    A shared annotation cache backend which stores nothing.
+
+    Shared backends (configured with the ``h.annotation_cache.backend``
+    setting, the dotted name of a callable which is passed the app settings
+    and returns a backend) must provide these methods. Snapshots are dicts
+    of JSON-serializable values (and datetimes).
+    """
+
+    def get_many(self, ids):
+        """Return a dict of the snapshots stored for any of ``ids``."""
+        return {}
+
+    def set_many(self, snapshots, ttl):
+        """Store a dict of snapshots by id, for ``ttl`` seconds."""
+
+    def delete(self, id_):
+        """Delete the snapshot stored for ``id_``, if any."""
+
+
+class AnnotationCacheService(object):
+
+    """
+    A process-wide read-through cache of annotations.
+
+    The cache stores snapshots of annotations' column values, in an
+    in-process LRU and in a shared backend. Annotations fetched through the
+    cache are rebuilt from their snapshots as clean, persistent instances in
+    the caller's session, so they can be used just like annotations loaded
+    from the database.
+
+    :py:meth:`invalidate` removes an annotation from the cache and gives it a
+    new generation number, so that a snapshot of it loaded before it was
+    invalidated is never stored. Only the worker which handled a write sees
+    its annotation event, so entries also expire after ``ttl`` seconds, which
+    bounds how stale other workers' copies can be.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES,
+                 backend=None, clock=time.time):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.backend = backend if backend is not None else NullBackend()
+        self.clock = clock
+
+        self._entries = collections.OrderedDict()
+
+        # Generations of recently invalidated annotations, as in
+        # h.services.facet_cache.
+        self._generations = collections.OrderedDict()
+        self._counter = itertools.count(1)
+
+        self._lock = threading.Lock()
+
+    def fetch(self, session, ids, query_processor=None):
+        """
+        Fetch the annotations with the given ids.
+
+        Annotations which aren't cached are loaded from the database in a
+        single query (which is first passed to ``query_processor``, if given)
+        and added to the cache.
+
+        :returns: a dict of the annotations found, by id
+        """
+        snapshots, generations = self._get_many(ids)
+
+        annotations = {}
+        missing = [id_ for id_ in ids if id_ not in snapshots]
+        if missing:
+            query = (session.query(models.Annotation)
+                     .filter(models.Annotation.id.in_(missing)))
+            if query_processor:
+                query = query_processor(query)
+            loaded = {a.id: a for a in query}
+            self._set_many({id_: _snapshot(a) for id_, a in loaded.items()},
+                           generations)
+            annotations.update(loaded)
+
+        if snapshots:
+            annotations.update(_restore_many(session, snapshots.values()))
+
+        return annotations
+
+    def invalidate(self, id_):
+        """Remove the annotation with the given id from the cache."""
+        with self._lock:
+            self._entries.pop(id_, None)
+            self._generations.pop(id_, None)
+            while len(self._generations) >= self.max_entries:
+                self._generations.popitem(last=False)
+            self._generations[id_] = next(self._counter)
+        self.backend.delete(id_)
+
+    def _get_many(self, ids):
+        snapshots = {}
+        now = self.clock()
+        with self._lock:
+            generations = {id_: self._generations.get(id_, 0) for id_ in ids}
+            for id_ in ids:
+                entry = self._entries.pop(id_, None)
+                if entry is None:
+                    continue
+                expires, snapshot = entry
+                if expires < now:
+                    continue
+                # Re-insert the entry to mark it as the most recently used.
+                self._entries[id_] = entry
+                snapshots[id_] = snapshot
+
+        missing = [id_ for id_ in ids if id_ not in snapshots]
+        if missing:
+            shared = self.backend.get_many(missing)
+            if shared:
+                self._store_locally(shared, generations)
+                snapshots.update(shared)
+
+        return snapshots, generations
+
+    def _set_many(self, snapshots, generations):
+        snapshots = self._store_locally(snapshots, generations)
+        if snapshots:
+            self.backend.set_many(snapshots, self.ttl)
+
+    def _store_locally(self, snapshots, generations):
+        stored = {}
+        expires = self.clock() + self.ttl
+        with self._lock:
+            for id_, snapshot in snapshots.items():
+                if generations.get(id_, 0) != self._generations.get(id_, 0):
+                    continue
+                self._entries.pop(id_, None)
+                while len(self._entries) >= self.max_entries:
+                    self._entries.popitem(last=False)
+                self._entries[id_] = (expires, snapshot)
+                stored[id_] = snapshot
+        return stored
+
+
+def _snapshot(annotation):
+    """Return a dict of the column values of a loaded annotation."""
+    mapper = sa.inspect(models.Annotation)
+    return {attr.key: _plain(getattr(annotation, attr.key))
+            for attr in mapper.column_attrs}
+
+
+def _plain(value):
+    # Convert mutable-tracking collections (MutableDict, MutableList) back to
+    # the plain types they wrap.
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    return value
+
+
+def _restore_many(session, snapshots):
+    """
+    Add annotations to ``session`` from their snapshots, without querying.
+
+    Each annotation is set up as if it had been loaded from the database by a
+    query. Annotations which are already in the session are returned as
+    they are. The annotations' documents are loaded with a single query.
+    """
+    mapper = sa.inspect(models.Annotation)
+
+    annotations = {}
+    restored = []
+    for snapshot in snapshots:
+        key = mapper.identity_key_from_primary_key([snapshot['id']])
+        existing = session.identity_map.get(key)
+        if existing is not None:
+            annotations[existing.id] = existing
+            continue
+
+        annotation = mapper.class_manager.new_instance()
+        for name, value in snapshot.items():
+            set_committed_value(annotation, name, copy.deepcopy(value))
+        make_transient_to_detached(annotation)
+        session.add(annotation)
+
+        # Let load event listeners (such as those which make the JSON columns
+        # mutation-tracking) set up the annotation.
+        state = sa.inspect(annotation)
+        state.manager.dispatch.load(state, None)
+
+        annotations[annotation.id] = annotation
+        restored.append(annotation)
+
+    document_ids = set(a.document_id for a in restored)
+    if document_ids:
+        documents = (session.query(models.Document)
+                     .filter(models.Document.id.in_(document_ids)))
+        documents = {d.id: d for d in documents}
+        for annotation in restored:
+            set_committed_value(annotation, 'document',
+                                documents.get(annotation.document_id))
+
+    return annotations
+
+
+def annotation_cache_factory(context, request):
+    """
+    Return the process-wide AnnotationCacheService instance.
+
+    Returns ``None`` unless the cache is enabled with the ``h.annotation_cache``
+    setting.
+    """
+    registry = request.registry
+    settings = registry.settings
+    if not asbool(settings.get('h.annotation_cache')):
+        return None
+
+    if REGISTRY_KEY not in registry:
+        backend = None
+        if settings.get('h.annotation_cache.backend'):
+            backend_factory = DottedNameResolver().maybe_resolve(
+                settings['h.annotation_cache.backend'])
+            backend = backend_factory(settings)
+        registry[REGISTRY_KEY] = AnnotationCacheService(
+            ttl=int(settings.get('h.annotation_cache.ttl', DEFAULT_TTL)),
+            max_entries=int(settings.get('h.annotation_cache.max_entries',
+                                         DEFAULT_MAX_ENTRIES)),
+            backend=backend)
+    return registry[REGISTRY_KEY]
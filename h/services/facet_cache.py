@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import collections
+import itertools
+import threading
+import time
+
+# The key under which the process-wide cache is stored in the registry.
+REGISTRY_KEY = 'h.services.facet_cache'
+
+DEFAULT_TTL = 30
+DEFAULT_MAX_ENTRIES = 1000
+
+
+class FacetCacheService(object):
+
+    """
+    A process-wide cache of activity page facet (aggregation) results.
+
+    Entries are keyed by the group the query is restricted to (or ``None``)
+    and a hashable representation of the rest of the query.
+
+    :py:meth:`invalidate` gives a group a new generation number, and entries
+    stored under any other generation are treated as missing. Callers pass the
+    generation returned by :py:meth:`get` back to :py:meth:`set`, so facets
+    computed while the group was being invalidated are never stored.
+
+    Only the worker which handled a write sees its annotation event, so
+    entries also expire after ``ttl`` seconds (the ``h.facet_cache.ttl``
+    setting), which bounds how stale other workers' facets can be.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES,
+                 clock=time.time):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+
+        self._entries = collections.OrderedDict()
+
+        # Generations of recently invalidated groups. Generation numbers are
+        # never reused, so forgetting a group's generation (which makes it 0
+        # again) only ever turns entries and pending writes into misses.
+        self._generations = collections.OrderedDict()
+        self._counter = itertools.count(1)
+
+        self._lock = threading.Lock()
+
+    def get(self, group, query_key):
+        """
+        Look up the cached facets for ``(group, query_key)``.
+
+        :returns: a ``(facets, generation)`` tuple, where ``facets`` is
+            ``None`` if there is no valid cache entry, and ``generation``
+            should be passed to :py:meth:`set` when storing freshly computed
+            facets.
+        """
+        with self._lock:
+            generation = self._generations.get(group, 0)
+            entry = self._entries.get((group, query_key))
+            if entry is None:
+                return None, generation
+
+            entry_generation, expires, facets = entry
+            if entry_generation != generation or expires < self.clock():
+                del self._entries[(group, query_key)]
+                return None, generation
+
+            return facets, generation
+
+    def set(self, group, query_key, facets, generation):
+        """
+        Store the facets computed for ``(group, query_key)``.
+
+        The facets are discarded if the group has been invalidated since
+        ``generation`` was returned by :py:meth:`get`.
+        """
+        with self._lock:
+            if generation != self._generations.get(group, 0):
+                return
+
+            self._entries.pop((group, query_key), None)
+            while len(self._entries) >= self.max_entries:
+                self._entries.popitem(last=False)
+
+            self._entries[(group, query_key)] = (generation,
+                                                 self.clock() + self.ttl,
+                                                 facets)
+
+    def invalidate(self, group):
+        """
+        Invalidate the cached facets for ``group``.
+
+        Queries which aren't restricted to a single group can include
+        annotations from any group, so those are invalidated too.
+        """
+        with self._lock:
+            self._bump(group)
+            if group is not None:
+                self._bump(None)
+
+    def _bump(self, group):
+        self._generations.pop(group, None)
+        while len(self._generations) >= self.max_entries:
+            self._generations.popitem(last=False)
+        self._generations[group] = next(self._counter)
+
+
+def facet_cache_factory(context, request):
+    """Return the process-wide FacetCacheService instance."""
+    registry = request.registry
+    if REGISTRY_KEY not in registry:
+        settings = registry.settings
+        registry[REGISTRY_KEY] = FacetCacheService(
+            ttl=int(settings.get('h.facet_cache.ttl', DEFAULT_TTL)),
+            max_entries=int(settings.get('h.facet_cache.max_entries',
+                                         DEFAULT_MAX_ENTRIES)))
+    return registry[REGISTRY_KEY]
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import hashlib
+
+from memex import uri
+
+from h import storage
+from h.tasks import http_cache
+
+
+def uri_key(normalized_uri):
+    """Return the surrogate key of responses about a normalized URI."""
+    digest = hashlib.sha1(normalized_uri.encode('utf-8')).hexdigest()
+    return 'uri:' + digest
+
+
+def group_key(groupid):
+    """Return the surrogate key of responses about a group."""
+    return 'group:' + groupid
+
+
+class HTTPCacheService(object):
+
+    """
+    Marks public responses as cacheable by a shared HTTP cache, and purges them.
+
+    Responses such as the search results and badge count for a page are the
+    same for every anonymous caller, so a reverse proxy in front of the app
+    can answer them itself. :py:meth:`cache_if_anonymous` allows shared caches
+    to keep the response for ``ttl`` seconds (the ``h.http_cache.ttl``
+    setting), and tags it with surrogate keys for the normalized URIs and
+    groups it depends on. When annotations change, :py:meth:`purge` asks the
+    cache to purge the responses tagged with the annotations' keys. It sends
+    the request to the ``h.http_cache.purge_url`` setting, via a Celery task.
+
+    Other changes, such as a user being flagged as NIPSA or a document gaining
+    new equivalent URIs, don't purge anything. The TTL bounds how stale those
+    responses can get.
+    """
+
+    def __init__(self, session, ttl=0, purge_url=None,
+                 purge_keys=http_cache.purge.delay):
+        self.session = session
+        self.ttl = ttl
+        self.purge_url = purge_url
+        self._purge_keys = purge_keys
+
+    def cache_if_anonymous(self, request, uris=(), groupids=()):
+        """
+        Let shared caches store the response to an anonymous request.
+
+        Does nothing if the request is authenticated, or if the TTL is 0.
+
+        :param request: the request being responded to
+        :param uris: the URIs of the documents the response is about, as given
+            in the request
+        :param groupids: the pubids of the groups the response is limited to
+        """
+        if not self.ttl or request.authenticated_userid is not None:
+            return
+
+        normalized = set()
+        for uri_ in uris:
+            normalized.update(uri.normalize(u) for u in
+                              storage.expand_uri(self.session, uri_))
+        keys = ([uri_key(u) for u in sorted(normalized)] +
+                [group_key(g) for g in sorted(set(groupids))])
+
+        response = request.response
+        # Only the shared cache keeps the response: browsers and other private
+        # caches must revalidate it.
+        response.cache_control.public = True
+        response.cache_control.max_age = 0
+        response.cache_control.s_maxage = self.ttl
+        response.vary = ('Authorization', 'Cookie')
+        if keys:
+            response.headers['Surrogate-Key'] = ' '.join(keys)
+
+    def purge(self, annotations):
+        """Purge the cached responses which the annotations could appear in."""
+        if not self.purge_url:
+            return
+
+        keys = set()
+        for annotation in annotations:
+            keys.add(uri_key(annotation.target_uri_normalized))
+            keys.add(group_key(annotation.groupid))
+        if keys:
+            self._purge_keys(sorted(keys))
+
+
+def http_cache_factory(context, request):
+    """Return a HTTPCacheService instance for the passed context and request."""
+    settings = request.registry.settings
+    return HTTPCacheService(request.db,
+                            ttl=int(settings.get('h.http_cache.ttl', 0)),
+                            purge_url=settings.get('h.http_cache.purge_url'))
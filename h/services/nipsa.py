@@ -1,8 +1,63 @@
 # -*- coding: utf-8 -*-
 
+import time
+import uuid
+from functools import partial
+
+from h._compat import text_type
 from h.models import User
+from h.nipsa import query_time_filtering
 from h.tasks.nipsa import add_nipsa, remove_nipsa
 
+# The settings key of a version stamp which changes whenever a user is flagged
+# or unflagged, in the same transaction as the change.
+SETTING_VERSION = u'nipsa.version'
+
+# The type of the message published on the realtime "user" exchange when a
+# user is flagged or unflagged.
+NIPSA_CHANGED = 'nipsa-changed'
+
+# How long (in seconds) a process trusts its cached set of flagged userids for
+# if it doesn't see a change. This only matters to processes which can't check
+# the version stamp and miss a NIPSA_CHANGED message.
+FLAGGED_USERIDS_TTL = 60
+
+
+class FlaggedUseridsCache(object):
+
+    """
+    A process-wide cache of the set of NIPSA'd userids.
+
+    The set is reloaded when it is requested with a different version stamp
+    from the one it was loaded with, when :py:meth:`invalidate` is called, or
+    when ``ttl`` seconds have passed.
+    """
+
+    def __init__(self, ttl=FLAGGED_USERIDS_TTL, clock=time.time):
+        self.ttl = ttl
+        self.clock = clock
+
+        self._userids = None
+        self._version = None
+        self._expires = 0
+
+    def get(self, version, load):
+        """Return the cached set, calling ``load`` to refresh it if stale."""
+        now = self.clock()
+        if (self._userids is None or
+                version != self._version or
+                now >= self._expires):
+            self._userids = frozenset(load())
+            self._version = version
+            self._expires = now + self.ttl
+        return self._userids
+
+    def invalidate(self):
+        self._userids = None
+
+
+flagged_userids_cache = FlaggedUseridsCache()
+
 
 class NipsaService(object):
 
@@ -11,8 +66,26 @@ class NipsaService(object):
     (NIPSA) flags on userids.
     """
 
-    def __init__(self, session):
+    def __init__(self, session, query_time=False, settings=None, publish=None,
+                 cache=None):
+        """
+        Create a new NIPSA service.
+
+        :param session: the SQLAlchemy session object
+        :param query_time: whether NIPSA'd annotations are filtered at query
+            time, see :py:func:`h.nipsa.query_time_filtering`
+        :param settings: the settings service, used to read and update the
+            version stamp of the flagged userids
+        :param publish: a function called with the userid of each user who is
+            flagged or unflagged, to notify other processes
+        :param cache: a :py:class:`FlaggedUseridsCache` to share the flagged
+            userids with other instances
+        """
         self.session = session
+        self.query_time = query_time
+        self.settings = settings
+        self.publish = publish
+        self.cache = cache
         self._flagged_userids = None
 
     @property
@@ -23,8 +96,11 @@ class NipsaService(object):
         :rtype: set of unicode strings
         """
         if self._flagged_userids is None:
-            query = self.session.query(User).filter_by(nipsa=True)
-            self._flagged_userids = set([u.userid for u in query])
+            if self.cache is None:
+                self._flagged_userids = self._load()
+            else:
+                self._flagged_userids = self.cache.get(self._version(),
+                                                       self._load)
         return self._flagged_userids
 
     def is_flagged(self, userid):
@@ -38,9 +114,14 @@ class NipsaService(object):
         Add the given user's ID to the list of NIPSA'd user IDs. If the user
         is already NIPSA'd then nothing will happen (but an "add_nipsa"
         message for the user will still be published to the queue).
+
+        With query-time filtering, the user's annotations in the search index
+        aren't updated, and no such message is published.
         """
         user.nipsa = True
-        add_nipsa.delay(user.userid)
+        self._changed(user)
+        if not self.query_time:
+            add_nipsa.delay(user.userid)
 
     def unflag(self, user):
         """
@@ -49,14 +130,59 @@ class NipsaService(object):
         If the user isn't NIPSA'd then nothing will happen (but a
         "remove_nipsa" message for the user will still be published to the
         queue).
+
+        With query-time filtering, the user's annotations in the search index
+        aren't updated, and no such message is published.
         """
         user.nipsa = False
-        remove_nipsa.delay(user.userid)
+        self._changed(user)
+        if not self.query_time:
+            remove_nipsa.delay(user.userid)
 
     def clear(self):
+        """
+        Forget the flagged userids loaded by this service.
+
+        If the service shares a cache, the flagged userids are only reloaded
+        from the database if the version stamp has changed.
+        """
         self._flagged_userids = None
 
+    def _changed(self, user):
+        self._flagged_userids = None
+        if self.settings is not None:
+            self.settings.put(SETTING_VERSION, text_type(uuid.uuid4().hex))
+        if self.cache is not None:
+            self.cache.invalidate()
+        if self.publish is not None:
+            self.publish(user.userid)
+
+    def _load(self):
+        query = self.session.query(User).filter_by(nipsa=True)
+        return set([u.userid for u in query])
+
+    def _version(self):
+        if self.settings is None:
+            return None
+        return self.settings.get(SETTING_VERSION)
+
 
 def nipsa_factory(context, request):
     """Return a NipsaService instance for the passed context and request."""
-    return NipsaService(request.db)
+    query_time = query_time_filtering(request.registry.settings)
+    return NipsaService(request.db,
+                        query_time=query_time,
+                        settings=request.find_service(name='settings'),
+                        publish=partial(_publish, request),
+                        cache=flagged_userids_cache)
+
+
+def _publish(request, userid):
+    # Tell other processes (such as the streamer) about the change only once
+    # it has been committed, so that they don't reload the old flagged userids.
+    def publish(success):
+        if success:
+            request.realtime.publish_user({'type': NIPSA_CHANGED,
+                                           'userid': userid})
+
+    request.tm.get().addAfterCommitHook(publish)
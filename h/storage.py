@@ -29,7 +29,7 @@ from memex.db import types
 _ = i18n.TranslationStringFactory(__package__)
 
 
-def fetch_annotation(session, id_):
+def fetch_annotation(session, id_, cache=None):
     """
     Fetch the annotation with the given id.
 
@@ -39,16 +39,21 @@ def fetch_annotation(session, id_):
     :param id_: the annotation ID
     :type id_: str
 
+    :param cache: an optional annotation cache to read through
+    :type cache: h.services.annotation_cache.AnnotationCacheService
+
     :returns: the annotation, if found, or None.
     :rtype: memex.models.Annotation, NoneType
     """
     try:
+        if cache is not None:
+            return cache.fetch(session, [id_]).get(id_)
         return session.query(models.Annotation).get(id_)
     except types.InvalidUUID:
         return None
 
 
-def fetch_ordered_annotations(session, ids, query_processor=None):
+def fetch_ordered_annotations(session, ids, query_processor=None, cache=None):
     """
     Fetch all annotations with the given ids and order them based on the list
     of ids.
@@ -68,6 +73,11 @@ def fetch_ordered_annotations(session, ids, query_processor=None):
                             returns an updated query
     :type query_processor: callable
 
+    :param cache: an optional annotation cache to read through, in which case
+                  ``query_processor`` only applies to annotations which
+                  aren't cached
+    :type cache: h.services.annotation_cache.AnnotationCacheService
+
     :returns: the annotation, if found, or None.
     :rtype: memex.models.Annotation, NoneType
     """
@@ -76,6 +86,11 @@ def fetch_ordered_annotations(session, ids, query_processor=None):
 
     ordering = {x: i for i, x in enumerate(ids)}
 
+    if cache is not None:
+        annotations = cache.fetch(session, ids,
+                                  query_processor=query_processor)
+        return sorted(annotations.values(), key=lambda a: ordering.get(a.id))
+
     query = session.query(models.Annotation).filter(models.Annotation.id.in_(ids))
     if query_processor:
         query = query_processor(query)
@@ -84,6 +99,34 @@ def fetch_ordered_annotations(session, ids, query_processor=None):
     return anns
 
 
+def fetch_annotations_by_id(session, ids):
+    """
+    Fetch the annotations with the given ids.
+
+    Ids which aren't valid annotation ids are ignored.
+
+    :param session: the database session
+    :type session: sqlalchemy.orm.session.Session
+
+    :param ids: the annotation ids
+    :type ids: iterable of str
+
+    :returns: the annotations found, by id
+    :rtype: dict
+    """
+    if not ids:
+        return {}
+    try:
+        query = (session.query(models.Annotation)
+                 .filter(models.Annotation.id.in_(ids)))
+        return {a.id: a for a in query}
+    except types.InvalidUUID:
+        # One invalid id spoils the whole query, so fall back to fetching the
+        # annotations one by one.
+        annotations = [fetch_annotation(session, id_) for id_ in ids]
+        return {a.id: a for a in annotations if a is not None}
+
+
 def create_annotation(request, data, group_service):
     """
     Create an annotation from passed data.
@@ -149,6 +192,99 @@ def create_annotation(request, data, group_service):
     return annotation
 
 
+def create_annotations(request, data_list, group_service):
+    """
+    Create many annotations from a list of passed data.
+
+    This is equivalent to calling :py:func:`create_annotation` for each item
+    of ``data_list``, but replies' parents are fetched with one query, each
+    distinct group is looked up and checked once, document metadata is
+    updated once for each distinct target URI, and the annotations are
+    flushed together.
+
+    :param request: the request object
+    :type request: pyramid.request.Request
+
+    :param data_list: dictionaries of annotation properties
+    :type data_list: list of dicts
+
+    :param group_service: a service object that adheres to ``memex.interfaces.IGroupService``
+    :type group_service: memex.interfaces.IGroupService
+
+    :raises memex.schemas.ValidationError: if any of the annotations can't be
+        created, with a message prefixed by the position of its data in
+        ``data_list``
+
+    :returns: the created and flushed annotations, in the same order as
+        ``data_list``
+    :rtype: list of memex.models.Annotation
+    """
+    created = updated = datetime.utcnow()
+
+    parent_ids = set(data['references'][0] for data in data_list
+                     if data['references'])
+    parents = fetch_annotations_by_id(request.db, parent_ids)
+
+    writable_groups = {}
+    document_claims = {}
+    annotations = []
+    for i, data in enumerate(data_list):
+        document_uri_dicts = data['document']['document_uri_dicts']
+        document_meta_dicts = data['document']['document_meta_dicts']
+        del data['document']
+
+        if data['references']:
+            top_level_annotation_id = data['references'][0]
+            top_level_annotation = parents.get(top_level_annotation_id)
+            if top_level_annotation:
+                data['groupid'] = top_level_annotation.groupid
+            else:
+                raise schemas.ValidationError(
+                    '{}.references.0: '.format(i) +
+                    _('Annotation {id} does not exist').format(
+                        id=top_level_annotation_id)
+                )
+
+        groupid = data['groupid']
+        if groupid not in writable_groups:
+            group = group_service.find(groupid)
+            writable_groups[groupid] = (
+                group is not None and
+                request.has_permission('write', context=group))
+        if not writable_groups[groupid]:
+            raise schemas.ValidationError('{}.group: '.format(i) +
+                                          _('You may not create annotations '
+                                            'in the specified group!'))
+
+        annotation = models.Annotation(**data)
+        annotation.created = created
+        annotation.updated = updated
+        annotations.append(annotation)
+
+        claims = document_claims.setdefault(annotation.target_uri,
+                                            ([], [], []))
+        claims[0].extend(document_meta_dicts)
+        claims[1].extend(document_uri_dicts)
+        claims[2].append(annotation)
+
+    for target_uri, claims in document_claims.items():
+        document_meta_dicts, document_uri_dicts, targets = claims
+        document = models.update_document_metadata(
+            request.db,
+            target_uri,
+            document_meta_dicts,
+            document_uri_dicts,
+            created=created,
+            updated=updated)
+        for annotation in targets:
+            annotation.document = document
+
+    request.db.add_all(annotations)
+    request.db.flush()
+
+    return annotations
+
+
 def update_annotation(session, id_, data):
     """
     Update an existing annotation and its associated document metadata.
@@ -12,7 +12,9 @@ from h.realtime import Consumer
 from memex.links import LinksService
 from memex.resources import AnnotationResource
 from h.auth.util import translate_annotation_principals
+from h.services.nipsa import NIPSA_CHANGED
 from h.services.nipsa import NipsaService
+from h.services.nipsa import flagged_userids_cache
 from h.services.groupfinder import GroupfinderService
 from h.streamer import websocket
 import h.sentry
@@ -91,7 +93,7 @@ def handle_annotation_event(message, sockets, settings, session):
         log.warn('received annotation event for missing annotation: %s', id_)
         return
 
-    nipsa_service = NipsaService(session)
+    nipsa_service = NipsaService(session, cache=flagged_userids_cache)
     user_nipsad = nipsa_service.is_flagged(annotation.userid)
 
     auth_domain = text_type(settings.get('h.auth_domain', 'localhost'))
@@ -105,6 +107,12 @@ def handle_annotation_event(message, sockets, settings, session):
 
 
 def handle_user_event(message, sockets, settings, session):
+    if message.get('type') == NIPSA_CHANGED:
+        # A user has been flagged or unflagged, so the cached set of flagged
+        # userids must be reloaded. This isn't sent on to any clients.
+        flagged_userids_cache.invalidate()
+        return
+
     for socket in sockets:
         reply = _generate_user_event(message, socket)
         if reply is None:
@@ -10,6 +10,7 @@ from gevent.queue import Full
 import jsonschema
 from ws4py.websocket import WebSocket as _WebSocket
 
+from h import renderers
 from h import storage
 from h.streamer import filter
 
@@ -61,6 +62,7 @@ class WebSocket(_WebSocket):
         self.authenticated_userid = environ['h.ws.authenticated_userid']
         self.effective_principals = environ['h.ws.effective_principals']
         self.registry = environ['h.ws.registry']
+        self.json_encoder = renderers.get_encoder(self.registry)
 
         self._work_queue = environ['h.ws.streamer_work_queue']
 
@@ -90,7 +92,7 @@ class WebSocket(_WebSocket):
 
     def send_json(self, payload):
         if not self.terminated:
-            self.send(json.dumps(payload))
+            self.send(self.json_encoder.dumps(payload))
 
 
 def handle_message(message, session=None):
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 
 
+from memex.events import annotation_events
+
 from h import __version__
 from h import emails
 from h import storage
@@ -31,12 +33,42 @@ def add_renderer_globals(event):
 
 def publish_annotation_event(event):
     """Publish an annotation event to the message queue."""
-    data = {
-        'action': event.action,
-        'annotation_id': event.annotation_id,
-        'src_client_id': event.request.headers.get('X-Client-Id'),
-    }
-    event.request.realtime.publish_annotation(data)
+    src_client_id = event.request.headers.get('X-Client-Id')
+    for annotation_event in annotation_events(event):
+        data = {
+            'action': annotation_event.action,
+            'annotation_id': annotation_event.annotation_id,
+            'src_client_id': src_client_id,
+        }
+        event.request.realtime.publish_annotation(data)
+
+
+def invalidate_annotation_cache(event):
+    """Remove the annotations of an annotation event from the cache."""
+    cache = event.request.find_service(name='annotation_cache')
+    if cache is not None:
+        for annotation_event in annotation_events(event):
+            cache.invalidate(annotation_event.annotation_id)
+
+
+def invalidate_facet_cache(event):
+    """Invalidate cached activity page facets for the annotations' groups."""
+    facet_cache = event.request.find_service(name='facet_cache')
+    groupids = set(e.groupid for e in annotation_events(event))
+    for groupid in groupids:
+        facet_cache.invalidate(groupid)
+
+
+def purge_http_cache(event):
+    """Purge shared HTTP caches of responses affected by an annotation event."""
+    request = event.request
+    http_cache = request.find_service(name='http_cache')
+    if not http_cache.purge_url:
+        return
+    ids = [e.annotation_id for e in annotation_events(event)]
+    with request.tm:
+        annotations = storage.fetch_annotations_by_id(request.db, ids)
+        http_cache.purge(annotations.values())
 
 
 def send_reply_notifications(event,
@@ -46,10 +78,12 @@ def send_reply_notifications(event,
     """Queue any reply notification emails triggered by an annotation event."""
     request = event.request
     with request.tm:
-        annotation = storage.fetch_annotation(event.request.db,
-                                              event.annotation_id)
-        notification = get_notification(request, annotation, event.action)
-        if notification is None:
-            return
-        send_params = generate_mail(request, notification)
-        send(*send_params)
+        for annotation_event in annotation_events(event):
+            annotation = storage.fetch_annotation(request.db,
+                                                  annotation_event.annotation_id)
+            notification = get_notification(request, annotation,
+                                            annotation_event.action)
+            if notification is None:
+                continue
+            send_params = generate_mail(request, notification)
+            send(*send_params)
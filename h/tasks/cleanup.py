@@ -7,10 +7,15 @@ from datetime import datetime, timedelta
 from h import models
 from h.celery import celery
 from h.celery import get_task_logger
+from h.db import purge
 
 
 log = get_task_logger(__name__)
 
+# By default, stop starting new batches of deletions after this many seconds,
+# leaving any remaining rows for the next run.
+DEFAULT_TIME_BUDGET = 600
+
 
 @celery.task
 def purge_deleted_annotations():
@@ -23,27 +28,47 @@ def purge_deleted_annotations():
     streamer.
     """
     cutoff = datetime.utcnow() - timedelta(minutes=10)
-    celery.request.db.query(models.Annotation) \
+    query = celery.request.db.query(models.Annotation) \
         .filter_by(deleted=True) \
-        .filter(models.Annotation.updated < cutoff) \
-        .delete()
+        .filter(models.Annotation.updated < cutoff)
+    count = _purge(query)
+    log.info('purged %d deleted annotations', count)
+    return count
 
 
 @celery.task
 def purge_expired_auth_tickets():
-    celery.request.db.query(models.AuthTicket) \
-        .filter(models.AuthTicket.expires < datetime.utcnow()) \
-        .delete()
+    query = celery.request.db.query(models.AuthTicket) \
+        .filter(models.AuthTicket.expires < datetime.utcnow())
+    count = _purge(query)
+    log.info('purged %d expired auth tickets', count)
+    return count
 
 
 @celery.task
 def purge_expired_tokens():
-    celery.request.db.query(models.Token) \
-        .filter(models.Token.expires < datetime.utcnow()) \
-        .delete()
+    query = celery.request.db.query(models.Token) \
+        .filter(models.Token.expires < datetime.utcnow())
+    count = _purge(query)
+    log.info('purged %d expired tokens', count)
+    return count
 
 
 @celery.task
 def purge_removed_features():
     """Remove old feature flags from the database."""
     models.Feature.remove_old_flags(celery.request.db)
+
+
+def _purge(query):
+    """Delete the rows matched by ``query`` in committed batches."""
+    settings = celery.request.registry.settings
+    rate = settings.get('h.purge.rate')
+    time_budget = settings.get('h.purge.time_budget', DEFAULT_TIME_BUDGET)
+    return purge.purge(
+        query,
+        commit=celery.request.tm.commit,
+        batch_size=int(settings.get('h.purge.batch_size',
+                                    purge.DEFAULT_BATCH_SIZE)),
+        rate=float(rate) if rate else None,
+        time_budget=float(time_budget) if time_budget else None)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+"""
+A task for purging responses from a shared HTTP cache.
+
+See :py:mod:`h.services.http_cache` for how responses are marked as
+cacheable and tagged with surrogate keys.
+"""
+
+import requests
+
+from h.celery import celery
+
+__all__ = ('purge',)
+
+# The timeout, in seconds, of each purge request.
+TIMEOUT = 5
+
+
+@celery.task(bind=True, max_retries=3)
+def purge(self, keys):
+    """
+    Purge the cached responses tagged with any of the given surrogate keys.
+
+    Sends a ``PURGE`` request, with the space-separated keys in its
+    ``Surrogate-Key`` header, to the URL in the ``h.http_cache.purge_url``
+    setting.
+
+    :param keys: the surrogate keys to purge
+    :type keys: list of unicode strings
+    """
+    url = celery.request.registry.settings.get('h.http_cache.purge_url')
+    if not url:
+        return
+
+    try:
+        response = requests.request('PURGE', url,
+                                    headers={'Surrogate-Key': ' '.join(keys)},
+                                    timeout=TIMEOUT)
+        response.raise_for_status()
+    except requests.RequestException as exc:
+        # Exponential backoff in case the cache is having problems.
+        countdown = self.default_retry_delay * 2 ** self.request.retries
+        self.retry(exc=exc, countdown=countdown)
@@ -1,12 +1,88 @@
 # -*- coding: utf-8 -*-
 
+import collections
+import ctypes
+import multiprocessing
+import os
+import time
+
+from celery.contrib.batches import Batches
+from celery.worker.control import Panel
+
 from h import storage
 from h.celery import celery
+from h.celery import get_task_logger
+from h.indexer.reindexer import REINDEX_STATE_CHANGED
 from h.indexer.reindexer import SETTING_NEW_INDEX
 
+from memex.search.index import BatchIndexer
 from memex.search.index import index
 from memex.search.index import delete
 
+log = get_task_logger(__name__)
+
+# The maximum number of pending index_annotations messages to process at once,
+# and the maximum time (in milliseconds) to wait for a batch to fill up.
+#
+# N.B. The worker consuming the indexer queue must prefetch at least
+# BATCH_SIZE messages (see CELERYD_PREFETCH_MULTIPLIER in h.celery), otherwise
+# every batch waits for BATCH_INTERVAL before it is flushed.
+BATCH_SIZE = int(os.environ.get('INDEXER_BATCH_SIZE', 100))
+BATCH_INTERVAL = int(os.environ.get('INDEXER_BATCH_INTERVAL', 500))
+
+# How long (in seconds) a worker process trusts its cached reindex state for if
+# it doesn't hear that the state has changed. This only matters if a worker
+# misses a broadcast, e.g. because it was disconnected from the broker.
+REINDEX_STATE_TTL = 60
+
+
+class _ReindexStateCache(object):
+
+    """
+    A process-wide cache of the name of the index being reindexed into.
+
+    A reindex is only in progress for a few hours a year, so rather than
+    asking the settings service on every task, each process caches the answer
+    until :py:meth:`invalidate` is called, or ``ttl`` seconds have passed.
+
+    The generation counter lives in shared memory, so that invalidating the
+    cache in a worker's main process (which is where celery's remote control
+    commands are handled) also invalidates it in the pool processes forked
+    from it.
+    """
+
+    def __init__(self, ttl=REINDEX_STATE_TTL, clock=time.time):
+        self.ttl = ttl
+        self.clock = clock
+
+        self._generation = multiprocessing.RawValue(ctypes.c_ulong, 0)
+        self._loaded_generation = None
+        self._expires = 0
+        self._value = None
+
+    def get(self, load):
+        """Return the cached value, calling ``load`` to refresh it if stale."""
+        generation = self._generation.value
+        now = self.clock()
+        if generation != self._loaded_generation or now >= self._expires:
+            self._value = load()
+            self._loaded_generation = generation
+            self._expires = now + self.ttl
+        return self._value
+
+    def invalidate(self):
+        self._generation.value += 1
+
+
+_reindex_state = _ReindexStateCache()
+
+
+@Panel.register
+def reindex_state_changed(state):
+    """Handle the broadcast sent when a reindex starts or finishes."""
+    _reindex_state.invalidate()
+    return {'ok': 'reindex state invalidated'}
+
 
 @celery.task
 def add_annotation(id_):
@@ -33,8 +109,61 @@ def delete_annotation(id_):
         delete(celery.request.es, id_, target_index=future_index)
 
 
+@celery.task(base=Batches,
+             flush_every=BATCH_SIZE,
+             flush_interval=BATCH_INTERVAL / 1000.0)
+def index_annotations(requests):
+    """
+    Index or delete a batch of annotations.
+
+    Each queued message has the arguments ``(annotation_id, action)``, where
+    ``action`` is ``'index'`` or ``'delete'``. Only the most recent action for
+    each annotation is applied, annotations to index are loaded with a single
+    query, and each index is written to with bulk requests.
+    """
+    actions = collections.OrderedDict()
+    for req in requests:
+        id_, action = req.args
+        actions.pop(id_, None)
+        actions[id_] = action
+
+    to_index = [id_ for id_, action in actions.items() if action == 'index']
+    to_delete = [id_ for id_, action in actions.items() if action == 'delete']
+
+    request = celery.request
+
+    # Batched tasks don't send the task_prerun or task_success/failure signals
+    # handled in h.celery, so reset per-task state and end the transaction
+    # ourselves.
+    request.feature.clear()
+    request.find_service(name='nipsa').clear()
+    try:
+        target_indexes = [None]
+
+        # If a reindex is running at the moment, write to the new index as
+        # well.
+        future_index = _current_reindex_new_name(request)
+        if future_index is not None:
+            target_indexes.append(future_index)
+
+        for target_index in target_indexes:
+            indexer = BatchIndexer(request.db, request.es, request,
+                                   target_index=target_index)
+            errored = set()
+            if to_index:
+                errored.update(indexer.index(to_index))
+            if to_delete:
+                errored.update(indexer.delete(to_delete))
+            if errored:
+                log.warning('failed to index %d annotations: %s',
+                            len(errored), ', '.join(sorted(errored)))
+    finally:
+        request.tm.abort()
+
+
 def _current_reindex_new_name(request):
-    settings = celery.request.find_service(name='settings')
-    new_index = settings.get(SETTING_NEW_INDEX)
+    def load():
+        settings = request.find_service(name='settings')
+        return settings.get(SETTING_NEW_INDEX)
 
-    return new_index
+    return _reindex_state.get(load)
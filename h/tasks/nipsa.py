@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 """Worker functions for the NIPSA feature."""
 
+import time
+
 from elasticsearch import helpers
 
 from h.celery import celery
@@ -9,6 +11,17 @@ from h.nipsa import search
 
 log = get_task_logger(__name__)
 
+# The number of annotations to update in each bulk request.
+CHUNK_SIZE = 500
+
+# How many times to retry annotations which fail to update, and the delay in
+# seconds before the first retry (which doubles for each subsequent retry).
+MAX_RETRIES = 3
+RETRY_DELAY = 1
+
+# How often to log progress, in annotations.
+PROGRESS_EVERY = 5000
+
 
 def add_nipsa_action(index, annotation):
     """Return an Elasticsearch action for adding NIPSA to the annotation."""
@@ -23,18 +36,21 @@ def add_nipsa_action(index, annotation):
 
 def remove_nipsa_action(index, annotation):
     """Return an Elasticsearch action to remove NIPSA from the annotation."""
-    source = annotation["_source"].copy()
-    source.pop("nipsa", None)
+    # A partial update rather than reindexing the whole document without the
+    # field: annotations are filtered on "nipsa": true, so false is the same
+    # as no flag at all.
     return {
-        "_op_type": "index",
+        "_op_type": "update",
         "_index": index,
         "_type": "annotation",
         "_id": annotation["_id"],
-        "_source": source,
+        "doc": {"nipsa": False}
     }
 
 
-def bulk_update_annotations(client, query, action):
+def bulk_update_annotations(client, query, action,
+                            chunk_size=CHUNK_SIZE,
+                            max_retries=MAX_RETRIES):
     """
     Bulk update annotations matching a query with a passed action function.
 
@@ -42,7 +58,12 @@ def bulk_update_annotations(client, query, action):
     updates to a set of annotations. Annotations matching the passed query will
     be passed one-by-one to the passed "action" function, which must return an
     action dictionary in the form dictated by the Elasticsearch bulk update
-    API.
+    API. The action function is only passed the ``_id`` of each annotation,
+    not its ``_source``.
+
+    Actions are sent in bulk requests of ``chunk_size`` as the scan proceeds,
+    so only one chunk is held in memory at a time. Annotations which fail to
+    update are retried, up to ``max_retries`` times.
 
     :param client: the Elasticsearch client instance
     :type client: memex.search.client.Client
@@ -52,12 +73,43 @@ def bulk_update_annotations(client, query, action):
 
     :param action: a function mapping annotations to bulk actions
     :type action: function
+
+    :returns: the ids of any annotations which couldn't be updated
+    :rtype: set
     """
     annotations = helpers.scan(client=client.conn,
                                index=client.index,
-                               query=query)
-    actions = [action(client.index, a) for a in annotations]
-    helpers.bulk(client=client.conn, actions=actions)
+                               query=query,
+                               _source=False)
+    actions = (action(client.index, a) for a in annotations)
+    failed = _bulk(client, actions, chunk_size)
+
+    for attempt in range(1, max_retries + 1):
+        if not failed:
+            break
+        log.warn("retrying %d failed annotation updates (attempt %d of %d)",
+                 len(failed), attempt, max_retries)
+        time.sleep(RETRY_DELAY * 2 ** (attempt - 1))
+        actions = (action(client.index, {"_id": id_}) for id_ in failed)
+        failed = _bulk(client, actions, chunk_size)
+
+    if failed:
+        log.error("failed to update %d annotations: %r", len(failed), failed)
+    return failed
+
+
+def _bulk(client, actions, chunk_size):
+    results = helpers.streaming_bulk(client=client.conn,
+                                     actions=actions,
+                                     chunk_size=chunk_size,
+                                     raise_on_error=False)
+    failed = set()
+    for i, (ok, item) in enumerate(results, 1):
+        if not ok:
+            failed.add(item["update"]["_id"])
+        if i % PROGRESS_EVERY == 0:
+            log.info("updated %d annotations (%d failed)", i, len(failed))
+    return failed
 
 
 @celery.task
@@ -5,4 +5,12 @@
 
 def utc_iso8601(datetime):
     """Convert a UTC datetime into an ISO8601 timestamp string."""
-    return datetime.strftime('%Y-%m-%dT%H:%M:%S.%f+00:00')
+    if datetime.tzinfo is not None:
+        return datetime.strftime('%Y-%m-%dT%H:%M:%S.%f+00:00')
+
+    # This is called for every timestamp in API responses, and isoformat() is
+    # several times faster than strftime(). It omits the microseconds when
+    # there are none, though.
+    if datetime.microsecond:
+        return datetime.isoformat() + '+00:00'
+    return datetime.isoformat() + '.000000+00:00'
@@ -2,8 +2,11 @@
 
 from __future__ import unicode_literals
 
+import hashlib
+
 from pyramid.view import view_config
 
+from h import __version__
 from h.util import cors
 
 cors_policy = cors.policy(
@@ -25,6 +28,32 @@ def handle_exception(request):
         raise
 
 
+def annotation_validators(context, request):
+    """
+    Return the ETag and Last-Modified time of an annotation's representation.
+
+    For use as the ``validators`` view option (see
+    :py:func:`h.viewderivers.conditional_view`) of views which present an
+    annotation resource. The validators depend only on the annotation's
+    ``updated`` time, whether the caller is logged in and the application
+    version, so they can be computed without presenting the annotation.
+
+    A change to the title of the annotation's document doesn't change its
+    ``updated`` time, so clients can keep a stale title until the annotation
+    itself is next edited.
+    """
+    annotation = context.annotation
+    if request.authenticated_userid is None:
+        principal_class = 'anonymous'
+    else:
+        principal_class = 'authenticated'
+    key = ':'.join([annotation.id,
+                    annotation.updated.isoformat(),
+                    principal_class,
+                    __version__])
+    return hashlib.md5(key.encode('utf-8')).hexdigest(), annotation.updated
+
+
 def json_view(**settings):
     """A view configuration decorator with JSON defaults."""
     settings.setdefault('accept', 'application/json')
@@ -2,6 +2,9 @@
 
 from __future__ import unicode_literals
 
+from dateutil import tz
+from pyramid.httpexceptions import HTTPNotModified
+
 
 def csp_protected_view(view, info):
     """
@@ -40,5 +43,55 @@ def csp_protected_view(view, info):
 csp_protected_view.options = ('csp_insecure_optout',)
 
 
+def conditional_view(view, info):
+    """
+    A view deriver which answers conditional GET requests before the view runs.
+
+    Views can specify a ``validators`` view option: a function which is passed
+    the view's context and request and returns an ``(etag, last_modified)``
+    pair for the response. If the request's ``If-None-Match`` header (or, if
+    there is none, its ``If-Modified-Since`` header) shows the client already
+    has that response, a 304 response is returned without calling the view.
+    Otherwise the validators are set on the view's response, so the
+    conditional HTTP tween doesn't have to hash the rendered body.
+
+    Validators are computed after the view's permission check, so they can
+    assume the caller may see the resource.
+    """
+    validators = info.options.get('validators')
+    if validators is None:
+        return view
+
+    def wrapper_view(context, request):
+        if request.method not in ('GET', 'HEAD'):
+            return view(context, request)
+
+        etag, last_modified = validators(context, request)
+        if _not_modified(request, etag, last_modified):
+            return HTTPNotModified(etag=etag, last_modified=last_modified)
+
+        resp = view(context, request)
+        if resp.status_code == 200:
+            resp.etag = etag
+            resp.last_modified = last_modified
+        return resp
+    return wrapper_view
+
+
+conditional_view.options = ('validators',)
+
+
+def _not_modified(request, etag, last_modified):
+    if request.if_none_match:
+        return etag in request.if_none_match
+    if request.if_modified_since and last_modified is not None:
+        since = request.if_modified_since.astimezone(tz.tzutc())
+        # HTTP dates have a resolution of one second.
+        return (last_modified.replace(microsecond=0) <=
+                since.replace(tzinfo=None))
+    return False
+
+
 def includeme(config):
     config.add_view_deriver(csp_protected_view)
+    config.add_view_deriver(conditional_view)
@@ -22,18 +22,28 @@ from sqlalchemy.orm import subqueryload
 import venusian
 
 from memex import models
+from memex.events import AnnotationBatchEvent
 from memex.events import AnnotationEvent
 from memex.interfaces import IGroupService
 from memex.resources import AnnotationResource
 from memex import search as search_lib
 from memex import schemas
 
+from h import export
+from h import outbox
+from h._compat import string_types
+from h import renderers
 from h import storage
+from h.presenters import AnnotationJSONBatchPresenter
 from h.presenters import AnnotationJSONPresenter, AnnotationJSONLDPresenter
 from h.util import cors
+from h.util.view import annotation_validators
 
 _ = i18n.TranslationStringFactory(__package__)
 
+# The maximum number of operations accepted in one bulk API request.
+MAX_BULK_OPERATIONS = 500
+
 # FIXME: unify (or at least deduplicate) CORS policy between this file and
 #        `h.util.view`
 cors_policy = cors.policy(
@@ -202,9 +212,70 @@ def search(request):
     if separate_replies:
         out['replies'] = _present_annotations(request, result.reply_ids)
 
+    uris = request.params.getall('uri') + request.params.getall('url')
+    if uris:
+        http_cache = request.find_service(name='http_cache')
+        http_cache.cache_if_anonymous(request, uris=uris,
+                                      groupids=request.params.getall('group'))
+
     return out
 
 
+@api_config(route_name='api.export',
+            request_method='GET',
+            accept=None,
+            effective_principals=security.Authenticated,
+            link_name='export',
+            description='Export annotations as newline-delimited JSON')
+def export_annotations(request):
+    """
+    Stream the annotations matching the query as newline-delimited JSON.
+
+    Without a ``group`` parameter the user's own annotations are exported.
+    With one, the shared annotations in that group, and the user's own
+    annotations in it, are exported, as they would be found by a search.
+    Either can be narrowed down by ``user``, ``uri`` (or ``url``), and by the
+    time the annotations were last updated, with ``since`` and ``until``.
+    """
+    userid = request.authenticated_userid
+    filters = {
+        'userid': request.params.get('user'),
+        'uris': request.params.getall('uri') + request.params.getall('url'),
+        'since': _datetime_param(request, 'since'),
+        'until': _datetime_param(request, 'until'),
+    }
+
+    pubid = request.params.get('group')
+    if pubid is None:
+        if filters['userid'] not in (None, userid):
+            raise APIError(_("You may only export your own annotations "
+                             "unless you export a group's annotations."),
+                           status_code=403)
+        filters['userid'] = userid
+    else:
+        group = request.find_service(IGroupService).find(pubid)
+        if group is None or not request.has_permission('read', group):
+            raise APIError(_('Group not found.'), status_code=404)
+        if pubid == '__world__' and filters['userid'] is None:
+            raise APIError(_('Exports of the public group must be limited '
+                             'to one user.'), status_code=400)
+
+        nipsa_service = request.find_service(name='nipsa')
+        filters['groupid'] = pubid
+        filters['readable_by'] = userid
+        filters['exclude_userids'] = nipsa_service.flagged_userids - {userid}
+
+    response = request.response
+    response.content_type = export.CONTENT_TYPE
+    response.app_iter = export.export_annotations(
+        request.registry['sqlalchemy.engine'],
+        filters,
+        request.find_service(name='links'),
+        request.auth_domain,
+        renderers.get_encoder(request.registry))
+    return response
+
+
 @api_config(route_name='api.annotations',
             request_method='POST',
             effective_principals=security.Authenticated,
@@ -229,6 +300,7 @@ def create(request):
 @api_config(route_name='api.annotation',
             request_method='GET',
             permission='read',
+            validators=annotation_validators,
             link_name='annotation.read',
             description='Fetch an annotation')
 def read(context, request):
@@ -239,7 +311,8 @@ def read(context, request):
 
 @api_config(route_name='api.annotation.jsonld',
             request_method='GET',
-            permission='read')
+            permission='read',
+            validators=annotation_validators)
 def read_jsonld(context, request):
     request.response.content_type = 'application/ld+json'
     request.response.content_type_params = {
@@ -298,6 +371,144 @@ def delete(context, request):
     return {'id': context.annotation.id, 'deleted': True}
 
 
+@api_config(route_name='api.bulk',
+            request_method='POST',
+            effective_principals=security.Authenticated,
+            link_name='bulk',
+            description='Create, update or delete many annotations')
+def bulk(request):
+    """
+    Apply a list of annotation operations from the POST payload.
+
+    The payload is an object with an ``operations`` list, each of which is an
+    object with an ``action`` (``create``, ``update`` or ``delete``), the
+    ``id`` of the annotation to update or delete, and the ``data`` of the
+    annotation to create or update it with, as it would be passed to the
+    single annotation endpoints.
+
+    Every operation is validated before any of them is applied, and then they
+    are all applied in the request's transaction. If any operation is
+    invalid, none are applied and the response lists the reason each invalid
+    operation failed. Otherwise the response lists what the single
+    annotation endpoints would have returned for each operation, in order.
+    """
+    operations = _bulk_operations(_json_payload(request))
+
+    group_service = request.find_service(IGroupService)
+    links_service = request.find_service(name='links')
+
+    existing = storage.fetch_annotations_by_id(
+        request.db,
+        set(op['id'] for op in operations
+            if isinstance(op, dict) and
+            isinstance(op.get('id'), string_types)))
+
+    validated = []
+    failures = {}
+    for i, op in enumerate(operations):
+        try:
+            validated.append(_validate_bulk_operation(request,
+                                                      op,
+                                                      existing,
+                                                      group_service,
+                                                      links_service))
+        except schemas.ValidationError as err:
+            failures[i] = err.message
+
+    if failures:
+        request.response.status_code = 400
+        return {
+            'status': 'failure',
+            'reason': _('Some operations are invalid, so none were applied.'),
+            'results': [{'status': 'failure', 'reason': failures[i]}
+                        if i in failures else {'status': 'valid'}
+                        for i in range(len(operations))],
+        }
+
+    creates = [appstruct for action, id_, appstruct in validated
+               if action == 'create']
+    created = iter(storage.create_annotations(request, creates, group_service))
+
+    annotations = []
+    events = []
+    for action, id_, appstruct in validated:
+        if action == 'create':
+            annotation = next(created)
+        elif action == 'update':
+            annotation = storage.update_annotation(request.db, id_, appstruct)
+        else:
+            annotation = existing[id_]
+            storage.delete_annotation(request.db, id_)
+        annotations.append((action, annotation))
+        events.append(_annotation_event(request, annotation, action))
+
+    request.notify_after_commit(AnnotationBatchEvent(request, events))
+
+    results = []
+    for action, annotation in annotations:
+        if action == 'delete':
+            results.append({'id': annotation.id, 'deleted': True})
+        else:
+            resource = AnnotationResource(annotation, group_service,
+                                          links_service)
+            results.append(AnnotationJSONPresenter(resource).asdict())
+    return {'results': results}
+
+
+def _bulk_operations(payload):
+    """Return the list of operations in a bulk API payload."""
+    operations = payload.get('operations') if isinstance(payload, dict) else None
+    if not isinstance(operations, list):
+        raise APIError(_('Expected a list of operations.'), status_code=400)
+    if len(operations) > MAX_BULK_OPERATIONS:
+        raise APIError(
+            _('Too many operations, the maximum is {max}.').format(
+                max=MAX_BULK_OPERATIONS),
+            status_code=400)
+    return operations
+
+
+def _validate_bulk_operation(request, op, existing, group_service, links_service):
+    """
+    Validate an operation from a bulk API payload.
+
+    :returns: a tuple of the operation's action, annotation id and validated
+        data
+    :raises memex.schemas.ValidationError: if the operation is invalid
+    """
+    if not isinstance(op, dict):
+        raise schemas.ValidationError(_('Expected an object.'))
+
+    action = op.get('action')
+    if action == 'create':
+        schema = schemas.CreateAnnotationSchema(request)
+        return (action, None, schema.validate(op.get('data')))
+
+    if action not in ('update', 'delete'):
+        raise schemas.ValidationError(
+            'action: ' + _("'action' must be one of create, update or delete"))
+
+    id_ = op.get('id')
+    annotation = existing.get(id_)
+    if annotation is None:
+        raise schemas.ValidationError(
+            'id: ' + _('Annotation {id} does not exist').format(id=id_))
+
+    resource = AnnotationResource(annotation, group_service, links_service)
+    if not request.has_permission(action, resource):
+        raise schemas.ValidationError(
+            'id: ' + _('You may not {action} annotation {id}').format(
+                action=action, id=id_))
+
+    if action == 'delete':
+        return (action, id_, None)
+
+    schema = schemas.UpdateAnnotationSchema(request,
+                                            annotation.target_uri,
+                                            annotation.groupid)
+    return (action, id_, schema.validate(op.get('data')))
+
+
 def _json_payload(request):
     """
     Return a parsed JSON payload for the request.
@@ -310,27 +521,50 @@ def _json_payload(request):
         raise PayloadError()
 
 
+def _datetime_param(request, name):
+    """Return the named query parameter as a datetime, if it was given."""
+    value = request.params.get(name)
+    if value is None:
+        return None
+    try:
+        return export.parse_datetime(value)
+    except ValueError:
+        raise APIError(_('{name} is not a valid date and time.').format(name=name),
+                       status_code=400)
+
+
 def _present_annotations(request, ids):
     """Load annotations by id from the database and present them."""
     def eager_load_documents(query):
         return query.options(
             subqueryload(models.Annotation.document))
 
+    cache = request.find_service(name='annotation_cache')
     annotations = storage.fetch_ordered_annotations(request.db, ids,
-                                                    query_processor=eager_load_documents)
+                                                    query_processor=eager_load_documents,
+                                                    cache=cache)
     group_service = request.find_service(IGroupService)
     links_service = request.find_service(name='links')
-    return [AnnotationJSONPresenter(
-                AnnotationResource(ann, group_service, links_service)).asdict()
-            for ann in annotations]
+    presenter = AnnotationJSONBatchPresenter(annotations,
+                                             group_service,
+                                             links_service)
+    return presenter.asdicts()
 
 
 def _publish_annotation_event(request,
                               annotation,
                               action):
     """Publish an event to the annotations queue for this annotation action."""
-    event = AnnotationEvent(request, annotation.id, action)
-    request.notify_after_commit(event)
+    request.notify_after_commit(_annotation_event(request, annotation, action))
+
+
+def _annotation_event(request, annotation, action):
+    """Return the event for an annotation action, recording it if need be."""
+    if outbox.enabled(request.registry.settings):
+        outbox.add(request, annotation.id, action)
+
+    return AnnotationEvent(request, annotation.id, action,
+                           groupid=annotation.groupid)
 
 
 def _set_at_path(dict_, path, value):
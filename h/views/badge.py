@@ -25,6 +25,9 @@ def badge(request):
     if not uri:
         raise httpexceptions.HTTPBadRequest()
 
+    http_cache = request.find_service(name='http_cache')
+    http_cache.cache_if_anonymous(request, uris=[uri])
+
     if models.Blocklist.is_blocked(request.db, uri):
         return {'total': 0}
 
@@ -16,7 +16,9 @@ _ = i18n.TranslationStringFactory(__package__)
 def _annotations(request):
     """Return the annotations from the search API."""
     result = search.Search(request, stats=request.stats).run(request.params)
-    return fetch_ordered_annotations(request.db, result.annotation_ids)
+    cache = request.find_service(name='annotation_cache')
+    return fetch_ordered_annotations(request.db, result.annotation_ids,
+                                     cache=cache)
 
 
 @view_config(route_name='stream_atom')
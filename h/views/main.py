@@ -16,12 +16,14 @@ from pyramid.view import view_config
 
 from h.views.client import sidebar_app
 from h.util.user import split_user
+from h.util.view import annotation_validators
 
 log = logging.getLogger(__name__)
 
 
 @view_config(route_name='annotation',
              permission='read',
+             validators=annotation_validators,
              renderer='h:templates/app.html.jinja2',
              csp_insecure_optout=True)
 def annotation_page(context, request):
@@ -161,6 +161,7 @@ def create_app(global_config, **settings):
     config.include('h.session')
     config.include('h.sentry')
     config.include('h.stats')
+    config.include('h.renderers')
 
     # We have to include models and db to set up sqlalchemy metadata.
     config.include('h.models')
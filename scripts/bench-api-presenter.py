@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+"""
+Benchmark presenting annotations for API search responses.
+
+Compares presenting each annotation with AnnotationJSONPresenter with
+presenting the whole page with AnnotationJSONBatchPresenter, and reports the
+time taken per page of annotations by each. No database is needed: the
+annotations are generated in memory, with the real link generators and ACL
+authorization policy.
+
+Usage:
+
+    python scripts/bench-api-presenter.py [-n COUNT] [-r REPEAT] [--groups GROUPS]
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+import collections
+import datetime
+import time
+
+from pyramid import security
+from pyramid import testing
+from pyramid.authorization import ACLAuthorizationPolicy
+
+from memex.links import LinksService
+from memex.resources import AnnotationResource
+
+from h import presenters
+
+Annotation = collections.namedtuple('Annotation', [
+    'id', 'created', 'updated', 'userid', 'groupid', 'shared', 'deleted',
+    'text', 'tags', 'target_uri', 'target_selectors', 'references', 'extra',
+    'document', 'thread_root_id'])
+Document = collections.namedtuple('Document', ['title', 'document_uris'])
+
+
+class Group(object):
+    def __init__(self, pubid):
+        self.pubid = pubid
+
+    def __acl__(self):
+        if self.pubid == '__world__':
+            return [(security.Allow, security.Everyone, 'read')]
+        return [(security.Allow, 'group:' + self.pubid, 'read')]
+
+
+class GroupService(object):
+    def find(self, groupid):
+        return Group(groupid)
+
+
+def make_annotations(count, groups):
+    now = datetime.datetime.utcnow()
+    document = Document(title='Example document', document_uris=[])
+    selectors = [{'type': 'TextQuoteSelector', 'exact': 'the quoted text'}]
+    return [Annotation(id='annotation-{:d}'.format(i),
+                       created=now,
+                       updated=now,
+                       userid='acct:user{:d}@example.com'.format(i % 20),
+                       groupid=('__world__' if i % groups == 0
+                                else 'group{:d}'.format(i % groups)),
+                       shared=i % 5 != 0,
+                       deleted=False,
+                       text='Annotation text ' * 20,
+                       tags=['tag1', 'tag2'],
+                       target_uri='http://example.com/{:d}'.format(i % 10),
+                       target_selectors=selectors,
+                       references=[],
+                       extra={},
+                       document=document,
+                       thread_root_id='annotation-{:d}'.format(i))
+            for i in range(count)]
+
+
+def per_annotation(annotations, group_service, links_service):
+    return [presenters.AnnotationJSONPresenter(
+                AnnotationResource(a, group_service, links_service)).asdict()
+            for a in annotations]
+
+
+def batch(annotations, group_service, links_service):
+    return presenters.AnnotationJSONBatchPresenter(
+        annotations, group_service, links_service).asdicts()
+
+
+def measure(func, annotations, group_service, registry, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        # A new links service per page, as in a request.
+        links_service = LinksService('http://localhost:5000', registry)
+        func(annotations, group_service, links_service)
+    return (time.time() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--count', type=int, default=200,
+                        help='number of annotations per page')
+    parser.add_argument('-r', '--repeat', type=int, default=100,
+                        help='number of pages to present')
+    parser.add_argument('--groups', type=int, default=3,
+                        help='number of distinct groups on the page')
+    args = parser.parse_args()
+
+    config = testing.setUp(settings={'h.bouncer_url': 'https://hyp.is'})
+    config.testing_securitypolicy(None)
+    config.set_authorization_policy(ACLAuthorizationPolicy())
+    config.add_route('annotation', '/a/{id}')
+    config.add_route('api.annotation', '/api/annotations/{id}')
+    config.include('pyramid_services')
+    config.include('memex.links')
+    config.include('h.links')
+    config.commit()
+
+    annotations = make_annotations(args.count, args.groups)
+    group_service = GroupService()
+
+    single = measure(per_annotation, annotations, group_service,
+                     config.registry, args.repeat)
+    batched = measure(batch, annotations, group_service,
+                      config.registry, args.repeat)
+
+    print('per annotation: {:>8.2f} ms/page'.format(single * 1000))
+    print('batch:          {:>8.2f} ms/page'.format(batched * 1000))
+    print('speedup:        {:>8.2f}x'.format(single / batched))
+
+    testing.tearDown()
+
+
+if __name__ == '__main__':
+    main()
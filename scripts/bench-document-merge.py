@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+"""
+Benchmark merging documents with large numbers of URI and metadata claims.
+
+Creates sets of duplicate documents, each with CLAIMS document URIs, CLAIMS
+document metadata records and CLAIMS annotations, and times merging them with
+memex.models.merge_documents and with the previous approach of moving each
+claim through the ORM. Everything is done in a transaction which is rolled
+back, so the benchmark can be run against a development database, given by
+the DATABASE_URL environment variable.
+
+Usage:
+
+    python scripts/bench-document-merge.py [-d DUPLICATES] [CLAIMS ...]
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+import datetime
+import os
+import time
+
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker
+
+from memex import db
+from memex import models
+
+DEFAULT_DATABASE_URL = 'postgresql://postgres@localhost/postgres'
+
+
+def make_documents(session, prefix, duplicates, claims):
+    documents = []
+    for i in range(duplicates + 1):
+        document = models.Document()
+        for j in range(claims):
+            uri = 'http://example.com/{}/{:d}/{:d}'.format(prefix, i, j)
+            document.document_uris.append(models.DocumentURI(
+                claimant=uri, uri='http://example.com/' + prefix,
+                type='rel-canonical'))
+            document.meta.append(models.DocumentMeta(
+                claimant=uri, type='title', value=['Title']))
+        session.add(document)
+        session.flush()
+        session.add_all([models.Annotation(userid='acct:bench@example.com',
+                                           groupid='__world__',
+                                           target_uri=uri,
+                                           document_id=document.id)
+                         for _ in range(claims)])
+        documents.append(document)
+    session.flush()
+    return documents
+
+
+def orm_merge(session, documents):
+    # The previous implementation of merge_documents, for comparison.
+    updated = datetime.datetime.utcnow()
+    master = documents[0]
+    duplicates = documents[1:]
+    duplicate_ids = [doc.id for doc in duplicates]
+
+    for doc in duplicates:
+        for _ in range(len(doc.document_uris)):
+            u = doc.document_uris.pop()
+            u.document = master
+            u.updated = updated
+
+        for _ in range(len(doc.meta)):
+            m = doc.meta.pop()
+            m.document = master
+            m.updated = updated
+
+    session.flush()
+    session.query(models.Annotation) \
+        .filter(models.Annotation.document_id.in_(duplicate_ids)) \
+        .update({models.Annotation.document_id: master.id},
+                synchronize_session='fetch')
+    session.query(models.Document) \
+        .filter(models.Document.id.in_(duplicate_ids)) \
+        .delete(synchronize_session='fetch')
+    session.flush()
+
+
+def set_merge(session, documents):
+    models.merge_documents(session, documents)
+    session.flush()
+
+
+def measure(func, session, documents):
+    start = time.time()
+    func(session, documents)
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-d', '--duplicates', type=int, default=2,
+                        help='number of duplicate documents to merge')
+    parser.add_argument('claims', type=int, nargs='*',
+                        default=[100, 1000, 5000],
+                        help='number of claims on each document')
+    args = parser.parse_args()
+
+    engine = sa.create_engine(os.environ.get('DATABASE_URL',
+                                             DEFAULT_DATABASE_URL))
+    db.init(engine, should_create=True)
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = sessionmaker(bind=connection)()
+
+    print('{:>8}  {:>10}  {:>10}  {:>8}'.format('claims', 'orm', 'set-based',
+                                                 'speedup'))
+    try:
+        for claims in args.claims:
+            documents = make_documents(session, 'orm-{:d}'.format(claims),
+                                       args.duplicates, claims)
+            orm_time = measure(orm_merge, session, documents)
+
+            documents = make_documents(session, 'set-{:d}'.format(claims),
+                                       args.duplicates, claims)
+            set_time = measure(set_merge, session, documents)
+
+            print('{:>8d}  {:>9.3f}s  {:>9.3f}s  {:>7.1f}x'.format(
+                claims, orm_time, set_time, orm_time / set_time))
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
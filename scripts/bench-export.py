@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+"""
+Benchmark exporting annotations as newline-delimited JSON.
+
+Creates COUNT annotations for each export size and streams them with
+h.export.stream_annotations, reporting the rate at which annotations are
+exported and the growth in the peak memory use of the process. Sizes are
+exported in increasing order, so an export which holds only one batch in
+memory at a time shows no growth after the first size. Everything is done in
+a transaction which is rolled back, so the benchmark can be run against a
+development database, given by the DATABASE_URL environment variable.
+
+Usage:
+
+    python scripts/bench-export.py [-b BATCH_SIZE] [COUNT ...]
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+import datetime
+import os
+import resource
+import time
+
+import sqlalchemy as sa
+from pyramid import testing
+from sqlalchemy.orm import sessionmaker
+
+# h.models must be imported before memex's models, so that they share a base.
+from h import db
+from h import models
+from h import export
+from h.renderers import JSONEncoder
+from h.services.groupfinder import GroupfinderService
+from memex import uri
+from memex.links import LinksService
+
+DEFAULT_DATABASE_URL = 'postgresql://postgres@localhost/postgres'
+
+
+def make_annotations(session, prefix, count):
+    document = models.Document()
+    session.add(document)
+    session.flush()
+
+    now = datetime.datetime.utcnow()
+    uris = ['http://example.com/{}/{:d}'.format(prefix, i)
+            for i in range(100)]
+    table = models.Annotation.__table__
+    session.execute(table.insert(), [{
+        'userid': 'acct:bench@example.com',
+        'groupid': '__world__',
+        'shared': True,
+        'target_uri': uris[i % 100],
+        'target_uri_normalized': uri.normalize(uris[i % 100]),
+        'target_selectors': [{'type': 'TextQuoteSelector',
+                              'exact': 'the quoted text'}],
+        'text': 'Annotation text ' * 20,
+        'tags': ['tag1', 'tag2'],
+        'references': [],
+        'extra': {},
+        'created': now,
+        'updated': now,
+        'document_id': document.id,
+    } for i in range(count)])
+    return uris
+
+
+def peak_memory():
+    # Peak resident set size, in KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-b', '--batch-size', type=int,
+                        default=export.DEFAULT_BATCH_SIZE,
+                        help='number of annotations to present at a time')
+    parser.add_argument('counts', type=int, nargs='*',
+                        default=[1000, 10000, 50000],
+                        help='number of annotations to export')
+    args = parser.parse_args()
+
+    config = testing.setUp(settings={'h.bouncer_url': 'https://hyp.is'})
+    config.add_route('annotation', '/a/{id}')
+    config.add_route('api.annotation', '/api/annotations/{id}')
+    config.include('pyramid_services')
+    config.include('memex.links')
+    config.include('h.links')
+    config.commit()
+    links_service = LinksService('http://localhost:5000', config.registry)
+
+    engine = sa.create_engine(os.environ.get('DATABASE_URL',
+                                             DEFAULT_DATABASE_URL))
+    db.init(engine, should_create=True)
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = sessionmaker(bind=connection)()
+    group_service = GroupfinderService(session, 'example.com')
+    encoder = JSONEncoder()
+
+    print('{:>8}  {:>10}  {:>14}  {:>12}'.format('count', 'time',
+                                                  'annotations/s', 'peak growth'))
+    try:
+        for count in args.counts:
+            prefix = 'export-{:d}'.format(count)
+            uris = make_annotations(session, prefix, count)
+            query = export.annotations_query(session, uris=uris)
+
+            before = peak_memory()
+            start = time.time()
+            exported = sum(1 for _ in export.stream_annotations(
+                session, query, group_service, links_service, encoder,
+                batch_size=args.batch_size))
+            elapsed = time.time() - start
+
+            print('{:>8d}  {:>9.2f}s  {:>14.0f}  {:>9d} KiB'.format(
+                exported, elapsed, exported / elapsed, peak_memory() - before))
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+        testing.tearDown()
+
+
+if __name__ == '__main__':
+    main()
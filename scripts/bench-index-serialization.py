@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+"""
+Benchmark serializing annotations for the search index.
+
+Compares the per-annotation presenter and event notification used to index
+single annotations with the row-based path used by BatchIndexer, and reports
+the number of documents serialized per second by each. No database or
+Elasticsearch connection is needed: the annotations are generated in memory.
+
+Usage:
+
+    python scripts/bench-index-serialization.py [-n COUNT] [--transform]
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+import collections
+import datetime
+import time
+
+from pyramid import testing
+from zope.interface import implementedBy
+
+from h import presenters
+from memex.events import AnnotationTransformEvent
+
+ROW_FIELDS = ['id', 'created', 'updated', 'userid', 'groupid', 'text', 'tags',
+              'shared', 'target_uri', 'target_uri_normalized',
+              'target_selectors', 'references', 'document_title',
+              'document_web_uri']
+
+Row = collections.namedtuple('Row', ROW_FIELDS)
+Document = collections.namedtuple('Document', ['title', 'web_uri'])
+
+
+class Annotation(object):
+    def __init__(self, row):
+        for field in ROW_FIELDS:
+            setattr(self, field, getattr(row, field))
+        self.document = Document(row.document_title, row.document_web_uri)
+
+
+def make_rows(count):
+    now = datetime.datetime.utcnow()
+    selectors = [{'type': 'TextQuoteSelector',
+                  'exact': 'the quoted text',
+                  'prefix': 'before ',
+                  'suffix': ' after'}]
+    return [Row(id='annotation-{:d}'.format(i),
+                created=now,
+                updated=now,
+                userid='acct:user{:d}@example.com'.format(i % 100),
+                groupid='__world__',
+                text='Annotation text ' * 20,
+                tags=['tag1', 'tag2'],
+                shared=True,
+                target_uri='http://example.com/{:d}'.format(i % 1000),
+                target_uri_normalized='httpx://example.com/{:d}'.format(i % 1000),
+                target_selectors=selectors,
+                references=[],
+                document_title='Example document',
+                document_web_uri='http://example.com/{:d}'.format(i % 1000))
+            for i in range(count)]
+
+
+def presenter_path(request, annotations):
+    for annotation in annotations:
+        data = presenters.AnnotationSearchIndexPresenter(annotation).asdict()
+        request.registry.notify(AnnotationTransformEvent(request, data))
+
+
+def row_path(request, rows):
+    transformers = request.registry.adapters.subscriptions(
+        [implementedBy(AnnotationTransformEvent)], None)
+    for row in rows:
+        data = presenters.search_index_row_asdict(row)
+        if transformers:
+            event = AnnotationTransformEvent(request, data)
+            for transformer in transformers:
+                transformer(event)
+
+
+def transform(event):
+    if event.annotation_dict['user'].endswith('0@example.com'):
+        event.annotation_dict['nipsa'] = True
+
+
+def measure(func, request, items):
+    start = time.time()
+    func(request, items)
+    return len(items) / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--count', type=int, default=50000,
+                        help='number of annotations to serialize')
+    parser.add_argument('--transform', action='store_true',
+                        help='register an AnnotationTransformEvent subscriber')
+    args = parser.parse_args()
+
+    config = testing.setUp()
+    if args.transform:
+        config.add_subscriber(transform, AnnotationTransformEvent)
+    request = testing.DummyRequest(registry=config.registry)
+
+    rows = make_rows(args.count)
+    annotations = [Annotation(row) for row in rows]
+
+    presenter_rate = measure(presenter_path, request, annotations)
+    row_rate = measure(row_path, request, rows)
+
+    print('presenter + notify: {:>10.0f} docs/s'.format(presenter_rate))
+    print('rows:               {:>10.0f} docs/s'.format(row_rate))
+    print('speedup:            {:>10.2f}x'.format(row_rate / presenter_rate))
+
+    testing.tearDown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+"""
+Benchmark encoding API search responses as JSON.
+
+Encodes a search response of COUNT annotations (and as many replies) with the
+standard library's json.dumps, as Pyramid's default JSON renderer does, and
+with h.renderers.JSONEncoder, both in one piece and streamed in chunks, and
+reports the time taken per response by each. The encoder uses ujson if it is
+installed, so run this with and without ujson to compare them.
+
+Usage:
+
+    python scripts/bench-json-renderer.py [-n COUNT] [-r REPEAT]
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+import json
+import time
+
+from h import renderers
+
+
+def make_response(count):
+    def row(i):
+        return {
+            'id': 'annotation-{:d}'.format(i),
+            'created': '2016-11-01T12:34:56.789012+00:00',
+            'updated': '2016-11-01T12:34:56.789012+00:00',
+            'user': 'acct:user{:d}@example.com'.format(i % 20),
+            'uri': 'http://example.com/{:d}'.format(i % 10),
+            'text': 'Annotation text \u00e9 ' * 20,
+            'tags': ['tag1', 'tag2'],
+            'group': '__world__',
+            'permissions': {'read': ['group:__world__'],
+                            'admin': ['acct:user@example.com'],
+                            'update': ['acct:user@example.com'],
+                            'delete': ['acct:user@example.com']},
+            'target': [{'source': 'http://example.com/{:d}'.format(i % 10),
+                        'selector': [{'type': 'TextQuoteSelector',
+                                      'exact': 'the quoted text',
+                                      'prefix': 'before ',
+                                      'suffix': ' after'},
+                                     {'type': 'TextPositionSelector',
+                                      'start': i,
+                                      'end': i + 15}]}],
+            'document': {'title': ['Example document']},
+            'links': {'html': 'https://hyp.is/a/annotation-{:d}'.format(i),
+                      'incontext': 'https://hyp.is/annotation-{:d}'.format(i),
+                      'json': 'https://hypothes.is/api/annotations/'
+                              'annotation-{:d}'.format(i)},
+        }
+    return {'total': count,
+            'rows': [row(i) for i in range(count)],
+            'replies': [row(count + i) for i in range(count)]}
+
+
+def stdlib(value):
+    return json.dumps(value)
+
+
+def encoder_dumps(encoder):
+    return lambda value: encoder.dumps(value)
+
+
+def encoder_stream(encoder):
+    return lambda value: b''.join(encoder.iterencode(value))
+
+
+def measure(func, value, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        func(value)
+    return (time.time() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--count', type=int, default=200,
+                        help='number of rows (and replies) per response')
+    parser.add_argument('-r', '--repeat', type=int, default=100,
+                        help='number of responses to encode')
+    args = parser.parse_args()
+
+    value = make_response(args.count)
+    encoder = renderers.JSONEncoder()
+
+    baseline = measure(stdlib, value, args.repeat)
+    print('ujson installed:  {}'.format('yes' if encoder.fast else 'no'))
+    print('json.dumps:       {:>8.2f} ms/response'.format(baseline * 1000))
+    for name, func in [('encoder:', encoder_dumps(encoder)),
+                       ('encoder stream:', encoder_stream(encoder))]:
+        elapsed = measure(func, value, args.repeat)
+        print('{:<17s} {:>7.2f} ms/response ({:.2f}x)'.format(
+            name, elapsed * 1000, baseline / elapsed))
+
+
+if __name__ == '__main__':
+    main()
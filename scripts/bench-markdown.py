@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+"""
+Benchmark rendering annotation text.
+
+Compares sanitizing rendered Markdown with separate bleach.linkify and
+bleach.clean passes against the single pass used by memex.markdown, and
+reports the number of annotations rendered per second by each, as well as the
+rate of renders served from the render cache. Annotations whose output differs
+between the two sanitizer paths are counted.
+
+The corpus is read from a file of annotation bodies, one JSON-encoded string
+per line, which can be exported from the database with:
+
+    psql -At -c "SELECT to_json(text) FROM annotation WHERE text <> ''" > corpus
+
+Without a corpus a small set of sample annotations is used.
+
+Usage:
+
+    python scripts/bench-markdown.py [--corpus FILE] [-n COUNT]
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+import io
+import json
+import time
+
+import bleach
+from bleach import callbacks as linkify_callbacks
+
+from memex import markdown
+
+SAMPLES = [
+    'Great point! See http://example.com/paper.pdf for the full study.',
+    '_Emphasis_ and **strong** text, with a [link](https://example.org).',
+    '> A quotation from the page\n\nAnd a reply to it, www.example.net.',
+    '1. First\n2. Second\n3. Third, with `inline code`',
+    'Some math: $$e^{i\\pi} + 1 = 0$$ and \\(x^2\\)',
+    '<b>raw</b> HTML <script>alert(1)</script> and <a href="#">a link</a>',
+    '![an image](https://example.com/image.png "title")',
+    'A longer annotation body. ' * 40,
+]
+
+
+def load_corpus(path):
+    with io.open(path, encoding='utf-8') as corpus:
+        return [json.loads(line) for line in corpus if line.strip()]
+
+
+def sanitize_twice(html):
+    linkified = bleach.linkify(html, callbacks=[
+        linkify_callbacks.target_blank,
+        markdown.linkify_rel,
+    ])
+    return bleach.clean(linkified,
+                        tags=markdown.ALLOWED_TAGS,
+                        attributes=markdown.ALLOWED_ATTRIBUTES)
+
+
+def measure(func, items):
+    start = time.time()
+    results = [func(item) for item in items]
+    return len(items) / (time.time() - start), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--corpus',
+                        help='file of JSON-encoded annotation texts')
+    parser.add_argument('-n', '--count', type=int, default=5000,
+                        help='maximum number of annotations to render')
+    args = parser.parse_args()
+
+    if args.corpus:
+        texts = load_corpus(args.corpus)[:args.count]
+    else:
+        texts = (SAMPLES * (args.count // len(SAMPLES) + 1))[:args.count]
+
+    render_markdown = markdown._get_markdown()
+    html = [render_markdown(text) for text in texts]
+
+    twice_rate, twice = measure(sanitize_twice, html)
+    once_rate, once = measure(markdown.sanitize, html)
+
+    markdown.render_cache.clear()
+    for text in texts:
+        markdown.render(text)
+    cached_rate, _ = measure(markdown.render, texts)
+
+    differences = sum(1 for a, b in zip(twice, once) if a != b)
+
+    print('annotations:        {:>10d}'.format(len(texts)))
+    print('linkify + clean:    {:>10.0f} annotations/s'.format(twice_rate))
+    print('single pass:        {:>10.0f} annotations/s'.format(once_rate))
+    print('speedup:            {:>10.2f}x'.format(once_rate / twice_rate))
+    print('cached render:      {:>10.0f} annotations/s'.format(cached_rate))
+    print('differing outputs:  {:>10d}'.format(differences))
+
+
+if __name__ == '__main__':
+    main()
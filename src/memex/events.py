@@ -4,10 +4,36 @@
 class AnnotationEvent(object):
     """An event representing an action on an annotation."""
 
-    def __init__(self, request, annotation_id, action):
+    def __init__(self, request, annotation_id, action, groupid=None):
         self.request = request
         self.annotation_id = annotation_id
         self.action = action
+        self.groupid = groupid
+
+
+class AnnotationBatchEvent(object):
+    """
+    An event representing actions on many annotations at once.
+
+    ``events`` is a list of the :py:class:`AnnotationEvent` for each action,
+    in the order they were made.
+    """
+
+    def __init__(self, request, events):
+        self.request = request
+        self.events = events
+
+
+def annotation_events(event):
+    """
+    Return the list of AnnotationEvents making up an annotation event.
+
+    Subscribers to both :py:class:`AnnotationEvent` and
+    :py:class:`AnnotationBatchEvent` can use this to handle either.
+    """
+    if isinstance(event, AnnotationBatchEvent):
+        return event.events
+    return [event]
 
 
 class AnnotationTransformEvent(object):
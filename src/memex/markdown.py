@@ -2,10 +2,14 @@
 
 from __future__ import unicode_literals
 
+import collections
+import hashlib
 import re
+import threading
 
 import bleach
 from bleach import callbacks as linkify_callbacks
+from bleach.sanitizer import BleachSanitizer
 import mistune
 
 LINK_REL = 'nofollow noopener'
@@ -38,6 +42,9 @@ ALLOWED_ATTRIBUTES = dict(bleach.ALLOWED_ATTRIBUTES.items() + MARKDOWN_ATTRIBUTE
 # Singleton instance of the Markdown instance
 markdown = None
 
+# The maximum number of rendered texts kept by the render cache.
+RENDER_CACHE_SIZE = 2000
+
 
 class MathMarkdown(mistune.Markdown):
     def output_block_math(self):
@@ -78,22 +85,83 @@ class MathRenderer(mistune.Renderer):
         return '\\(%s\\)' % text
 
 
+class Sanitizer(BleachSanitizer):
+
+    """
+    An HTML tokenizer which escapes disallowed tags and attributes.
+
+    This applies the same rules as ``bleach.clean`` with our allowed tags and
+    attributes, so that passing it to ``bleach.linkify`` as its tokenizer
+    linkifies and cleans text while parsing it only once.
+    """
+
+    allowed_elements = ALLOWED_TAGS
+    allowed_attributes = ALLOWED_ATTRIBUTES
+    allowed_css_properties = bleach.ALLOWED_STYLES
+    strip_disallowed_elements = False
+    strip_html_comments = True
+
+
+class RenderCache(object):
+
+    """
+    A bounded LRU cache of rendered text.
+
+    Entries are keyed by the SHA-1 digest of the source text, so that the
+    cache doesn't hold on to the (possibly large) source texts themselves.
+    """
+
+    def __init__(self, max_entries=RENDER_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, text):
+        """Return the cached rendering of ``text``, or ``None``."""
+        key = _digest(text)
+        with self._lock:
+            rendered = self._entries.pop(key, None)
+            if rendered is not None:
+                # Re-insert the entry to mark it as the most recently used.
+                self._entries[key] = rendered
+        return rendered
+
+    def set(self, text, rendered):
+        """Store the rendering of ``text``."""
+        key = _digest(text)
+        with self._lock:
+            self._entries.pop(key, None)
+            while len(self._entries) >= self.max_entries:
+                self._entries.popitem(last=False)
+            self._entries[key] = rendered
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+render_cache = RenderCache()
+
+
 def render(text):
-    if text is not None:
+    if text is None:
+        return None
+
+    rendered = render_cache.get(text)
+    if rendered is None:
         render = _get_markdown()
-        return sanitize(render(text))
-    return None
+        rendered = sanitize(render(text))
+        render_cache.set(text, rendered)
+    return rendered
 
 
 def sanitize(text):
-    linkified = bleach.linkify(text, callbacks=[
-        linkify_callbacks.target_blank,
-        linkify_rel,
-    ])
-
-    return bleach.clean(linkified,
-                        tags=ALLOWED_TAGS,
-                        attributes=ALLOWED_ATTRIBUTES)
+    return bleach.linkify(text,
+                          callbacks=[
+                              linkify_callbacks.target_blank,
+                              linkify_rel,
+                          ],
+                          tokenizer=Sanitizer)
 
 
 def linkify_rel(attrs, new=False):
@@ -105,6 +173,12 @@ def linkify_rel(attrs, new=False):
     return attrs
 
 
+def _digest(text):
+    if not isinstance(text, bytes):
+        text = text.encode('utf-8')
+    return hashlib.sha1(text).digest()
+
+
 def _get_markdown():
     global markdown
     if markdown is None:
@@ -23,6 +23,8 @@ from memex.models.document import DocumentMeta
 from memex.models.document import DocumentURI
 from memex.models.document import merge_documents
 from memex.models.document import update_document_metadata
+from memex.models.document import upsert_document_meta
+from memex.models.document import upsert_document_uris
 
 
 __all__ = (
@@ -33,6 +35,8 @@ __all__ = (
     'DocumentMeta',
     'DocumentURI',
     'merge_documents',
+    'upsert_document_meta',
+    'upsert_document_uris',
 )
 
 
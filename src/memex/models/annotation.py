@@ -131,6 +131,12 @@ class Annotation(Base):
 
     @text.setter
     def text(self, value):
+        # Rendering is relatively expensive, so don't re-render text which
+        # hasn't changed (as when an annotation's tags alone are updated).
+        if value == self._text and (value is None or
+                                    self._text_rendered is not None):
+            return
+
         self._text = value
         # N.B. We MUST take care here of appropriately escaping the user
         # input. Code elsewhere will assume that the content of the
@@ -2,6 +2,7 @@
 
 from __future__ import unicode_literals
 
+import collections
 from datetime import datetime
 import logging
 
@@ -9,6 +10,7 @@ import sqlalchemy as sa
 import transaction
 from sqlalchemy.dialects import postgresql as pg
 from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm.attributes import set_committed_value
 
 from memex.db import Base
 from memex.db import mixins
@@ -84,16 +86,18 @@ class Document(Base, mixins.Timestamps):
     @classmethod
     def find_by_uris(cls, session, uris):
         """Find documents by a list of uris."""
-        query_uris = [uri_normalize(u) for u in uris]
+        query_uris = set(uri_normalize(u) for u in uris)
 
-        matching_claims = (
-            session.query(DocumentURI)
-                   .filter(DocumentURI.uri_normalized.in_(query_uris))
-                   .distinct(DocumentURI.document_id)
-                   .subquery()
-        )
+        # Match documents with a semi-join against the index on
+        # document_uri.uri_normalized, rather than joining to a DISTINCT
+        # subquery of all the matching document URIs.
+        if len(query_uris) == 1:
+            matches = DocumentURI.uri_normalized == query_uris.pop()
+        else:
+            matches = DocumentURI.uri_normalized.in_(query_uris)
+        matching_ids = session.query(DocumentURI.document_id).filter(matches)
 
-        return session.query(Document).join(matching_claims)
+        return session.query(Document).filter(Document.id.in_(matching_ids))
 
     @classmethod
     def find_or_create_by_uris(cls, session, claimant_uri, uris,
@@ -105,12 +109,19 @@ class Document(Base, mixins.Timestamps):
         If none can be found it will return a new document with the claimant
         uri as its only document uri as a self-claim. It is the callers
         responsibility to create any other document uris.
+
+        The matching documents are loaded with a single query.
+
+        :returns: the matching or created documents, oldest first
+        :rtype: list of memex.models.Document
         """
 
         finduris = [claimant_uri] + uris
-        documents = cls.find_by_uris(session, finduris)
+        documents = (cls.find_by_uris(session, finduris)
+                     .order_by(Document.id)
+                     .all())
 
-        if documents.count() == 0:
+        if not documents:
             doc = Document(created=created, updated=updated)
             DocumentURI(document=doc,
                         claimant=claimant_uri,
@@ -119,6 +130,7 @@ class Document(Base, mixins.Timestamps):
                         created=created,
                         updated=updated)
             session.add(doc)
+            documents = [doc]
 
         try:
             session.flush()
@@ -396,11 +408,174 @@ def create_or_update_document_meta(session,
         raise ConcurrentUpdateError('concurrent document meta updates')
 
 
+def upsert_document_uris(session,
+                         document,
+                         document_uri_dicts,
+                         created,
+                         updated):
+    """
+    Create or update DocumentURIs for all of the given document URI dicts.
+
+    This does the same as calling :py:func:`create_or_update_document_uri`
+    for each dict in turn, but in a single ``INSERT ... ON CONFLICT DO
+    UPDATE`` statement, however many dicts there are.
+
+    :param session: the database session
+    :type session: sqlalchemy.orm.session.Session
+
+    :param document: the Document that new DocumentURIs will belong to
+    :type document: memex.models.Document
+
+    :param document_uri_dicts: dicts of the claimant, uri, type and
+        content_type of each DocumentURI
+    :type document_uri_dicts: list of dicts
+
+    :param created: the .created time of new DocumentURIs
+    :type created: datetime.datetime
+
+    :param updated: the .updated time of new and existing DocumentURIs
+    :type updated: datetime.datetime
+
+    """
+    # A statement can't update the same row twice, so only the last of any
+    # equivalent dicts is kept.
+    rows = collections.OrderedDict()
+    for document_uri_dict in document_uri_dicts:
+        row = {
+            'claimant': document_uri_dict['claimant'],
+            'claimant_normalized': uri_normalize(document_uri_dict['claimant']),
+            'uri': document_uri_dict['uri'],
+            'uri_normalized': uri_normalize(document_uri_dict['uri']),
+            'type': document_uri_dict.get('type', ''),
+            'content_type': document_uri_dict.get('content_type', ''),
+            'document_id': document.id,
+            'created': created,
+            'updated': updated,
+        }
+        key = (row['claimant_normalized'], row['uri_normalized'],
+               row['type'], row['content_type'])
+        rows[key] = row
+
+    if not rows:
+        return
+
+    table = DocumentURI.__table__
+    stmt = pg.insert(table).values(list(rows.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.claimant_normalized,
+                        table.c.uri_normalized,
+                        table.c.type,
+                        table.c.content_type],
+        set_={'updated': stmt.excluded.updated},
+    ).returning(table.c.id, table.c.document_id)
+
+    try:
+        results = session.execute(stmt).fetchall()
+    except sa.exc.IntegrityError:
+        raise ConcurrentUpdateError('concurrent document uri updates')
+
+    for id_, document_id in results:
+        if document_id != document.id:
+            log.warn("Found DocumentURI (id: %d)'s document_id (%d) doesn't "
+                     "match given Document's id (%d)",
+                     id_, document_id, document.id)
+
+    _expire_upserted(session, DocumentURI, [id_ for id_, _ in results])
+    session.expire(document, ['document_uris'])
+
+
+def upsert_document_meta(session,
+                         document,
+                         document_meta_dicts,
+                         created,
+                         updated):
+    """
+    Create or update DocumentMetas for all of the given document meta dicts.
+
+    This does the same as calling :py:func:`create_or_update_document_meta`
+    for each dict in turn, but in a single ``INSERT ... ON CONFLICT DO
+    UPDATE`` statement, however many dicts there are.
+
+    :param session: the database session
+    :type session: sqlalchemy.orm.session.Session
+
+    :param document: the Document that new DocumentMetas will belong to
+    :type document: memex.models.Document
+
+    :param document_meta_dicts: dicts of the claimant, type and value of each
+        DocumentMeta
+    :type document_meta_dicts: list of dicts
+
+    :param created: the .created time of new DocumentMetas
+    :type created: datetime.datetime
+
+    :param updated: the .updated time of new and existing DocumentMetas
+    :type updated: datetime.datetime
+
+    """
+    rows = collections.OrderedDict()
+    for document_meta_dict in document_meta_dicts:
+        row = {
+            'claimant': document_meta_dict['claimant'],
+            'claimant_normalized': uri_normalize(document_meta_dict['claimant']),
+            'type': document_meta_dict['type'],
+            'value': document_meta_dict['value'],
+            'document_id': document.id,
+            'created': created,
+            'updated': updated,
+        }
+        rows[(row['claimant_normalized'], row['type'])] = row
+
+        value = document_meta_dict['value']
+        if document_meta_dict['type'] == 'title' and value and not document.title:
+            document.title = value[0]
+
+    if not rows:
+        return
+
+    table = DocumentMeta.__table__
+    stmt = pg.insert(table).values(list(rows.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.claimant_normalized, table.c.type],
+        set_={'value': stmt.excluded.value,
+              'updated': stmt.excluded.updated},
+    ).returning(table.c.id, table.c.document_id)
+
+    try:
+        results = session.execute(stmt).fetchall()
+    except sa.exc.IntegrityError:
+        raise ConcurrentUpdateError('concurrent document meta updates')
+
+    for id_, document_id in results:
+        if document_id != document.id:
+            log.warn("Found DocumentMeta (id: %d)'s document_id (%d) doesn't "
+                     "match given Document's id (%d)",
+                     id_, document_id, document.id)
+
+    _expire_upserted(session, DocumentMeta, [id_ for id_, _ in results])
+    session.expire(document, ['meta'])
+
+
+def _expire_upserted(session, cls, ids):
+    # The upserts bypass the ORM, so any of their rows already loaded into
+    # the session must be reloaded to see the new values.
+    for id_ in ids:
+        obj = session.identity_map.get(sa.orm.util.identity_key(cls, id_))
+        if obj is not None:
+            session.expire(obj)
+
+
 def merge_documents(session, documents, updated=None):
     """
     Takes a list of documents and merges them together. It returns the new
     master document.
 
+    The first document is the master. The document URIs, metadata and
+    annotations of the others are moved to it with one UPDATE statement per
+    table, and then the other documents are deleted. All of the documents are
+    locked first, in order of id, so that concurrent merges of overlapping
+    sets of documents wait for each other rather than deadlocking.
+
     The support for setting a specific value for the `updated` should only
     be used during the Postgres migration. It should be removed afterwards.
     """
@@ -411,31 +586,60 @@ def merge_documents(session, documents, updated=None):
     duplicates = documents[1:]
     duplicate_ids = [doc.id for doc in duplicates]
 
-    for doc in duplicates:
-        for _ in range(len(doc.document_uris)):
-            u = doc.document_uris.pop()
-            u.document = master
-            u.updated = updated
-
-        for _ in range(len(doc.meta)):
-            m = doc.meta.pop()
-            m.document = master
-            m.updated = updated
-
     try:
         session.flush()
+
+        session.query(Document.id) \
+            .filter(Document.id.in_([master.id] + duplicate_ids)) \
+            .order_by(Document.id) \
+            .with_for_update() \
+            .all()
+
+        for cls in [DocumentURI, DocumentMeta]:
+            session.query(cls) \
+                .filter(cls.document_id.in_(duplicate_ids)) \
+                .update({cls.document_id: master.id, cls.updated: updated},
+                        synchronize_session=False)
         session.query(Annotation) \
             .filter(Annotation.document_id.in_(duplicate_ids)) \
-            .update({Annotation.document_id: master.id}, synchronize_session='fetch')
+            .update({Annotation.document_id: master.id},
+                    synchronize_session=False)
         session.query(Document) \
             .filter(Document.id.in_(duplicate_ids)) \
-            .delete(synchronize_session='fetch')
+            .delete(synchronize_session=False)
     except sa.exc.IntegrityError:
         raise ConcurrentUpdateError('concurrent document merges')
 
+    _sync_merged(session, master, duplicates, updated)
+
     return master
 
 
+def _sync_merged(session, master, duplicates, updated):
+    # The merge bypasses the ORM, so bring any of its rows already loaded into
+    # the session up to date. Setting the new values directly is much cheaper
+    # than expiring (and later reloading) every moved claim and annotation.
+    duplicate_ids = set(doc.id for doc in duplicates)
+    for obj in list(session.identity_map.values()):
+        if not isinstance(obj, (DocumentURI, DocumentMeta, Annotation)):
+            continue
+        state = sa.inspect(obj)
+        if state.dict.get('document_id') not in duplicate_ids:
+            continue
+        set_committed_value(obj, 'document_id', master.id)
+        if 'document' in state.dict:
+            set_committed_value(obj, 'document', master)
+        if not isinstance(obj, Annotation):
+            set_committed_value(obj, 'updated', updated)
+
+    session.expire(master, ['document_uris', 'meta', 'annotations'])
+
+    for doc in duplicates:
+        for name in ['document_uris', 'meta', 'annotations']:
+            set_committed_value(doc, name, [])
+        session.expunge(doc)
+
+
 def update_document_metadata(session,
                              target_uri,
                              document_meta_dicts,
@@ -481,31 +685,27 @@ def update_document_metadata(session,
         created=created,
         updated=updated)
 
-    if documents.count() > 1:
+    if len(documents) > 1:
         document = merge_documents(session,
                                    documents,
                                    updated=updated)
     else:
-        document = documents.first()
+        document = documents[0]
 
     document.updated = updated
 
-    for document_uri_dict in document_uri_dicts:
-        create_or_update_document_uri(
-            session=session,
-            document=document,
-            created=created,
-            updated=updated,
-            **document_uri_dict)
+    upsert_document_uris(session,
+                         document,
+                         document_uri_dicts,
+                         created=created,
+                         updated=updated)
 
     document.update_web_uri()
 
-    for document_meta_dict in document_meta_dicts:
-        create_or_update_document_meta(
-            session=session,
-            document=document,
-            created=created,
-            updated=updated,
-            **document_meta_dict)
+    upsert_document_meta(session,
+                         document,
+                         document_meta_dicts,
+                         created=created,
+                         updated=updated)
 
     return document
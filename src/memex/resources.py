@@ -13,7 +13,13 @@ class AnnotationResourceFactory(object):
         self.request = request
 
     def __getitem__(self, id):
-        annotation = storage.fetch_annotation(self.request.db, id)
+        # Annotations which are about to be modified are always loaded from
+        # the database rather than the annotation cache.
+        cache = None
+        if self.request.method in ('GET', 'HEAD'):
+            cache = self.request.find_service(name='annotation_cache')
+
+        annotation = storage.fetch_annotation(self.request.db, id, cache=cache)
         if annotation is None:
             raise KeyError()
 
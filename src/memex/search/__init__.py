@@ -1,10 +1,16 @@
 # -*- coding: utf-8 -*-
 
+from pyramid.settings import asbool
+
 from memex.search.client import get_client
 from memex.search.config import init
 from memex.search.core import Search
 from memex.search.core import FILTERS_KEY
 from memex.search.core import MATCHERS_KEY
+from memex.search.instrumentation import QUERY_LOG_KEY
+from memex.search.instrumentation import get_query_log
+from memex.search.singleflight import SINGLEFLIGHT_KEY
+from memex.search.singleflight import SingleFlight
 
 __all__ = (
     'Search',
@@ -31,6 +37,14 @@ def includeme(config):
     config.add_directive('memex_get_search_matchers',
                          lambda c: c.registry[MATCHERS_KEY])
 
+    # Record per-query timings, and log slow queries if configured to do so.
+    config.registry[QUERY_LOG_KEY] = get_query_log(settings)
+
+    # Share a single Elasticsearch request between identical concurrent
+    # searches (e.g. many clients loading the annotations for the same URI).
+    if asbool(settings.get('es.coalesce_searches', True)):
+        config.registry[SINGLEFLIGHT_KEY] = SingleFlight()
+
     # Add a property to all requests for easy access to the elasticsearch
     # client. This can be used for direct or bulk access without having to
     # reread the settings.
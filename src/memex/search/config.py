@@ -18,6 +18,24 @@ from elasticsearch.exceptions import NotFoundError, RequestError
 
 log = logging.getLogger(__name__)
 
+
+def _facet_field():
+    """
+    Return the mapping for a not-analyzed field which we aggregate over.
+
+    These fields back the tag and user facets on activity pages. Doc values
+    keep the field data on disk rather than on the heap, and eagerly building
+    global ordinals at refresh time means the terms aggregations don't have to
+    build them on first use.
+    """
+    return {
+        'type': 'string',
+        'index': 'not_analyzed',
+        'doc_values': True,
+        'fielddata': {'loading': 'eager_global_ordinals'},
+    }
+
+
 ANNOTATION_MAPPING = {
     '_id': {'path': 'id'},
     '_source': {'excludes': ['id']},
@@ -28,7 +46,7 @@ ANNOTATION_MAPPING = {
         'updated': {'type': 'date'},
         'quote': {'type': 'string', 'analyzer': 'uni_normalizer'},
         'tags': {'type': 'string', 'analyzer': 'uni_normalizer'},
-        'tags_raw': {'type': 'string', 'index': 'not_analyzed'},
+        'tags_raw': _facet_field(),
         'text': {'type': 'string', 'analyzer': 'uni_normalizer'},
         'deleted': {'type': 'boolean'},
         'uri': {
@@ -44,7 +62,7 @@ ANNOTATION_MAPPING = {
             },
         },
         'user': {'type': 'string', 'index': 'analyzed', 'analyzer': 'user'},
-        'user_raw': {'type': 'string', 'index': 'not_analyzed'},
+        'user_raw': _facet_field(),
         'target': {
             'properties': {
                 'source': {
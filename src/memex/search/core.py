@@ -1,11 +1,14 @@
 # -*- coding: utf-8 -*-
 import logging
+import time
 from collections import namedtuple
 from contextlib import contextmanager
 
 from elasticsearch.exceptions import ConnectionTimeout
 
 from memex.search import query
+from memex.search import singleflight
+from memex.search.instrumentation import QUERY_LOG_KEY
 
 FILTERS_KEY = 'memex.search.filters'
 MATCHERS_KEY = 'memex.search.matchers'
@@ -40,6 +43,8 @@ class Search(object):
         self.es = request.es
         self.separate_replies = separate_replies
         self.stats = stats
+        self.query_log = request.registry.get(QUERY_LOG_KEY)
+        self.singleflight = request.registry.get(singleflight.SINGLEFLIGHT_KEY)
 
         self.builder = default_querybuilder(request)
         self.reply_builder = default_querybuilder(request)
@@ -76,12 +81,7 @@ class Search(object):
         if self.separate_replies:
             self.builder.append_filter(query.TopLevelAnnotationsFilter())
 
-        response = None
-        with self._instrument():
-            response = self.es.conn.search(index=self.es.index,
-                                           doc_type=self.es.t.annotation,
-                                           _source=False,
-                                           body=self.builder.build(params))
+        response = self._search(self.builder, params)
         total = response['hits']['total']
         annotation_ids = [hit['_id'] for hit in response['hits']['hits']]
         aggregations = self._parse_aggregation_results(response.get('aggregations', None))
@@ -93,12 +93,7 @@ class Search(object):
 
         self.reply_builder.append_matcher(query.RepliesMatcher(annotation_ids))
 
-        response = None
-        with self._instrument():
-            response = self.es.conn.search(index=self.es.index,
-                                           doc_type=self.es.t.annotation,
-                                           _source=False,
-                                           body=self.reply_builder.build({'limit': 200}))
+        response = self._search(self.reply_builder, {'limit': 200})
 
         if len(response['hits']['hits']) < response['hits']['total']:
             log.warn("The number of reply annotations exceeded the page size "
@@ -123,6 +118,47 @@ class Search(object):
 
         return results
 
+    def _search(self, builder, params):
+        body = builder.build(params)
+
+        response = None
+        outcome = 'error'
+        start = time.time()
+        try:
+            with self._instrument():
+                response = self._coalesce(body)
+            outcome = 'success'
+        except ConnectionTimeout:
+            outcome = 'timeout'
+            raise
+        finally:
+            # Failed and timed-out queries are recorded too, as they are
+            # often the ones we most need to know about.
+            if self.query_log is not None:
+                duration = int((time.time() - start) * 1000)
+                self.query_log.record(builder.shape, body, response,
+                                      duration=duration,
+                                      outcome=outcome,
+                                      stats=self.stats)
+
+        return response
+
+    def _coalesce(self, body):
+        def search():
+            return self.es.conn.search(index=self.es.index,
+                                       doc_type=self.es.t.annotation,
+                                       _source=False,
+                                       body=body)
+
+        if self.singleflight is None:
+            return search()
+
+        key = singleflight.search_key(self.request, self.es.index, body)
+        response, shared = self.singleflight.do(key, search)
+        if shared and self.stats:
+            self.stats.incr('memex.search.query.coalesced')
+        return response
+
     @contextmanager
     def _instrument(self):
         if not self.stats:
@@ -9,18 +9,23 @@ from collections import namedtuple
 
 import sqlalchemy as sa
 from elasticsearch import helpers as es_helpers
-from sqlalchemy.orm import subqueryload
+from zope.interface import implementedBy
 
 from h import presenters  # FIXME: this module needs to move to h
 from memex import models
 from memex.events import AnnotationTransformEvent
-from memex.util.query import column_windows
+from memex.util.query import column_window
+from memex.util.query import column_window_bounds
 
 log = logging.getLogger(__name__)
 
 ES_CHUNK_SIZE = 100
 PG_WINDOW_SIZE = 2000
 
+# The number of rows fetched at a time from the server-side cursor used to
+# read annotations for bulk indexing.
+PG_FETCH_SIZE = 2000
+
 
 class Window(namedtuple('Window', ['start', 'end'])):
     pass
@@ -95,11 +100,13 @@ class BatchIndexer(object):
     the search index.
     """
 
-    def __init__(self, session, es_client, request, target_index=None, op_type='index'):
+    def __init__(self, session, es_client, request, target_index=None,
+                 op_type='index', fetch_size=PG_FETCH_SIZE):
         self.session = session
         self.es_client = es_client
         self.request = request
         self.op_type = op_type
+        self.fetch_size = fetch_size
 
         # By default, index into the open index
         if target_index is None:
@@ -107,6 +114,8 @@ class BatchIndexer(object):
         else:
             self._target_index = target_index
 
+        self._transformers = []
+
     def index(self, annotation_ids=None):
         """
         Reindex annotations.
@@ -119,14 +128,43 @@ class BatchIndexer(object):
         """
         if not annotation_ids:
             annotations = _all_annotations(session=self.session,
-                                           windowsize=PG_WINDOW_SIZE)
+                                           fetch_size=self.fetch_size)
         else:
             annotations = _filtered_annotations(session=self.session,
-                                                ids=annotation_ids)
+                                                ids=annotation_ids,
+                                                fetch_size=self.fetch_size)
 
         # Report indexing status as we go
         annotations = _log_status(annotations)
 
+        return self._bulk_index(annotations)
+
+    def index_window(self, window):
+        """
+        Reindex the annotations in a window returned by
+        :py:func:`annotation_windows`.
+
+        :param window: the window of annotations to reindex
+        :type window: Window
+
+        :returns: a set of errored ids
+        :rtype: set
+        """
+        annotations = (_annotation_rows(self.session)
+                       .filter(_annotation_filter())
+                       .filter(column_window(models.Annotation.updated,
+                                             window.start,
+                                             window.end))
+                       .yield_per(self.fetch_size))
+
+        return self._bulk_index(annotations)
+
+    def _bulk_index(self, annotations):
+        # Look up the AnnotationTransformEvent subscribers once per batch,
+        # rather than having the registry resolve them for every annotation.
+        self._transformers = self.request.registry.adapters.subscriptions(
+            [implementedBy(AnnotationTransformEvent)], None)
+
         indexing = es_helpers.streaming_bulk(self.es_client.conn, annotations,
                                              chunk_size=ES_CHUNK_SIZE,
                                              raise_on_error=False,
@@ -143,39 +181,90 @@ class BatchIndexer(object):
                 errored.add(status['_id'])
         return errored
 
-    def _prepare(self, annotation):
+    def delete(self, annotation_ids):
+        """
+        Mark annotations as deleted in the search index.
+
+        This writes the same ``deleted`` marker document as :py:func:`delete`
+        for each of the given annotations, in bulk requests.
+
+        :param annotation_ids: a list of ids to mark as deleted
+        :type annotation_ids: collection
+
+        :returns: a set of errored ids
+        :rtype: set
+        """
+        actions = ({'_op_type': 'index',
+                    '_index': self._target_index,
+                    '_type': self.es_client.t.annotation,
+                    '_id': id_,
+                    '_source': {'deleted': True}}
+                   for id_ in annotation_ids)
+
+        deleting = es_helpers.streaming_bulk(self.es_client.conn, actions,
+                                             chunk_size=ES_CHUNK_SIZE,
+                                             raise_on_error=False)
+        errored = set()
+        for ok, item in deleting:
+            if not ok:
+                errored.add(item['index']['_id'])
+        return errored
+
+    def _prepare(self, row):
         action = {self.op_type: {'_index': self._target_index,
                                  '_type': self.es_client.t.annotation,
-                                 '_id': annotation.id}}
-        data = presenters.AnnotationSearchIndexPresenter(annotation).asdict()
+                                 '_id': row.id}}
+        data = presenters.search_index_row_asdict(row)
 
-        event = AnnotationTransformEvent(self.request, data)
-        self.request.registry.notify(event)
+        if self._transformers:
+            event = AnnotationTransformEvent(self.request, data)
+            for transformer in self._transformers:
+                transformer(event)
 
         return (action, data)
 
 
-def _all_annotations(session, windowsize=2000):
-    # This is using a windowed query for loading all annotations in batches.
-    # It is the most performant way of loading a big set of records from
-    # the database while still supporting eagerloading of associated
-    # document data.
-    windows = column_windows(session=session,
-                             column=models.Annotation.updated,  # implicit ASC
-                             windowsize=windowsize,
-                             where=_annotation_filter())
-    query = _eager_loaded_annotations(session).filter(_annotation_filter())
+def annotation_windows(session, windowsize=PG_WINDOW_SIZE, since=None):
+    """
+    Split all the annotations to be indexed into windows.
 
-    for window in windows:
-        for a in query.filter(window):
-            yield a
+    Each window contains (at the time of the call) ``windowsize`` annotations,
+    and can be indexed independently with :py:meth:`BatchIndexer.index_window`.
 
+    :param since: only include annotations updated at or after this time
+    :type since: datetime.datetime
 
-def _filtered_annotations(session, ids):
-    annotations = (_eager_loaded_annotations(session)
-                   .execution_options(stream_results=True)
+    :rtype: list of Window
+    """
+    where = _annotation_filter()
+    if since is not None:
+        where = sa.and_(where, models.Annotation.updated >= since)
+
+    bounds = column_window_bounds(session=session,
+                                  column=models.Annotation.updated,
+                                  windowsize=windowsize,
+                                  where=where)
+    return [Window(start, end) for start, end in bounds]
+
+
+def _all_annotations(session, fetch_size=PG_FETCH_SIZE):
+    # This reads all annotations with a single query, streaming the rows from
+    # a server-side cursor ``fetch_size`` rows at a time, so that memory use
+    # stays flat however many annotations there are. As the rows are plain
+    # tuples rather than ORM objects, nothing accumulates in the session.
+    query = (_annotation_rows(session)
+             .filter(_annotation_filter())
+             .yield_per(fetch_size))
+
+    for a in query:
+        yield a
+
+
+def _filtered_annotations(session, ids, fetch_size=PG_FETCH_SIZE):
+    annotations = (_annotation_rows(session)
                    .filter(_annotation_filter())
-                   .filter(models.Annotation.id.in_(ids)))
+                   .filter(models.Annotation.id.in_(ids))
+                   .yield_per(fetch_size))
 
     for a in annotations:
         yield a
@@ -186,11 +275,32 @@ def _annotation_filter():
     return sa.not_(models.Annotation.deleted)
 
 
-def _eager_loaded_annotations(session):
-    return session.query(models.Annotation).options(
-        subqueryload(models.Annotation.document).subqueryload(models.Document.document_uris),
-        subqueryload(models.Annotation.document).subqueryload(models.Document.meta)
-    )
+def _annotation_rows(session):
+    """
+    Return a query for the columns needed to index annotations.
+
+    Bulk indexing loads plain rows rather than ``Annotation`` objects, which
+    avoids the cost of building ORM objects (and loading their documents'
+    URIs and metadata) for data which is only serialized and thrown away.
+    See :py:func:`h.presenters.search_index_row_asdict`.
+    """
+    return (session.query(models.Annotation.id,
+                          models.Annotation.created,
+                          models.Annotation.updated,
+                          models.Annotation.userid,
+                          models.Annotation.groupid,
+                          models.Annotation.text.label('text'),
+                          models.Annotation.tags,
+                          models.Annotation.shared,
+                          models.Annotation.target_uri.label('target_uri'),
+                          models.Annotation.target_uri_normalized.label(
+                              'target_uri_normalized'),
+                          models.Annotation.target_selectors,
+                          models.Annotation.references,
+                          models.Document.title.label('document_title'),
+                          models.Document.web_uri.label('document_web_uri'))
+            .outerjoin(models.Document,
+                       models.Annotation.document_id == models.Document.id))
 
 
 def _log_status(stream, log_every=1000):
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+"""
+Per-query instrumentation for searches.
+
+Records the shape of each query sent to Elasticsearch (which filters,
+matchers and aggregations were active, the sort and the page size) alongside
+the time Elasticsearch reports having spent on it, aggregates timings per
+query fingerprint, and logs queries which exceed a configurable threshold.
+"""
+
+from __future__ import unicode_literals
+
+import collections
+import hashlib
+import json
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# The key under which the process-wide query log is stored in the registry.
+QUERY_LOG_KEY = 'memex.search.query_log'
+
+PLACEHOLDER = '?'
+
+DEFAULT_MAX_FINGERPRINTS = 500
+DEFAULT_REPORT_INTERVAL = 300
+REPORT_SIZE = 10
+
+# Clauses whose field names come straight from the request (unrecognised
+# search parameters become ``match`` clauses, and ``sort`` names any field),
+# so their keys must not be part of the fingerprint.
+FREEFORM_CLAUSES = ('match', 'sort')
+
+
+def fingerprint(body):
+    """
+    Return a fingerprint of a query body and the normalized body itself.
+
+    All literal values in the query (URIs, tags, userids, offsets and so on)
+    are replaced with a placeholder, as are field names supplied by the
+    caller, so that queries which differ only in the values they search for
+    share a fingerprint.
+
+    :returns: a ``(fingerprint, normalized_body)`` tuple
+    """
+    normalized = json.dumps(_normalize(body),
+                            sort_keys=True,
+                            separators=(',', ':'))
+    digest = hashlib.md5(normalized.encode('utf-8')).hexdigest()[:12]
+    return digest, normalized
+
+
+def _normalize(value, freeform=False):
+    if isinstance(value, dict):
+        if freeform:
+            return {PLACEHOLDER: _normalize(v) for v in value.values()}
+        return {k: _normalize(v, freeform=k in FREEFORM_CLAUSES)
+                for k, v in value.items()}
+    if isinstance(value, list):
+        items = [_normalize(v, freeform=freeform) for v in value]
+        # Lists of literal values (e.g. the URIs in a terms filter) collapse to
+        # a single placeholder, so their length doesn't change the fingerprint.
+        if all(i == PLACEHOLDER for i in items):
+            return PLACEHOLDER
+        return items
+    return PLACEHOLDER
+
+
+def metric_name(name):
+    """Return the statsd-safe name for a filter or matcher in a query shape."""
+    # Key-value matchers are named after the request parameter they match.
+    if name.startswith('match:'):
+        return 'match'
+    return name
+
+
+class FingerprintStats(object):
+
+    """Aggregated timings for all queries sharing a fingerprint."""
+
+    def __init__(self, normalized, shape):
+        self.normalized = normalized
+        self.shape = shape
+        self.count = 0
+        self.total_took = 0
+        self.max_took = 0
+        self.slow_count = 0
+        self.timeout_count = 0
+        self.error_count = 0
+
+    @property
+    def mean_took(self):
+        if not self.count:
+            return 0
+        return float(self.total_took) / self.count
+
+
+class QueryLog(object):
+
+    """
+    A process-wide log of search query timings.
+
+    :param slow_threshold: queries which take at least this many milliseconds
+        are written to the slow query log. If ``None``, no queries are logged.
+    :param max_fingerprints: the number of fingerprints to aggregate timings
+        for. The least recently seen fingerprint is dropped when full.
+    :param report_interval: how often, in seconds, to log a summary of the
+        slowest fingerprints. If ``None``, no summary is logged.
+    """
+
+    def __init__(self,
+                 slow_threshold=None,
+                 max_fingerprints=DEFAULT_MAX_FINGERPRINTS,
+                 report_interval=DEFAULT_REPORT_INTERVAL,
+                 clock=time.time):
+        self.slow_threshold = slow_threshold
+        self.max_fingerprints = max_fingerprints
+        self.report_interval = report_interval
+        self.clock = clock
+
+        self.fingerprints = collections.OrderedDict()
+        self._last_report = clock()
+        self._lock = threading.Lock()
+
+    def record(self, shape, body, response,
+               duration=0, outcome='success', stats=None):
+        """
+        Record a completed, failed or timed-out search query.
+
+        :param shape: the :py:class:`memex.search.query.QueryShape` of the query
+        :param body: the query body sent to Elasticsearch
+        :param response: the response returned by Elasticsearch, or ``None``
+            if the query failed
+        :param duration: the wall-clock time the query took, in milliseconds,
+            used when Elasticsearch didn't report how long it took
+        :param outcome: one of ``'success'``, ``'timeout'`` or ``'error'``
+        :param stats: an optional statsd client to publish metrics to
+        """
+        if response is not None:
+            took = response.get('took', duration)
+            hits = response['hits']['total']
+            shard_failures = response.get('_shards', {}).get('failed', 0)
+        else:
+            took = duration
+            hits = 0
+            shard_failures = 0
+
+        digest, normalized = fingerprint(body)
+        slow = self.slow_threshold is not None and (
+            outcome == 'timeout' or took >= self.slow_threshold)
+
+        with self._lock:
+            fp_stats = self.fingerprints.pop(digest, None)
+            if fp_stats is None:
+                fp_stats = FingerprintStats(normalized, shape)
+                while len(self.fingerprints) >= self.max_fingerprints:
+                    self.fingerprints.popitem(last=False)
+            self.fingerprints[digest] = fp_stats
+
+            fp_stats.count += 1
+            fp_stats.total_took += took
+            fp_stats.max_took = max(fp_stats.max_took, took)
+            if slow:
+                fp_stats.slow_count += 1
+            if outcome == 'timeout':
+                fp_stats.timeout_count += 1
+            elif outcome == 'error':
+                fp_stats.error_count += 1
+
+            report = self._report_due()
+
+        if stats is not None:
+            self._publish(stats, shape, digest, took, shard_failures)
+
+        if slow:
+            log.warn('slow search query: outcome=%s took=%dms fingerprint=%s '
+                     'filters=%s matchers=%s aggregations=%s sort=%s size=%s '
+                     'hits=%d shard_failures=%d query=%s',
+                     outcome, took, digest,
+                     ','.join(shape.filters),
+                     ','.join(shape.matchers),
+                     ','.join(shape.aggregations),
+                     ','.join(shape.sort),
+                     shape.size,
+                     hits,
+                     shard_failures,
+                     normalized)
+
+        if report:
+            self.report()
+
+    def summary(self):
+        """
+        Return the aggregated timings for each fingerprint seen.
+
+        :returns: a list of ``(fingerprint, FingerprintStats)`` tuples, slowest
+            total time first
+        """
+        with self._lock:
+            items = list(self.fingerprints.items())
+        return sorted(items, key=lambda i: i[1].total_took, reverse=True)
+
+    def report(self):
+        """Log the aggregated timings of the slowest fingerprints."""
+        for digest, fp_stats in self.summary()[:REPORT_SIZE]:
+            log.info('search query fingerprint=%s count=%d mean_took=%.1fms '
+                     'max_took=%dms total_took=%dms slow=%d timeouts=%d '
+                     'errors=%d filters=%s matchers=%s aggregations=%s',
+                     digest,
+                     fp_stats.count,
+                     fp_stats.mean_took,
+                     fp_stats.max_took,
+                     fp_stats.total_took,
+                     fp_stats.slow_count,
+                     fp_stats.timeout_count,
+                     fp_stats.error_count,
+                     ','.join(fp_stats.shape.filters),
+                     ','.join(fp_stats.shape.matchers),
+                     ','.join(fp_stats.shape.aggregations))
+
+    def _report_due(self):
+        if self.report_interval is None:
+            return False
+
+        now = self.clock()
+        if now - self._last_report < self.report_interval:
+            return False
+
+        self._last_report = now
+        return True
+
+    def _publish(self, stats, shape, digest, took, shard_failures):
+        s = stats.pipeline()
+        s.timing('memex.search.query.took', took)
+        # Fingerprints don't include any caller-supplied names, so the number
+        # of distinct timers here is bounded by the filter and matcher
+        # combinations the code can build.
+        s.timing('memex.search.query.fingerprint.' + digest, took)
+        for name in set(metric_name(n) for n in shape.filters):
+            s.timing('memex.search.query.filter.' + name, took)
+        for name in set(metric_name(n) for n in shape.matchers):
+            s.timing('memex.search.query.matcher.' + name, took)
+        if shard_failures:
+            s.incr('memex.search.query.shard_failures', shard_failures)
+        s.send()
+
+
+def get_query_log(settings):
+    """Return a QueryLog configured from the application settings."""
+    threshold = settings.get('es.slow_query_threshold')
+    if threshold is not None:
+        threshold = int(threshold)
+
+    interval = settings.get('es.query_report_interval',
+                            DEFAULT_REPORT_INTERVAL)
+    if interval is not None:
+        interval = int(interval)
+
+    return QueryLog(slow_threshold=threshold, report_interval=interval)
@@ -1,21 +1,35 @@
 # -*- coding: utf-8 -*-
+from collections import namedtuple
+
 from h import storage  # FIXME: this module needs to move to h
 from memex import uri
 
 LIMIT_DEFAULT = 20
 LIMIT_MAX = 200
 
+QueryShape = namedtuple('QueryShape', [
+    'filters',
+    'matchers',
+    'aggregations',
+    'sort',
+    'size'])
+
 
 class Builder(object):
 
     """
     Build a query for execution in Elasticsearch.
+
+    After each call to :py:meth:`build` the ``shape`` attribute describes
+    which filters, matchers and aggregations contributed to the query, for
+    use in query instrumentation.
     """
 
     def __init__(self):
         self.filters = []
         self.matchers = []
         self.aggregations = []
+        self.shape = None
 
     def append_filter(self, f):
         self.filters.append(f)
@@ -34,15 +48,27 @@ class Builder(object):
         p_size = extract_limit(params)
         p_sort = extract_sort(params)
 
-        filters = [f(params) for f in self.filters]
-        matchers = [m(params) for m in self.matchers]
+        filters = [(f, f(params)) for f in self.filters]
+        matchers = [(m, m(params)) for m in self.matchers]
         aggregations = {a.key: a(params) for a in self.aggregations}
-        filters = [f for f in filters if f is not None]
-        matchers = [m for m in matchers if m is not None]
+        filters = [(f, result) for f, result in filters if result is not None]
+        matchers = [(m, result) for m, result in matchers if result is not None]
+
+        shape = QueryShape(filters=[_name(f) for f, _ in filters],
+                           matchers=[_name(m) for m, _ in matchers],
+                           aggregations=sorted(aggregations.keys()),
+                           sort=[k for s in p_sort for k in s.keys()],
+                           size=p_size)
+
+        filters = [result for _, result in filters]
+        matchers = [result for _, result in matchers]
 
         # Remaining parameters are added as straightforward key-value matchers
         for key, value in params.items():
             matchers.append({"match": {key: value}})
+            shape.matchers.append('match:' + key)
+
+        self.shape = shape
 
         query = {"match_all": {}}
 
@@ -66,6 +92,11 @@ class Builder(object):
         }
 
 
+def _name(obj):
+    """Return a name for a filter or matcher, for use in a query shape."""
+    return getattr(obj, '__name__', type(obj).__name__)
+
+
 def extract_offset(params):
     try:
         val = int(params.pop("offset"))
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+"""
+Coalescing of identical concurrent searches.
+
+When a popular page is shared, many clients issue exactly the same search
+within a few milliseconds of each other. :py:class:`SingleFlight` lets the
+first of those searches go to Elasticsearch while the others wait for, and
+share, its result.
+"""
+
+from __future__ import unicode_literals
+
+import json
+import threading
+
+# The key under which the process-wide SingleFlight is stored in the registry.
+SINGLEFLIGHT_KEY = 'memex.search.singleflight'
+
+
+class _Call(object):
+    def __init__(self):
+        # N.B. This is created at call time, rather than at import time, so
+        # that it uses gevent's implementation when running in a monkeypatched
+        # gevent worker.
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+
+    """
+    Deduplicate concurrent calls which share a key.
+
+    Only one call per key is in flight at any one time. Callers which arrive
+    while a call for their key is in progress wait for it to finish and
+    receive its result (or its exception) rather than making their own call.
+    Nothing is cached once the call has finished.
+
+    This works with both OS threads and monkeypatched gevent greenlets: the
+    internal lock is only held while updating the table of in-flight calls,
+    never while a call is running.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """
+        Call ``fn`` unless a call with the same ``key`` is already in flight.
+
+        :returns: a ``(result, shared)`` tuple, where ``shared`` is ``True`` if
+            the result came from another caller's call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result, False
+
+
+def search_key(request, index, body):
+    """
+    Return the key identifying a search for coalescing.
+
+    The built query body already contains everything that makes one search
+    differ from another, including the authenticated user (which the auth
+    filter adds), but we also key on whether the user is authenticated at all
+    so that anonymous and authenticated searches are never shared.
+    """
+    principal_class = ('anonymous' if request.authenticated_userid is None
+                       else 'authenticated')
+    return (principal_class, index, json.dumps(body, sort_keys=True))
@@ -18,6 +18,38 @@ def column_windows(session, column, windowsize=2000, where=None):
     Returns an iterable of SQLAlchemy expressions which can be used in a
     .filter(...) clause.
     """
+    for start, end in column_window_bounds(session, column, windowsize, where):
+        yield column_window(column, start, end)
+
+
+def column_window(column, start, end):
+    """
+    Return a WHERE clause selecting the rows in a window of a given column.
+
+    :param column: the SQLAlchemy column object the window is on
+    :param start: the first value of ``column`` in the window, or ``None``
+        if the window is open-ended
+    :param end: the first value of ``column`` after the window, or ``None``
+        if the window is open-ended
+    """
+    clauses = []
+    if start is not None:
+        clauses.append(column >= start)
+    if end is not None:
+        clauses.append(column < end)
+    if not clauses:
+        return sa.true()
+    return sa.and_(*clauses)
+
+
+def column_window_bounds(session, column, windowsize=2000, where=None):
+    """
+    Return the bounds of windows which break a given column into windows.
+
+    This takes the same arguments as :py:func:`column_windows`, but returns a
+    list of ``(start, end)`` tuples which can be stored and later turned into
+    WHERE clauses with :py:func:`column_window`.
+    """
 
     # This function is adapted from a recipe supplied by the SQLAlchemy
     # maintainers:
@@ -31,15 +63,6 @@ def column_windows(session, column, windowsize=2000, where=None):
     # translated into an iterable of SQLAlchemy expressions suitable for use
     # in Query#filter(...).
 
-    def interval_for_range(start_id, end_id):
-        if end_id:
-            return sa.and_(
-                column >= start_id,
-                column < end_id
-            )
-        else:
-            return column >= start_id
-
     q = session.query(
         column,
         sa.func.row_number().over(order_by=column).label('rownum')
@@ -56,10 +79,4 @@ def column_windows(session, column, windowsize=2000, where=None):
 
     intervals = [id for id, in q]
 
-    while intervals:
-        start = intervals.pop(0)
-        if intervals:
-            end = intervals[0]
-        else:
-            end = None
-        yield interval_for_range(start, end)
+    return list(zip(intervals, intervals[1:] + [None]))
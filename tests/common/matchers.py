@@ -75,6 +75,19 @@ class iterable_with(Matcher):  # noqa: N801
         return '<iterable with {!r}>'.format(self.items)
 
 
+class iterable_with_ids(Matcher):  # noqa: N801
+    """An object __eq__ to any iterable of objects with the given `ids`."""
+
+    def __init__(self, ids):
+        self.ids = sorted(ids)
+
+    def __eq__(self, other):
+        return sorted(item.id for item in other) == self.ids
+
+    def __repr__(self):
+        return '<iterable with ids {!r}>'.format(self.ids)
+
+
 class mapping_containing(Matcher):  # noqa: N801
     """An object __eq__ to any mapping with the passed `key`."""
 
@@ -14,6 +14,18 @@ class TestAPI(object):
         data = res.json
         assert data['id'] == annotation.id
 
+    def test_annotation_read_not_modified(self, app, annotation):
+        """Fetching an unchanged annotation again returns 304 Not Modified."""
+        url = '/api/annotations/' + annotation.id
+        headers = {b'accept': b'application/json'}
+        etag = app.get(url, headers=headers).headers['ETag']
+
+        headers[b'if-none-match'] = etag.encode('ascii')
+        res = app.get(url, headers=headers, status=304)
+
+        assert res.headers['ETag'] == etag
+        assert not res.body
+
     def test_annotation_read_jsonld(self, app, annotation):
         """Fetch an annotation by ID in jsonld format."""
         res = app.get('/api/annotations/' + annotation.id + '.jsonld')
@@ -49,6 +61,25 @@ class TestAPI(object):
         assert res.status_code == 400
         assert res.json['reason'].startswith('group:')
 
+    def test_bulk_creates_and_deletes_annotations(self, app, user_with_token):
+        """Create two annotations and delete one of them in a bulk request."""
+        user, token = user_with_token
+
+        headers = {'Authorization': str('Bearer {}'.format(token.value))}
+        operations = [
+            {'action': 'create', 'data': {'uri': 'http://example.com', 'text': 'One'}},
+            {'action': 'create', 'data': {'uri': 'http://example.com', 'text': 'Two'}},
+        ]
+
+        res = app.post_json('/api/bulk', {'operations': operations}, headers=headers)
+        created = [result['id'] for result in res.json['results']]
+
+        res = app.post_json('/api/bulk',
+                            {'operations': [{'action': 'delete', 'id': created[0]}]},
+                            headers=headers)
+
+        assert res.json['results'] == [{'id': created[0], 'deleted': True}]
+
     def test_anonymous_profile_api(self, app):
         """
         Fetch an anonymous "profile".
@@ -5,6 +5,7 @@ from __future__ import unicode_literals
 import pytest
 import mock
 
+from memex.search.core import SearchResult
 from pyramid.httpexceptions import HTTPFound
 from webob.multidict import MultiDict
 
@@ -191,7 +192,9 @@ class TestCheckURL(object):
         return mock.Mock(spec_set=[], return_value='UNPARSED_QUERY')
 
 
-@pytest.mark.usefixtures('fetch_annotations',
+@pytest.mark.usefixtures('annotation_cache',
+                         'facet_cache',
+                         'fetch_annotations',
                          '_fetch_groups',
                          'bucketing',
                          'presenters',
@@ -344,13 +347,15 @@ class TestExecute(object):
         assert result.timeframes == []
 
     def test_it_fetches_the_annotations_from_the_database(self,
+                                                          annotation_cache,
                                                           fetch_annotations,
                                                           pyramid_request,
                                                           search):
         execute(pyramid_request, MultiDict(), self.PAGE_SIZE)
 
         fetch_annotations.assert_called_once_with(
-            pyramid_request.db, search.run.return_value.annotation_ids)
+            pyramid_request.db, search.run.return_value.annotation_ids,
+            cache=annotation_cache)
 
     def test_it_buckets_the_annotations(self,
                                         fetch_annotations,
@@ -441,6 +446,47 @@ class TestExecute(object):
 
         assert result.aggregations == mock.sentinel.aggregations
 
+    def test_it_caches_the_aggregations(self, pyramid_request, facet_cache):
+        execute(pyramid_request, MultiDict(group='foo', tag='bar'), self.PAGE_SIZE)
+
+        facet_cache.set.assert_called_once_with(
+            'foo',
+            (None, (('group', 'foo'), ('tag', 'bar'))),
+            mock.sentinel.aggregations,
+            mock.sentinel.generation)
+
+    def test_it_includes_the_user_in_the_cache_key(self,
+                                                   pyramid_config,
+                                                   pyramid_request,
+                                                   facet_cache):
+        pyramid_config.testing_securitypolicy('acct:jane@example.com')
+
+        execute(pyramid_request, MultiDict(tag='bar'), self.PAGE_SIZE)
+
+        facet_cache.get.assert_called_once_with(
+            None, ('acct:jane@example.com', (('tag', 'bar'),)))
+
+    def test_it_does_not_aggregate_if_the_facets_are_cached(self,
+                                                            pyramid_request,
+                                                            facet_cache,
+                                                            search):
+        facet_cache.get.return_value = (mock.sentinel.cached_aggregations,
+                                        mock.sentinel.generation)
+        search.run.return_value = SearchResult(20, [], [], {})
+
+        result = execute(pyramid_request, MultiDict(group='foo'), self.PAGE_SIZE)
+
+        assert not search.append_aggregation.called
+        assert not facet_cache.set.called
+        assert result.aggregations == mock.sentinel.cached_aggregations
+
+    @pytest.fixture
+    def facet_cache(self, pyramid_config):
+        facet_cache = mock.Mock(spec_set=['get', 'set'])
+        facet_cache.get.return_value = (None, mock.sentinel.generation)
+        pyramid_config.register_service(facet_cache, name='facet_cache')
+        return facet_cache
+
     @pytest.fixture
     def fetch_annotations(self, patch):
         return patch('h.activity.query.fetch_annotations')
@@ -590,6 +636,25 @@ class TestFetchAnnotations(object):
 
         assert annotations == result
 
+    def test_it_fetches_annotations_through_the_cache(self, db_session, factories):
+        annotations = [factories.Annotation() for _ in xrange(3)]
+        ids = [a.id for a in annotations]
+        cache = mock.Mock(spec_set=['fetch'])
+        cache.fetch.return_value = {a.id: a for a in annotations}
+
+        result = fetch_annotations(db_session, ids, cache=cache)
+
+        cache.fetch.assert_called_once_with(db_session, ids,
+                                            query_processor=mock.ANY)
+        assert annotations == result
+
+
+@pytest.fixture
+def annotation_cache(pyramid_config):
+    cache = mock.Mock(spec_set=['fetch', 'invalidate'])
+    pyramid_config.register_service(cache, name='annotation_cache')
+    return cache
+
 
 @pytest.fixture
 def pyramid_request(pyramid_request):
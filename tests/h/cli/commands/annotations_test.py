@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import mock
+import pytest
+
+from h.cli.commands import annotations
+
+
+class TestRerenderAnnotations(object):
+    def test_it_updates_changed_rendered_text(self, req, db_session, factories):
+        annotation = factories.Annotation(text='_foo_')
+        annotation._text_rendered = '<p>stale</p>'
+        db_session.flush()
+
+        annotations.rerender_annotations(req)
+        db_session.expire_all()
+
+        assert annotation.text_rendered == '<p><em>foo</em></p>\n'
+
+    def test_it_returns_the_number_of_changed_annotations(self, req, db_session, factories):
+        stale = factories.Annotation(text='foo')
+        stale._text_rendered = '<p>stale</p>'
+        factories.Annotation(text='bar')
+        db_session.flush()
+
+        assert annotations.rerender_annotations(req) == 1
+
+    def test_it_processes_annotations_in_batches(self, req, db_session, factories):
+        anns = [factories.Annotation(text='foo') for _ in range(5)]
+        for annotation in anns:
+            annotation._text_rendered = '<p>stale</p>'
+        db_session.flush()
+
+        count = annotations.rerender_annotations(req, batch_size=2)
+        db_session.expire_all()
+
+        assert count == 5
+        assert req.tm.commit.call_count == 3
+        assert all(a.text_rendered == '<p>foo</p>\n' for a in anns)
+
+    def test_it_renders_with_worker_processes(self, req, db_session, factories, patch):
+        Pool = patch('h.cli.commands.annotations.multiprocessing.Pool')
+        Pool.return_value.map.return_value = ['<p>foo</p>\n']
+        annotation = factories.Annotation(text='foo')
+        annotation._text_rendered = '<p>stale</p>'
+        db_session.flush()
+
+        annotations.rerender_annotations(req, processes=4)
+        db_session.expire_all()
+
+        Pool.assert_called_once_with(4)
+        Pool.return_value.map.assert_called_once_with(
+            annotations.markdown.render, ['foo'], 1)
+        Pool.return_value.close.assert_called_once_with()
+        assert annotation.text_rendered == '<p>foo</p>\n'
+
+    @pytest.fixture
+    def req(self, pyramid_request):
+        pyramid_request.tm = mock.MagicMock()
+        return pyramid_request
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+
+import mock
+import pytest
+
+from h.cli.commands import export as export_cli
+
+
+class TestExportCommand(object):
+
+    def test_it_writes_the_export_to_stdout(self, cli, cliconfig, export_annotations):
+        export_annotations.return_value = iter([b'{"id":"a"}\n',
+                                                b'{"id":"b"}\n'])
+
+        result = cli.invoke(export_cli.export, [], obj=cliconfig)
+
+        assert result.exit_code == 0
+        assert result.output == ('{"id":"a"}\n{"id":"b"}\n'
+                                 'Exported 2 annotations.\n')
+
+    def test_it_writes_the_export_to_a_file(self, cli, cliconfig, export_annotations):
+        export_annotations.return_value = iter([b'{"id":"a"}\n'])
+
+        cli.invoke(export_cli.export, ['--output', 'export.ndjson'],
+                   obj=cliconfig)
+
+        with open('export.ndjson', 'rb') as f:
+            assert f.read() == b'{"id":"a"}\n'
+
+    def test_it_passes_the_filters(self, cli, cliconfig, export_annotations, pyramid_request):
+        cli.invoke(export_cli.export, ['--user', 'acct:alice@example.com',
+                                       '--group', 'abc123',
+                                       '--uri', 'http://example.com/a',
+                                       '--uri', 'http://example.com/b',
+                                       '--since', '2016-01-01',
+                                       '--until', '2016-02-01',
+                                       '--batch-size', '10'],
+                   obj=cliconfig)
+
+        export_annotations.assert_called_once_with(
+            pyramid_request.registry['sqlalchemy.engine'],
+            {'userid': 'acct:alice@example.com',
+             'groupid': 'abc123',
+             'uris': ['http://example.com/a', 'http://example.com/b'],
+             'since': datetime(2016, 1, 1),
+             'until': datetime(2016, 2, 1)},
+            mock.ANY,
+            pyramid_request.auth_domain,
+            mock.ANY,
+            batch_size=10)
+
+    @pytest.fixture
+    def export_annotations(self, patch):
+        export_annotations = patch('h.cli.commands.export.export_.export_annotations')
+        export_annotations.return_value = iter([])
+        return export_annotations
+
+
+@pytest.fixture
+def cliconfig(pyramid_config, pyramid_request):
+    pyramid_config.registry['sqlalchemy.engine'] = mock.sentinel.engine
+    pyramid_config.register_service(mock.sentinel.links_service, name='links')
+    return {'bootstrap': mock.Mock(return_value=pyramid_request)}
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+import mock
+import pytest
+
+from h.cli.commands import outbox as outbox_cli
+
+
+class TestDrainCommand(object):
+
+    def test_it_drains_until_the_outbox_is_empty(self, cli, cliconfig, drain):
+        drain.side_effect = [10, 10, 3]
+
+        result = cli.invoke(outbox_cli.drain, ['--once', '--batch-size', '10'],
+                            obj=cliconfig)
+
+        assert result.exit_code == 0
+        assert drain.call_count == 3
+
+    def test_it_commits_each_batch(self, cli, cliconfig, drain, pyramid_request):
+        drain.side_effect = [10, 3]
+
+        cli.invoke(outbox_cli.drain, ['--once', '--batch-size', '10'],
+                   obj=cliconfig)
+
+        assert pyramid_request.tm.commit.call_count == 2
+
+    def test_it_aborts_on_failure(self, cli, cliconfig, drain, pyramid_request):
+        drain.side_effect = RuntimeError('broker down')
+
+        result = cli.invoke(outbox_cli.drain, ['--once'], obj=cliconfig)
+
+        assert isinstance(result.exception, RuntimeError)
+        pyramid_request.tm.abort.assert_called_once_with()
+        assert not pyramid_request.tm.commit.called
+
+    def test_it_waits_when_the_outbox_is_empty(self, cli, cliconfig, drain, patch):
+        sleep = patch('h.cli.commands.outbox.time.sleep')
+        sleep.side_effect = [None, KeyboardInterrupt]
+        drain.return_value = 0
+
+        cli.invoke(outbox_cli.drain, ['--interval', '0.5'], obj=cliconfig)
+
+        sleep.assert_called_with(0.5)
+
+    @pytest.fixture
+    def drain(self, patch):
+        return patch('h.cli.commands.outbox.outbox_.drain')
+
+
+@pytest.fixture
+def cliconfig(pyramid_request):
+    pyramid_request.tm = mock.Mock()
+    return {'bootstrap': mock.Mock(return_value=pyramid_request)}
@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
 
+import datetime
 import mock
 import os
 import pytest
 
 from h.cli.commands import search
+from h.indexer.verifier import Result
 
 
 class TestReindexCommand(object):
@@ -19,7 +21,38 @@ class TestReindexCommand(object):
         assert result.exit_code == 0
         reindex.assert_called_once_with(pyramid_request.db,
                                         pyramid_request.es,
-                                        pyramid_request)
+                                        pyramid_request,
+                                        processes=1,
+                                        resume=False,
+                                        fetch_size=2000)
+
+    def test_passes_processes_and_resume(self, cli, cliconfig, pyramid_request, reindex):
+        result = cli.invoke(search.reindex, ['--processes', '4', '--resume'],
+                            obj=cliconfig)
+
+        assert result.exit_code == 0
+        reindex.assert_called_once_with(pyramid_request.db,
+                                        pyramid_request.es,
+                                        pyramid_request,
+                                        processes=4,
+                                        resume=True,
+                                        fetch_size=2000)
+
+    def test_passes_fetch_size(self, cli, cliconfig, pyramid_request, reindex):
+        result = cli.invoke(search.reindex, ['--fetch-size', '500'],
+                            obj=cliconfig)
+
+        assert result.exit_code == 0
+        _, kwargs = reindex.call_args
+        assert kwargs['fetch_size'] == 500
+
+    def test_handles_runtimeerror(self, cli, cliconfig, reindex):
+        reindex.side_effect = RuntimeError('nothing to resume')
+
+        result = cli.invoke(search.reindex, ['--resume'], obj=cliconfig)
+
+        assert result.exit_code == 1
+        assert 'nothing to resume' in result.output
 
     @pytest.fixture
     def reindex(self, patch):
@@ -27,6 +60,55 @@ class TestReindexCommand(object):
         return index.reindex
 
 
+class TestVerifyCommand(object):
+    def test_calls_verify(self, cli, cliconfig, pyramid_request, verify):
+        result = cli.invoke(search.verify, [], obj=cliconfig)
+
+        assert result.exit_code == 0
+        verify.assert_called_once_with(pyramid_request.db,
+                                       pyramid_request.es,
+                                       pyramid_request,
+                                       since=None)
+
+    def test_passes_since(self, cli, cliconfig, verify):
+        result = cli.invoke(search.verify, ['--since', '2017-03-01T10:00:00'],
+                            obj=cliconfig)
+
+        assert result.exit_code == 0
+        _, kwargs = verify.call_args
+        assert kwargs['since'] == datetime.datetime(2017, 3, 1, 10, 0)
+
+    def test_converts_since_to_utc(self, cli, cliconfig, verify):
+        cli.invoke(search.verify, ['--since', '2017-03-01T10:00:00+02:00'],
+                   obj=cliconfig)
+
+        _, kwargs = verify.call_args
+        assert kwargs['since'] == datetime.datetime(2017, 3, 1, 8, 0)
+
+    def test_rejects_invalid_since(self, cli, cliconfig, verify):
+        result = cli.invoke(search.verify, ['--since', 'yesterdayish'],
+                            obj=cliconfig)
+
+        assert result.exit_code == 2
+        assert not verify.called
+
+    def test_prints_summary(self, cli, cliconfig, verify):
+        verify.return_value = Result(windows=10,
+                                     mismatched_windows=2,
+                                     reindexed=5,
+                                     deleted=1)
+
+        result = cli.invoke(search.verify, [], obj=cliconfig)
+
+        assert 'checked 10 windows, 2 differed' in result.output
+
+    @pytest.fixture
+    def verify(self, patch):
+        index = patch('h.cli.commands.search.indexer')
+        index.verify.return_value = Result(0, 0, 0, 0)
+        return index.verify
+
+
 class TestUpdateSettingsCommand(object):
     def test_calls_update_index_settings(self, cli, cliconfig, pyramid_request, update_index_settings):
         result = cli.invoke(search.update_settings, [], obj=cliconfig)
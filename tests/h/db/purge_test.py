@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from datetime import datetime
+
+import mock
+import pytest
+
+from h.db.purge import purge
+from h.models import Token
+
+
+class TestPurge(object):
+    def test_it_deletes_matching_rows(self, db_session, factories, commit):
+        factories.Token(expires=datetime(2014, 5, 6, 7, 8, 9))
+        factories.Token(expires=datetime(2014, 5, 6, 7, 8, 9))
+        valid = factories.Token(expires=None)
+
+        count = purge(self.expired(db_session), commit)
+
+        assert count == 2
+        assert db_session.query(Token).all() == [valid]
+
+    def test_it_commits_each_batch(self, db_session, factories, commit):
+        for _ in range(5):
+            factories.Token(expires=datetime(2014, 5, 6, 7, 8, 9))
+
+        count = purge(self.expired(db_session), commit, batch_size=2)
+
+        assert count == 5
+        assert commit.call_count == 3
+        assert db_session.query(Token).count() == 0
+
+    def test_it_does_nothing_when_no_rows_match(self, db_session, factories, commit):
+        factories.Token(expires=None)
+
+        assert purge(self.expired(db_session), commit) == 0
+        assert not commit.called
+
+    def test_it_throttles_deletion_to_the_rate(self, db_session, factories, commit, clock, sleep):
+        for _ in range(5):
+            factories.Token(expires=datetime(2014, 5, 6, 7, 8, 9))
+
+        purge(self.expired(db_session), commit, batch_size=2, rate=4,
+              clock=clock, sleep=sleep)
+
+        # Deleting 2 rows at 4 rows/s takes 0.5s, and 4 rows takes 1s.
+        assert sleep.mock_calls == [mock.call(0.5), mock.call(1.0)]
+
+    def test_it_stops_when_the_time_budget_is_spent(self, db_session, factories, commit, clock, sleep):
+        for _ in range(5):
+            factories.Token(expires=datetime(2014, 5, 6, 7, 8, 9))
+
+        count = purge(self.expired(db_session), commit, batch_size=2,
+                      rate=4, time_budget=0.5, clock=clock, sleep=sleep)
+
+        assert count == 2
+        assert not sleep.called
+        assert db_session.query(Token).count() == 3
+
+    def expired(self, db_session):
+        return db_session.query(Token).filter(Token.expires < datetime.utcnow())
+
+    @pytest.fixture
+    def commit(self):
+        return mock.Mock(spec_set=[])
+
+    @pytest.fixture
+    def clock(self):
+        # A clock which doesn't move on its own.
+        return mock.Mock(spec_set=[], return_value=1000.0)
+
+    @pytest.fixture
+    def sleep(self):
+        return mock.Mock(spec_set=[])
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from datetime import datetime
+import json
+
+import mock
+import pytest
+
+from h import export
+from h.renderers import JSONEncoder
+from h.services.groupfinder import GroupfinderService
+
+
+class TestAnnotationsQuery(object):
+    def test_it_excludes_deleted_annotations(self, db_session, factories):
+        annotation = factories.Annotation()
+        factories.Annotation(deleted=True)
+
+        assert export.annotations_query(db_session).all() == [annotation]
+
+    def test_it_filters_by_user(self, db_session, factories):
+        annotation = factories.Annotation(userid='acct:alice@example.com')
+        factories.Annotation(userid='acct:bob@example.com')
+
+        query = export.annotations_query(db_session,
+                                         userid='acct:alice@example.com')
+
+        assert query.all() == [annotation]
+
+    def test_it_filters_by_group(self, db_session, factories):
+        annotation = factories.Annotation(groupid='abc123')
+        factories.Annotation(groupid='__world__')
+
+        query = export.annotations_query(db_session, groupid='abc123')
+
+        assert query.all() == [annotation]
+
+    def test_it_filters_by_uri(self, db_session, factories):
+        annotation = factories.Annotation(target_uri='http://example.com/a')
+        factories.Annotation(target_uri='http://example.com/b')
+
+        query = export.annotations_query(db_session,
+                                         uris=['https://example.com/a'])
+
+        assert query.all() == [annotation]
+
+    def test_it_filters_by_time(self, db_session, factories):
+        factories.Annotation(updated=datetime(2016, 1, 1))
+        annotation = factories.Annotation(updated=datetime(2016, 2, 1))
+        factories.Annotation(updated=datetime(2016, 3, 1))
+
+        query = export.annotations_query(db_session,
+                                         since=datetime(2016, 2, 1),
+                                         until=datetime(2016, 3, 1))
+
+        assert query.all() == [annotation]
+
+    def test_it_filters_to_annotations_readable_by_the_user(self, db_session, factories):
+        shared = factories.Annotation(shared=True)
+        own = factories.Annotation(userid='acct:alice@example.com', shared=False)
+        factories.Annotation(userid='acct:bob@example.com', shared=False)
+
+        query = export.annotations_query(db_session,
+                                         readable_by='acct:alice@example.com')
+
+        assert set(query) == {shared, own}
+
+    def test_it_excludes_the_given_users(self, db_session, factories):
+        annotation = factories.Annotation(userid='acct:alice@example.com')
+        factories.Annotation(userid='acct:bob@example.com')
+
+        query = export.annotations_query(
+            db_session, exclude_userids={'acct:bob@example.com'})
+
+        assert query.all() == [annotation]
+
+
+class TestStreamAnnotations(object):
+    def test_it_yields_a_line_of_json_per_annotation(self, db_session, factories, stream):
+        annotation = factories.Annotation(text='Some text')
+
+        lines = list(stream(export.annotations_query(db_session)))
+
+        assert len(lines) == 1
+        assert lines[0].endswith(b'\n')
+        row = json.loads(lines[0].decode('utf-8'))
+        assert row['id'] == annotation.id
+        assert row['text'] == 'Some text'
+
+    def test_it_orders_annotations_by_when_they_were_updated(self, db_session, factories, stream):
+        anns = [factories.Annotation(updated=datetime(2016, 1, day))
+                for day in (3, 1, 2)]
+
+        lines = stream(export.annotations_query(db_session), batch_size=2)
+
+        assert [json.loads(line)['id'] for line in lines] == [
+            anns[1].id, anns[2].id, anns[0].id]
+
+    def test_it_does_not_keep_exported_annotations_in_the_session(self, db_session, factories, stream):
+        factories.Annotation()
+
+        list(stream(export.annotations_query(db_session)))
+
+        assert not list(db_session)
+
+    @pytest.fixture
+    def stream(self, db_session):
+        links_service = mock.Mock(spec_set=['get', 'get_all'])
+        links_service.get.return_value = 'http://example.com/a/1'
+        links_service.get_all.return_value = {}
+        group_service = GroupfinderService(db_session, 'example.com')
+
+        def stream(query, batch_size=export.DEFAULT_BATCH_SIZE):
+            return export.stream_annotations(db_session, query, group_service,
+                                             links_service, JSONEncoder(),
+                                             batch_size=batch_size)
+        return stream
+
+
+class TestExportAnnotations(object):
+    def test_it_streams_from_its_own_session(self, patch):
+        snapshot_session = patch('h.export.snapshot_session')
+        annotations_query = patch('h.export.annotations_query')
+        stream_annotations = patch('h.export.stream_annotations')
+        GroupfinderService = patch('h.export.GroupfinderService')
+        stream_annotations.return_value = iter([b'{"id":"a"}\n'])
+        session = snapshot_session.return_value.__enter__.return_value
+
+        lines = export.export_annotations(mock.sentinel.engine,
+                                          {'userid': 'acct:alice@example.com'},
+                                          mock.sentinel.links_service,
+                                          'example.com',
+                                          mock.sentinel.encoder)
+
+        # Nothing is read until the export is iterated over.
+        assert not snapshot_session.called
+        assert list(lines) == [b'{"id":"a"}\n']
+        snapshot_session.assert_called_once_with(mock.sentinel.engine)
+        GroupfinderService.assert_called_once_with(session, 'example.com')
+        annotations_query.assert_called_once_with(
+            session, userid='acct:alice@example.com')
+        stream_annotations.assert_called_once_with(
+            session, annotations_query.return_value,
+            GroupfinderService.return_value,
+            mock.sentinel.links_service, mock.sentinel.encoder,
+            batch_size=export.DEFAULT_BATCH_SIZE)
+        assert snapshot_session.return_value.__exit__.called
+
+
+class TestSnapshotSession(object):
+    def test_it_reads_from_a_repeatable_read_transaction(self, db_engine):
+        with export.snapshot_session(db_engine) as session:
+            isolation = session.execute('SHOW transaction_isolation').scalar()
+
+        assert isolation == 'repeatable read'
+
+    def test_it_returns_the_connection_to_the_pool(self, db_engine):
+        checkedout = db_engine.pool.checkedout()
+
+        with export.snapshot_session(db_engine):
+            assert db_engine.pool.checkedout() == checkedout + 1
+
+        assert db_engine.pool.checkedout() == checkedout
+
+
+class TestParseDatetime(object):
+    @pytest.mark.parametrize('value,expected', [
+        ('2016-01-02', datetime(2016, 1, 2)),
+        ('2016-01-02T03:04:05', datetime(2016, 1, 2, 3, 4, 5)),
+        ('2016-01-02T03:04:05+01:00', datetime(2016, 1, 2, 2, 4, 5)),
+    ])
+    def test_it_parses_naive_utc_datetimes(self, value, expected):
+        assert export.parse_datetime(value) == expected
+
+    @pytest.mark.parametrize('value', ['not a time', '99999999999999999999'])
+    def test_it_raises_for_invalid_values(self, value):
+        with pytest.raises(ValueError):
+            export.parse_datetime(value)
@@ -1,14 +1,44 @@
 # -*- coding: utf-8 -*-
 
+import datetime
+import json
+
 import mock
 import pytest
 
 from memex.search import client
+from memex.search.index import Window
+
+from h.indexer import reindexer
+from h.indexer.reindexer import reindex, SETTING_NEW_INDEX, SETTING_PROGRESS
+from h.indexer.reindexer import REINDEX_STATE_CHANGED
+
+WINDOWS = [
+    Window(datetime.datetime(2016, 1, 1), datetime.datetime(2016, 2, 1)),
+    Window(datetime.datetime(2016, 2, 1), datetime.datetime(2016, 3, 1)),
+    Window(datetime.datetime(2016, 3, 1), None),
+]
+
+
+class FakeSettingsService(object):
+    def __init__(self):
+        self.data = {}
+        self.history = []
+
+    def get(self, key):
+        return self.data.get(key)
 
-from h.indexer.reindexer import reindex, SETTING_NEW_INDEX
+    def put(self, key, value):
+        self.data[key] = value
+        self.history.append((key, value))
+
+    def delete(self, key):
+        self.data.pop(key, None)
 
 
 @pytest.mark.usefixtures('BatchIndexer',
+                         'annotation_windows',
+                         'celery',
                          'configure_index',
                          'get_aliased_index',
                          'update_aliased_index',
@@ -20,22 +50,32 @@ class TestReindex(object):
         _, kwargs = BatchIndexer.call_args
         assert kwargs['op_type'] == 'create'
 
-    def test_indexes_annotations(self, pyramid_request, es, batchindexer):
-        """Should call .index() on the batch indexer instance."""
+    def test_splits_annotations_into_windows(self, pyramid_request, es, annotation_windows):
+        reindex(mock.sentinel.session, es, pyramid_request)
+
+        annotation_windows.assert_called_once_with(mock.sentinel.session)
+
+    def test_indexes_each_window(self, pyramid_request, es, batchindexer):
         reindex(mock.sentinel.session, es, pyramid_request)
 
-        batchindexer.index.assert_called_once_with()
+        assert batchindexer.index_window.mock_calls == [mock.call(w)
+                                                        for w in WINDOWS]
 
     def test_retries_failed_annotations(self, pyramid_request, es, batchindexer):
-        """Should call .index() a second time with any failed annotation IDs."""
-        batchindexer.index.return_value = ['abc123', 'def456']
+        """Should call .index() with any failed annotation IDs."""
+        batchindexer.index_window.side_effect = [set(['abc123', 'def456']),
+                                                 set(),
+                                                 set()]
 
         reindex(mock.sentinel.session, es, pyramid_request)
 
-        assert batchindexer.index.mock_calls == [
-            mock.call(),
-            mock.call(['abc123', 'def456']),
-        ]
+        batchindexer.index.assert_called_once_with(set(['abc123', 'def456']))
+
+    def test_passes_fetch_size_to_indexer(self, pyramid_request, es, BatchIndexer):
+        reindex(mock.sentinel.session, es, pyramid_request, fetch_size=500)
+
+        _, kwargs = BatchIndexer.call_args
+        assert kwargs['fetch_size'] == 500
 
     def test_creates_new_index(self, pyramid_request, es, configure_index, matchers):
         """Creates a new target index."""
@@ -62,7 +102,7 @@ class TestReindex(object):
 
     def test_does_not_update_alias_if_indexing_fails(self, pyramid_request, es, batchindexer, update_aliased_index):
         """Don't call update_aliased_index if index() fails..."""
-        batchindexer.index.side_effect = RuntimeError('fail')
+        batchindexer.index_window.side_effect = RuntimeError('fail')
 
         try:
             reindex(mock.sentinel.session, es, pyramid_request)
@@ -82,25 +122,96 @@ class TestReindex(object):
 
         reindex(mock.sentinel.session, es, pyramid_request)
 
-        settings_service.put.assert_called_once_with(SETTING_NEW_INDEX, 'hypothesis-abcd1234')
+        assert (SETTING_NEW_INDEX, 'hypothesis-abcd1234') in settings_service.history
+
+    def test_checkpoints_each_window(self, pyramid_request, es, settings_service):
+        reindex(mock.sentinel.session, es, pyramid_request)
+
+        checkpoints = [json.loads(value)['done']
+                       for key, value in settings_service.history
+                       if key == SETTING_PROGRESS]
+        assert checkpoints == [[], [0], [0, 1], [0, 1, 2]]
 
-    def test_deletes_index_name_setting(self, pyramid_request, es, settings_service):
+    def test_broadcasts_state_change_when_starting_and_finishing(self, pyramid_request, es, celery):
         reindex(mock.sentinel.session, es, pyramid_request)
 
-        settings_service.delete.assert_called_once_with(SETTING_NEW_INDEX)
+        assert celery.control.broadcast.mock_calls == [
+            mock.call(REINDEX_STATE_CHANGED),
+            mock.call(REINDEX_STATE_CHANGED),
+        ]
+
+    def test_deletes_settings_when_reindexed(self, pyramid_request, es, settings_service):
+        reindex(mock.sentinel.session, es, pyramid_request)
+
+        assert settings_service.data == {}
+
+    def test_keeps_settings_when_exception_raised(self, pyramid_request, es, settings_service, batchindexer, configure_index):
+        configure_index.return_value = 'hypothesis-abcd1234'
+        batchindexer.index_window.side_effect = [set(), RuntimeError('boom!')]
+
+        with pytest.raises(RuntimeError):
+            reindex(mock.sentinel.session, es, pyramid_request)
 
-    def test_deletes_index_name_setting_when_exception_raised(self, pyramid_request, es, settings_service, batchindexer):
-        batchindexer.index.side_effect = RuntimeError('boom!')
+        assert settings_service.data[SETTING_NEW_INDEX] == 'hypothesis-abcd1234'
+        assert json.loads(settings_service.data[SETTING_PROGRESS])['done'] == [0]
 
+    def test_resume_indexes_remaining_windows(self, pyramid_request, es, settings_service, batchindexer, configure_index):
+        batchindexer.index_window.side_effect = [set(), RuntimeError('boom!')]
         with pytest.raises(RuntimeError):
             reindex(mock.sentinel.session, es, pyramid_request)
+        batchindexer.index_window.reset_mock()
+        batchindexer.index_window.side_effect = None
+        configure_index.reset_mock()
+
+        reindex(mock.sentinel.session, es, pyramid_request, resume=True)
+
+        assert batchindexer.index_window.mock_calls == [mock.call(w)
+                                                        for w in WINDOWS[1:]]
+        assert not configure_index.called
+
+    def test_resume_uses_interrupted_index(self, pyramid_request, es, settings_service, BatchIndexer, update_aliased_index):
+        settings_service.put(SETTING_NEW_INDEX, 'hypothesis-abcd1234')
+        settings_service.put(SETTING_PROGRESS,
+                             reindexer._dump_progress(WINDOWS, set([0])))
 
-        settings_service.delete.assert_called_once_with(SETTING_NEW_INDEX)
+        reindex(mock.sentinel.session, es, pyramid_request, resume=True)
+
+        _, kwargs = BatchIndexer.call_args
+        assert kwargs['target_index'] == 'hypothesis-abcd1234'
+        update_aliased_index.assert_called_once_with(es, 'hypothesis-abcd1234')
+
+    def test_resume_raises_if_nothing_to_resume(self, pyramid_request, es):
+        with pytest.raises(RuntimeError):
+            reindex(mock.sentinel.session, es, pyramid_request, resume=True)
+
+    def test_indexes_with_worker_processes(self, pyramid_request, es, patch):
+        Pool = patch('h.indexer.reindexer.multiprocessing.Pool')
+        Pool.return_value.imap_unordered.return_value = iter([(1, []),
+                                                              (0, []),
+                                                              (2, [])])
+        session = mock.Mock()
+
+        reindex(session, es, pyramid_request, processes=4)
+
+        Pool.assert_called_once_with(4,
+                                     initializer=reindexer._init_worker,
+                                     initargs=(pyramid_request, mock.ANY, 2000))
+        session.get_bind.return_value.dispose.assert_called_once_with()
 
     @pytest.fixture
     def BatchIndexer(self, patch):
         return patch('h.indexer.reindexer.BatchIndexer')
 
+    @pytest.fixture
+    def celery(self, patch):
+        return patch('h.indexer.reindexer.celery')
+
+    @pytest.fixture
+    def annotation_windows(self, patch):
+        func = patch('h.indexer.reindexer.annotation_windows')
+        func.return_value = WINDOWS
+        return func
+
     @pytest.fixture
     def configure_index(self, patch):
         return patch('h.indexer.reindexer.configure_index')
@@ -118,7 +229,8 @@ class TestReindex(object):
     @pytest.fixture
     def batchindexer(self, BatchIndexer):
         indexer = BatchIndexer.return_value
-        indexer.index.return_value = []
+        indexer.index_window.return_value = set()
+        indexer.index.return_value = set()
         return indexer
 
     @pytest.fixture
@@ -130,7 +242,7 @@ class TestReindex(object):
 
     @pytest.fixture
     def settings_service(self, pyramid_config):
-        service = mock.Mock()
+        service = FakeSettingsService()
         pyramid_config.register_service(service, name='settings')
         return service
 
@@ -138,3 +250,10 @@ class TestReindex(object):
     def pyramid_request(self, pyramid_request):
         pyramid_request.tm = mock.Mock()
         return pyramid_request
+
+
+class TestProgress(object):
+    def test_round_trips_windows(self):
+        value = reindexer._dump_progress(WINDOWS, set([2, 0]))
+
+        assert reindexer._load_progress(value) == (WINDOWS, set([0, 2]))
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import mock
 import pytest
 
 from memex import events
@@ -7,7 +8,7 @@ from memex import events
 from h.indexer import subscribers
 
 
-@pytest.mark.usefixtures('add_annotation', 'delete_annotation')
+@pytest.mark.usefixtures('add_annotation', 'delete_annotation', 'index_annotations')
 class TestSubscribeAnnotationEvent(object):
 
     @pytest.mark.parametrize('action', ['create', 'update'])
@@ -38,6 +39,46 @@ class TestSubscribeAnnotationEvent(object):
         delete_annotation.delay.assert_called_once_with(event.annotation_id)
         assert not add_annotation.delay.called
 
+    def test_it_enqueues_tasks_for_each_event_of_a_batch(self,
+                                                         add_annotation,
+                                                         delete_annotation,
+                                                         pyramid_request):
+        event = events.AnnotationBatchEvent(pyramid_request, [
+            events.AnnotationEvent(pyramid_request, 'id-1', 'create'),
+            events.AnnotationEvent(pyramid_request, 'id-2', 'update'),
+            events.AnnotationEvent(pyramid_request, 'id-3', 'delete'),
+        ])
+
+        subscribers.subscribe_annotation_event(event)
+
+        assert add_annotation.delay.call_args_list == [mock.call('id-1'),
+                                                       mock.call('id-2')]
+        delete_annotation.delay.assert_called_once_with('id-3')
+
+    @pytest.mark.parametrize('action,batch_action', [
+        ('create', 'index'),
+        ('update', 'index'),
+        ('delete', 'delete'),
+    ])
+    def test_it_enqueues_index_annotations_celery_task_when_batching(self,
+                                                                    action,
+                                                                    batch_action,
+                                                                    add_annotation,
+                                                                    delete_annotation,
+                                                                    index_annotations,
+                                                                    pyramid_request):
+        pyramid_request.registry.settings['h.indexer.batch'] = 'true'
+        event = events.AnnotationEvent(pyramid_request,
+                                       {'id': 'test_annotation_id'},
+                                       action)
+
+        subscribers.subscribe_annotation_event(event)
+
+        index_annotations.delay.assert_called_once_with(event.annotation_id,
+                                                        batch_action)
+        assert not add_annotation.delay.called
+        assert not delete_annotation.delay.called
+
     @pytest.fixture
     def add_annotation(self, patch):
         return patch('h.indexer.subscribers.add_annotation')
@@ -45,3 +86,7 @@ class TestSubscribeAnnotationEvent(object):
     @pytest.fixture
     def delete_annotation(self, patch):
         return patch('h.indexer.subscribers.delete_annotation')
+
+    @pytest.fixture
+    def index_annotations(self, patch):
+        return patch('h.indexer.subscribers.index_annotations')
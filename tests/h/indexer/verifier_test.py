@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import calendar
+import datetime
+
+import mock
+import pytest
+from dateutil import parser
+
+from h.indexer.verifier import verify
+from h.util.datetime import utc_iso8601
+
+
+class FakeIndex(object):
+
+    """
+    A fake of the parts of the Elasticsearch API used by the verifier.
+
+    Documents are stored as a dict of id to source.
+    """
+
+    def __init__(self):
+        self.docs = {}
+        self.index = 'hypothesis'
+        self.t = mock.Mock(annotation='annotation')
+        self.conn = mock.Mock(spec_set=['search'])
+        self.conn.search.side_effect = self._search
+
+    def add(self, annotation, updated=None):
+        updated = updated or annotation.updated
+        self.docs[annotation.id] = {'id': annotation.id,
+                                    'updated': utc_iso8601(updated)}
+
+    def scan(self, conn, index, doc_type, query):
+        for id_, source in self._matching(query['query']):
+            yield {'_id': id_, '_source': {'updated': source['updated']}}
+
+    def _search(self, index, doc_type, body):
+        matching = list(self._matching(body['query']))
+        total = sum(_ms(parser.parse(source['updated']))
+                    for _, source in matching)
+        return {'hits': {'total': len(matching)},
+                'aggregations': {'updated': {'value': float(total)}}}
+
+    def _matching(self, query):
+        filter_ = query['filtered']['filter']
+        bounds = filter_.get('range', {}).get('updated', {})
+        for id_, source in self.docs.items():
+            if 'updated' not in source:
+                continue
+            updated = _ms(parser.parse(source['updated']))
+            if 'gte' in bounds and updated < _ms(parser.parse(bounds['gte'])):
+                continue
+            if 'lt' in bounds and updated >= _ms(parser.parse(bounds['lt'])):
+                continue
+            yield id_, source
+
+
+def _ms(value):
+    value = value.replace(tzinfo=None)
+    return (calendar.timegm(value.timetuple()) * 1000 +
+            value.microsecond // 1000)
+
+
+@pytest.mark.usefixtures('indexer', 'scan')
+class TestVerify(object):
+
+    def test_does_nothing_when_index_matches(self, annotations, es, indexer, pyramid_request, db_session):
+        for annotation in annotations:
+            es.add(annotation)
+
+        result = verify(db_session, es, pyramid_request)
+
+        assert result.mismatched_windows == 0
+        assert not indexer.index.called
+        assert not indexer.delete.called
+
+    def test_reindexes_missing_annotations(self, annotations, es, indexer, pyramid_request, db_session):
+        for annotation in annotations[1:]:
+            es.add(annotation)
+
+        result = verify(db_session, es, pyramid_request)
+
+        indexer.index.assert_called_once_with([annotations[0].id])
+        assert result.reindexed == 1
+
+    def test_reindexes_stale_annotations(self, annotations, es, indexer, pyramid_request, db_session):
+        for annotation in annotations:
+            es.add(annotation)
+        es.add(annotations[2], updated=datetime.datetime(2015, 6, 1))
+
+        verify(db_session, es, pyramid_request)
+
+        indexer.index.assert_called_once_with([annotations[2].id])
+
+    def test_deletes_annotations_deleted_from_the_database(self, annotations, es, indexer, pyramid_request, db_session):
+        for annotation in annotations:
+            es.add(annotation)
+        annotations[1].deleted = True
+        db_session.flush()
+
+        result = verify(db_session, es, pyramid_request)
+
+        indexer.delete.assert_called_once_with([annotations[1].id])
+        assert not indexer.index.called
+        assert result.deleted == 1
+
+    def test_ignores_sub_millisecond_differences(self, annotations, es, indexer, pyramid_request, db_session):
+        for annotation in annotations:
+            es.add(annotation)
+        annotations[0].updated = annotations[0].updated.replace(microsecond=123456)
+        es.add(annotations[0], updated=annotations[0].updated.replace(microsecond=123000))
+        db_session.flush()
+
+        verify(db_session, es, pyramid_request)
+
+        assert not indexer.index.called
+
+    def test_since_only_checks_recent_annotations(self, annotations, es, indexer, pyramid_request, db_session):
+        # None of the annotations are in the index, but only those updated
+        # since March are checked.
+        verify(db_session, es, pyramid_request,
+               since=datetime.datetime(2016, 3, 1))
+
+        indexer.index.assert_called_once_with(sorted(a.id for a in annotations[2:]))
+
+    def test_only_compares_mismatched_windows(self, annotations, es, pyramid_request, db_session, scan, patch):
+        patch('h.indexer.verifier.annotation_windows').side_effect = (
+            lambda session, since: [
+                mock.Mock(start=datetime.datetime(2016, 1, 1),
+                          end=datetime.datetime(2016, 3, 1)),
+                mock.Mock(start=datetime.datetime(2016, 3, 1), end=None)])
+        for annotation in annotations[:4]:
+            es.add(annotation)
+
+        result = verify(db_session, es, pyramid_request)
+
+        assert result.windows == 2
+        assert result.mismatched_windows == 1
+        assert scan.call_count == 1
+
+    @pytest.fixture
+    def annotations(self, db_session, factories):
+        annotations = [factories.Annotation(updated=datetime.datetime(2016, month, 1))
+                       for month in range(1, 6)]
+        db_session.flush()
+        return annotations
+
+    @pytest.fixture
+    def es(self):
+        return FakeIndex()
+
+    @pytest.fixture
+    def scan(self, patch, es):
+        scan = patch('h.indexer.verifier.es_helpers.scan')
+        scan.side_effect = es.scan
+        return scan
+
+    @pytest.fixture
+    def indexer(self, patch):
+        BatchIndexer = patch('h.indexer.verifier.BatchIndexer')
+        return BatchIndexer.return_value
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import mock
 import pytest
 
 from h import links
@@ -94,6 +95,21 @@ def test_jsonld_id_link(factories, pyramid_config, pyramid_request):
     assert link == 'http://example.com/annos/e22AJlHYQNCG70bXL7gr1w'
 
 
+def test_links_generate_route_urls_once_per_request(factories, pyramid_config, pyramid_request):
+    pyramid_config.add_route('annotation', '/annos/{id}')
+    first = factories.Annotation(id='e22AJlHYQNCG70bXL7gr1w')
+    second = factories.Annotation(id='qvJnIGuSEeaOGU_gJ2M7vA')
+    links.html_link(pyramid_request, first)
+
+    with mock.patch.object(pyramid_request, 'route_url') as route_url:
+        html = links.html_link(pyramid_request, second)
+        jsonld_id = links.jsonld_id_link(pyramid_request, second)
+
+    assert not route_url.called
+    assert html == 'http://example.com/annos/qvJnIGuSEeaOGU_gJ2M7vA'
+    assert jsonld_id == html
+
+
 @pytest.mark.parametrize('uri,formatted', [
     ('http://notsecure.com', 'notsecure.com'),
     ('https://secure.com', 'secure.com'),
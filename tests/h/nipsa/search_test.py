@@ -1,8 +1,32 @@
 # -*- coding: utf-8 -*-
 
+import mock
+import pytest
+
 from h.nipsa import search
 
 
+class TestFilter(object):
+    def test_it_filters_by_nipsa_flag(self, pyramid_request):
+        filter_ = search.Filter(pyramid_request)
+
+        assert filter_({}) == search.nipsa_filter()
+
+    def test_it_filters_by_flagged_userids_with_query_time_filtering(self, pyramid_request, nipsa_service):
+        pyramid_request.registry.settings['h.nipsa.query_time'] = True
+        filter_ = search.Filter(pyramid_request)
+
+        assert filter_({}) == search.nipsa_filter(
+            flagged_userids=['acct:spammer@example.com'])
+
+    @pytest.fixture
+    def nipsa_service(self, pyramid_config):
+        service = mock.Mock(spec_set=['flagged_userids'])
+        service.flagged_userids = set(['acct:spammer@example.com'])
+        pyramid_config.register_service(service, name='nipsa')
+        return service
+
+
 def test_nipsa_filter_filters_out_nipsad_annotations():
     """nipsa_filter() filters out annotations with "nipsa": True."""
     assert search.nipsa_filter() == {
@@ -28,6 +52,34 @@ def test_nipsa_filter_coerces_userid_to_lowercase():
         filter_["bool"]["should"])
 
 
+def test_nipsa_filter_filters_out_flagged_userids():
+    filter_ = search.nipsa_filter(flagged_userids=['acct:Bob@example.com',
+                                                   'acct:alice@example.com'])
+
+    assert filter_ == {
+        "bool": {
+            "should": [
+                {"not": {"terms": {"user": ['acct:alice@example.com',
+                                            'acct:bob@example.com']}}}
+            ]
+        }
+    }
+
+
+def test_nipsa_filter_with_no_flagged_userids_filters_nothing():
+    filter_ = search.nipsa_filter(flagged_userids=[])
+
+    assert filter_ == {"bool": {"should": [{"match_all": {}}]}}
+
+
+def test_nipsa_filter_with_flagged_userids_does_not_filter_users_own_annotations():
+    filter_ = search.nipsa_filter(userid="fred",
+                                  flagged_userids=["fred"])
+
+    assert {'term': {'user': 'fred'}} in (
+        filter_["bool"]["should"])
+
+
 def test_nipsad_annotations_filters_by_userid():
     query = search.nipsad_annotations("test_userid")
 
@@ -28,7 +28,7 @@ FIXTURE_DATA = {
 }
 
 
-@pytest.mark.usefixtures('authz_policy', 'fetch_annotation', 'subscription', 'user_service')
+@pytest.mark.usefixtures('annotation_cache', 'authz_policy', 'fetch_annotation', 'subscription', 'user_service')
 class TestGetNotification(object):
     def test_returns_correct_params_when_subscribed(self,
                                                     parent,
@@ -44,6 +44,18 @@ class TestGetNotification(object):
         assert result.parent_user == user_service.fetch(parent.userid)
         assert result.document == reply.document
 
+    def test_fetches_the_parent_through_the_annotation_cache(self,
+                                                             annotation_cache,
+                                                             fetch_annotation,
+                                                             parent,
+                                                             pyramid_request,
+                                                             reply):
+        get_notification(pyramid_request, reply, 'create')
+
+        fetch_annotation.assert_called_once_with(pyramid_request.db,
+                                                 parent.id,
+                                                 cache=annotation_cache)
+
     def test_returns_none_when_action_is_not_create(self, pyramid_request, reply):
         assert get_notification(pyramid_request, reply, 'update') is None
         assert get_notification(pyramid_request, reply, 'delete') is None
@@ -130,6 +142,12 @@ class TestGetNotification(object):
     def annotations(self):
         return {}
 
+    @pytest.fixture
+    def annotation_cache(self, pyramid_config):
+        cache = mock.Mock(spec_set=['fetch', 'invalidate'])
+        pyramid_config.register_service(cache, name='annotation_cache')
+        return cache
+
     @pytest.fixture
     def authz_policy(self, pyramid_config):
         from pyramid.authorization import ACLAuthorizationPolicy
@@ -138,7 +156,7 @@ class TestGetNotification(object):
     @pytest.fixture
     def fetch_annotation(self, patch, annotations):
         fetch_annotation = patch('h.notification.reply.storage.fetch_annotation')
-        fetch_annotation.side_effect = lambda _, id: annotations.get(id)
+        fetch_annotation.side_effect = lambda _, id, cache=None: annotations.get(id)
         return fetch_annotation
 
     @pytest.fixture
@@ -154,7 +172,7 @@ class TestGetNotification(object):
         # annotation's `target_uri`
         doc = Document.find_or_create_by_uris(db_session,
                                               claimant_uri='http://example.net/foo',
-                                              uris=[]).one()
+                                              uris=[])[0]
         doc.meta.append(DocumentMeta(type='title',
                                      value=['Some document'],
                                      claimant='http://example.com/foo'))
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import mock
+import pytest
+
+from h import models
+from h import outbox
+
+
+class TestEnabled(object):
+
+    @pytest.mark.parametrize('settings,expected', [
+        ({}, False),
+        ({'h.outbox': 'false'}, False),
+        ({'h.outbox': 'true'}, True),
+        ({'h.outbox': True}, True),
+    ])
+    def test_it(self, settings, expected):
+        assert outbox.enabled(settings) is expected
+
+
+class TestAdd(object):
+
+    def test_it_adds_an_event(self, db_session, factories, pyramid_request):
+        annotation = factories.Annotation()
+        pyramid_request.headers['X-Client-Id'] = 'client-abc'
+
+        outbox.add(pyramid_request, annotation.id, 'create')
+
+        event = db_session.query(models.OutboxEvent).one()
+        assert event.annotation_id == annotation.id
+        assert event.action == 'create'
+        assert event.src_client_id == 'client-abc'
+
+    def test_it_adds_the_event_in_the_request_transaction(self, db_session, factories, pyramid_request):
+        annotation = factories.Annotation()
+
+        outbox.add(pyramid_request, annotation.id, 'delete')
+
+        assert db_session.new
+
+
+@pytest.mark.usefixtures('queue_annotation_event')
+class TestDrain(object):
+
+    def test_it_queues_indexer_tasks(self, events, pyramid_request, queue_annotation_event):
+        outbox.drain(pyramid_request)
+
+        assert queue_annotation_event.mock_calls == [
+            mock.call(pyramid_request.registry.settings, e.annotation_id, e.action)
+            for e in events]
+
+    def test_it_publishes_realtime_messages(self, events, pyramid_request):
+        outbox.drain(pyramid_request)
+
+        assert pyramid_request.realtime.publish_annotation.mock_calls == [
+            mock.call({'action': e.action,
+                       'annotation_id': e.annotation_id,
+                       'src_client_id': e.src_client_id})
+            for e in events]
+
+    def test_it_deletes_published_events(self, db_session, events, pyramid_request):
+        outbox.drain(pyramid_request)
+
+        assert db_session.query(models.OutboxEvent).count() == 0
+
+    def test_it_publishes_oldest_events_first_up_to_batch_size(self, db_session, events, pyramid_request, queue_annotation_event):
+        result = outbox.drain(pyramid_request, batch_size=2)
+
+        assert result == 2
+        assert [c[1][2] for c in queue_annotation_event.mock_calls] == ['create', 'update']
+        remaining = db_session.query(models.OutboxEvent).all()
+        assert [e.action for e in remaining] == ['delete']
+
+    def test_it_returns_zero_when_empty(self, pyramid_request, queue_annotation_event):
+        assert outbox.drain(pyramid_request) == 0
+        assert not queue_annotation_event.called
+
+    @pytest.fixture
+    def events(self, db_session, factories):
+        annotation = factories.Annotation()
+        events = [models.OutboxEvent(annotation_id=annotation.id,
+                                     action=action,
+                                     src_client_id='client-abc')
+                  for action in ['create', 'update', 'delete']]
+        for event in events:
+            db_session.add(event)
+            db_session.flush()
+        return events
+
+    @pytest.fixture
+    def pyramid_request(self, pyramid_request):
+        pyramid_request.realtime = mock.Mock(spec_set=['publish_annotation'])
+        return pyramid_request
+
+    @pytest.fixture
+    def queue_annotation_event(self, patch):
+        return patch('h.outbox.queue_annotation_event')
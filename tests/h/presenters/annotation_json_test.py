@@ -10,6 +10,7 @@ import pytest
 from pyramid import security
 from pyramid.authorization import ACLAuthorizationPolicy
 
+from h.presenters.annotation_json import AnnotationJSONBatchPresenter
 from h.presenters.annotation_json import AnnotationJSONPresenter
 from memex.resources import AnnotationResource
 
@@ -113,3 +114,78 @@ class TestAnnotationJSONPresenter(object):
         policy = ACLAuthorizationPolicy()
         pyramid_config.testing_securitypolicy(None)
         pyramid_config.set_authorization_policy(policy)
+
+
+@pytest.mark.usefixtures('policy')
+class TestAnnotationJSONBatchPresenter(object):
+    def test_asdicts_matches_annotation_json_presenter(self, annotations, group_service, fake_links_service):
+        expected = [AnnotationJSONPresenter(
+                        AnnotationResource(a, group_service, fake_links_service)).asdict()
+                    for a in annotations]
+
+        presenter = AnnotationJSONBatchPresenter(annotations,
+                                                 group_service,
+                                                 fake_links_service)
+
+        assert presenter.asdicts() == expected
+
+    def test_asdicts_checks_each_groups_permissions_once(self, annotations, group_service, fake_links_service):
+        presenter = AnnotationJSONBatchPresenter(annotations,
+                                                 group_service,
+                                                 fake_links_service)
+
+        presenter.asdicts()
+
+        assert group_service.find.mock_calls == [mock.call('__world__'),
+                                                 mock.call('abcde')]
+
+    def test_asdicts_does_not_share_permissions_between_annotations(self, annotations, group_service, fake_links_service):
+        presenter = AnnotationJSONBatchPresenter(annotations,
+                                                 group_service,
+                                                 fake_links_service)
+
+        first, second = presenter.asdicts()[:2]
+
+        assert first['permissions'] == second['permissions']
+        assert first['permissions'] is not second['permissions']
+
+    @pytest.fixture
+    def annotations(self):
+        def annotation(id_, userid, groupid, shared):
+            return mock.Mock(id=id_,
+                             created=datetime.datetime(2016, 2, 24, 18, 3, 25),
+                             updated=datetime.datetime(2016, 2, 24, 18, 3, 25),
+                             userid=userid,
+                             groupid=groupid,
+                             shared=shared,
+                             deleted=False,
+                             document=None,
+                             references=[],
+                             extra={})
+
+        return [annotation('one', 'acct:luke', '__world__', True),
+                annotation('two', 'acct:luke', '__world__', True),
+                annotation('three', 'acct:alice', '__world__', True),
+                annotation('four', 'acct:luke', 'abcde', True),
+                annotation('five', 'acct:luke', 'abcde', False),
+                annotation('six', 'acct:luke', 'abcde', True)]
+
+    @pytest.fixture
+    def group_service(self, group_service):
+        groups = {
+            '__world__': (security.Allow, security.Everyone, 'read'),
+            'abcde': (security.Allow, 'group:abcde', 'read'),
+        }
+
+        def find(groupid):
+            group = mock.Mock(spec_set=['__acl__'])
+            group.__acl__.return_value = [groups[groupid]]
+            return group
+
+        group_service.find.side_effect = find
+        return group_service
+
+    @pytest.fixture
+    def policy(self, pyramid_config):
+        pyramid_config.testing_securitypolicy(None)
+        pyramid_config.set_authorization_policy(ACLAuthorizationPolicy())
@@ -8,6 +8,7 @@ import mock
 import pytest
 
 from h.presenters.annotation_searchindex import AnnotationSearchIndexPresenter
+from h.presenters.annotation_searchindex import search_index_row_asdict
 
 
 @pytest.mark.usefixtures('DocumentSearchIndexPresenter')
@@ -66,3 +67,37 @@ class TestAnnotationSearchIndexPresenter(object):
         class_ = patch('h.presenters.annotation_searchindex.DocumentSearchIndexPresenter')
         class_.return_value.asdict.return_value = {}
         return class_
+
+
+class TestSearchIndexRowAsdict(object):
+
+    @pytest.mark.parametrize('kwargs', [
+        {},
+        {'text': None, 'tags': None, 'target_selectors': [], 'references': []},
+        {'document': None},
+        {'document': {'title': None, 'web_uri': None}},
+    ])
+    def test_it_matches_the_presenter(self, kwargs):
+        document = kwargs.pop('document', {'title': 'Example',
+                                           'web_uri': 'http://example.com'})
+        annotation = mock.Mock(
+            id='xyz123',
+            created=datetime.datetime(2016, 2, 24, 18, 3, 25, 768),
+            updated=datetime.datetime(2016, 2, 29, 10, 24, 5, 564),
+            userid='acct:luke@hypothes.is',
+            target_uri='http://example.com',
+            target_uri_normalized='http://example.com/normalized',
+            text='It is magical!',
+            tags=['magic'],
+            groupid='__world__',
+            shared=True,
+            target_selectors=[{'TestSelector': 'foobar'}],
+            references=['referenced-id-1', 'referenced-id-2'],
+            document=mock.Mock(**document) if document else None,
+            document_title=document['title'] if document else None,
+            document_web_uri=document['web_uri'] if document else None)
+        annotation.configure_mock(**kwargs)
+
+        expected = AnnotationSearchIndexPresenter(annotation).asdict()
+
+        assert search_index_row_asdict(annotation) == expected
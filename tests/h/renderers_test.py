@@ -1,5 +1,10 @@
 # -*- coding: utf-8 -*-
 
+import json
+
+import mock
+import pytest
+
 from h import renderers
 
 
@@ -25,3 +30,177 @@ def test_render_unicode_csv(pyramid_request):
              'rows': [[u'ñ', u'あ'], [u'ﺕ', u'Ӫ']]}
 
     assert renderer(value, sys) == u"ӓ,č\r\nñ,あ\r\nﺕ,Ӫ\r\n".encode('utf-8')
+
+
+class TestJSONEncoder(object):
+    def test_dumps_returns_compact_json(self):
+        encoder = renderers.JSONEncoder(fast=False)
+
+        assert encoder.dumps({'a': [1, 2]}) == '{"a":[1,2]}'
+
+    def test_dumps_uses_default_for_unknown_objects(self):
+        encoder = renderers.JSONEncoder(fast=False)
+
+        result = encoder.dumps({'a': Thing()}, default=lambda obj: 'thing')
+
+        assert result == '{"a":"thing"}'
+
+    def test_dumps_uses_ujson_when_fast(self, ujson):
+        encoder = renderers.JSONEncoder()
+
+        assert encoder.dumps({'a': 1}) == ujson.dumps.return_value
+        ujson.dumps.assert_called_once_with({'a': 1},
+                                            escape_forward_slashes=False)
+
+    @pytest.mark.parametrize('exc', [OverflowError, TypeError, ValueError])
+    def test_dumps_falls_back_when_ujson_fails(self, ujson, exc):
+        ujson.dumps.side_effect = exc
+        encoder = renderers.JSONEncoder()
+
+        result = encoder.dumps({'a': Thing()}, default=lambda obj: 'thing')
+
+        assert result == '{"a":"thing"}'
+
+    def test_dumps_does_not_use_ujson_when_not_fast(self, ujson):
+        encoder = renderers.JSONEncoder(fast=False)
+
+        encoder.dumps({'a': 1})
+
+        assert not ujson.dumps.called
+
+    @pytest.mark.parametrize('value', [
+        {'total': 3, 'rows': [{'id': 1}, {'id': 2}, {'id': 3}], 'replies': []},
+        [{'id': 1}, {'id': 2}],
+        {},
+        [],
+        {'a': {'b': [1, 2]}},
+        'string',
+        None,
+    ])
+    def test_iterencode_matches_dumps(self, value):
+        encoder = renderers.JSONEncoder(fast=False)
+
+        result = b''.join(encoder.iterencode(value))
+
+        assert result == encoder.dumps(value).encode('utf-8')
+
+    def test_iterencode_yields_chunks_of_rows(self):
+        encoder = renderers.JSONEncoder(fast=False)
+        value = {'rows': [{'id': 'x' * 10} for _ in range(10)]}
+
+        chunks = list(encoder.iterencode(value, chunk_size=30))
+
+        assert len(chunks) > 1
+        assert all(isinstance(chunk, bytes) for chunk in chunks)
+        assert json.loads(b''.join(chunks)) == value
+
+    def test_iterencode_encodes_rows_lazily(self):
+        encoder = renderers.JSONEncoder(fast=False)
+        encoded = []
+
+        def default(obj):
+            encoded.append(obj)
+            return obj.value
+
+        chunks = encoder.iterencode([Thing(1), Thing(2)], default=default,
+                                    chunk_size=1)
+
+        assert next(chunks) == b'[1'
+        assert len(encoded) == 1
+
+    @pytest.fixture
+    def ujson(self, patch):
+        ujson = patch('h.renderers.ujson')
+        ujson.dumps.return_value = '{"fast":true}'
+        return ujson
+
+
+class TestJSON(object):
+    def test_it_sets_the_content_type(self, pyramid_request, stream):
+        renderer = renderers.JSON(renderers.JSONEncoder(), stream=stream)(None)
+
+        renderer({}, {'request': pyramid_request})
+
+        assert pyramid_request.response.content_type == 'application/json'
+
+    def test_it_renders_json(self, pyramid_request):
+        renderer = renderers.JSON(renderers.JSONEncoder(fast=False))(None)
+
+        result = renderer({'a': 1}, {'request': pyramid_request})
+
+        assert result == '{"a":1}'
+
+    def test_it_streams_json(self, pyramid_request):
+        renderer = renderers.JSON(renderers.JSONEncoder(fast=False),
+                                  stream=True)(None)
+
+        result = renderer({'rows': [1, 2]}, {'request': pyramid_request})
+
+        assert not isinstance(result, (bytes, list))
+        assert b''.join(result) == b'{"rows":[1,2]}'
+
+    def test_it_supports_json_methods(self, pyramid_request, stream):
+        renderer = renderers.JSON(renderers.JSONEncoder(fast=False),
+                                  stream=stream)(None)
+
+        result = renderer([JSONThing()], {'request': pyramid_request})
+
+        if stream:
+            result = b''.join(result)
+        assert result == b'["json thing"]'
+
+    def test_it_supports_adapters(self, pyramid_request, stream):
+        factory = renderers.JSON(renderers.JSONEncoder(fast=False),
+                                 stream=stream)
+        factory.add_adapter(Thing, lambda obj, request: obj.value)
+        renderer = factory(None)
+
+        result = renderer([Thing(3)], {'request': pyramid_request})
+
+        if stream:
+            result = b''.join(result)
+        assert result == b'[3]'
+
+    @pytest.fixture(params=[False, True])
+    def stream(self, request):
+        return request.param
+
+
+class TestGetEncoder(object):
+    def test_it_returns_the_registry_encoder(self, pyramid_config):
+        pyramid_config.include('h.renderers')
+        registry = pyramid_config.registry
+
+        assert renderers.get_encoder(registry) is registry.json_encoder
+
+    def test_it_returns_a_default_encoder(self):
+        registry = mock.Mock(spec_set=[])
+
+        assert isinstance(renderers.get_encoder(registry),
+                          renderers.JSONEncoder)
+
+
+class TestIncludeMe(object):
+    def test_it_registers_the_encoder(self, pyramid_config):
+        pyramid_config.include('h.renderers')
+
+        assert isinstance(pyramid_config.registry.json_encoder,
+                          renderers.JSONEncoder)
+
+    def test_it_disables_ujson_when_configured(self, pyramid_config, patch):
+        patch('h.renderers.ujson')
+        pyramid_config.registry.settings['h.json.fast'] = 'false'
+
+        pyramid_config.include('h.renderers')
+
+        assert not pyramid_config.registry.json_encoder.fast
+
+
+class Thing(object):
+    def __init__(self, value=None):
+        self.value = value
+
+
+class JSONThing(object):
+    def __json__(self, request):
+        return 'json thing'
@@ -66,8 +66,10 @@ def test_includeme():
              '/api/annotations/{id:[A-Za-z0-9_-]{20,22}}.jsonld',
              factory='memex.resources:AnnotationResourceFactory',
              traverse='/{id}'),
+        call('api.bulk', '/api/bulk'),
         call('api.profile', '/api/profile'),
         call('api.debug_token', '/api/debug-token'),
+        call('api.export', '/api/export'),
         call('api.flags', '/api/flags', factory='memex.resources:AnnotationResourceFactory'),
         call('api.search', '/api/search'),
         call('api.users', '/api/users'),
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import mock
+import pytest
+import sqlalchemy as sa
+
+from memex.models import Annotation
+
+from h.services.annotation_cache import AnnotationCacheService
+from h.services.annotation_cache import NullBackend
+from h.services.annotation_cache import annotation_cache_factory
+
+
+class TestAnnotationCacheService(object):
+    def test_fetch_returns_annotations_by_id(self, svc, db_session, factories):
+        annotations = [factories.Annotation() for _ in range(3)]
+
+        result = svc.fetch(db_session, [a.id for a in annotations])
+
+        assert result == {a.id: a for a in annotations}
+
+    def test_fetch_omits_missing_annotations(self, svc, db_session, factories):
+        annotation = factories.Annotation()
+
+        result = svc.fetch(db_session, [annotation.id,
+                                        'qvJnIGuSEeaOGU_gJ2M7vA'])
+
+        assert result.keys() == [annotation.id]
+
+    def test_fetch_passes_the_query_to_the_query_processor(self, svc, db_session, factories):
+        annotation = factories.Annotation(userid='luke')
+        query_processor = mock.Mock(side_effect=lambda query: query.filter(
+            Annotation.userid == 'maria'))
+
+        result = svc.fetch(db_session, [annotation.id],
+                           query_processor=query_processor)
+
+        assert query_processor.called
+        assert result == {}
+
+    def test_fetch_does_not_query_cached_annotations(self, svc, db_session, factories):
+        annotation = factories.Annotation()
+        svc.fetch(db_session, [annotation.id])
+        db_session.expunge_all()
+
+        with mock.patch.object(db_session, 'query',
+                               wraps=db_session.query) as query:
+            result = svc.fetch(db_session, [annotation.id])
+
+        assert mock.call(Annotation) not in query.call_args_list
+        assert result[annotation.id].id == annotation.id
+
+    def test_fetch_restores_clean_persistent_annotations(self, svc, db_session, factories):
+        annotation = factories.Annotation(extra={'foo': 'bar'})
+        svc.fetch(db_session, [annotation.id])
+        db_session.expunge_all()
+
+        restored = svc.fetch(db_session, [annotation.id])[annotation.id]
+
+        state = sa.inspect(restored)
+        assert state.persistent
+        assert restored not in db_session.dirty
+        assert restored.text == annotation.text
+        assert restored.target_selectors == annotation.target_selectors
+        assert restored.extra == {'foo': 'bar'}
+
+    def test_fetch_tracks_changes_to_restored_annotations(self, svc, db_session, factories):
+        annotation = factories.Annotation(extra={'foo': 'bar'})
+        svc.fetch(db_session, [annotation.id])
+        db_session.expunge_all()
+        restored = svc.fetch(db_session, [annotation.id])[annotation.id]
+
+        restored.extra['foo'] = 'baz'
+
+        assert restored in db_session.dirty
+
+    def test_fetch_does_not_share_values_between_sessions(self, svc, db_session, factories):
+        annotation = factories.Annotation(extra={'foo': 'bar'})
+        svc.fetch(db_session, [annotation.id])
+        db_session.expunge_all()
+        restored = svc.fetch(db_session, [annotation.id])[annotation.id]
+        restored.extra['foo'] = 'baz'
+        db_session.expunge_all()
+
+        restored = svc.fetch(db_session, [annotation.id])[annotation.id]
+
+        assert restored.extra == {'foo': 'bar'}
+
+    def test_fetch_loads_the_documents_of_restored_annotations(self, svc, db_session, factories):
+        annotation = factories.Annotation()
+        document_id = annotation.document.id
+        svc.fetch(db_session, [annotation.id])
+        db_session.expunge_all()
+
+        restored = svc.fetch(db_session, [annotation.id])[annotation.id]
+
+        assert restored.document.id == document_id
+
+    def test_fetch_reuses_annotations_already_in_the_session(self, svc, db_session, factories):
+        annotation = factories.Annotation()
+        svc.fetch(db_session, [annotation.id])
+
+        result = svc.fetch(db_session, [annotation.id])
+
+        assert result[annotation.id] is annotation
+
+    def test_invalidate_removes_the_annotation(self, svc, db_session, factories):
+        annotation = factories.Annotation()
+        svc.fetch(db_session, [annotation.id])
+
+        svc.invalidate(annotation.id)
+
+        assert annotation.id not in svc._entries
+
+    def test_fetch_discards_annotations_loaded_before_an_invalidation(self, svc, db_session, factories):
+        annotation = factories.Annotation()
+        query_processor = mock.Mock(side_effect=lambda query: (
+            svc.invalidate(annotation.id) or query))
+
+        svc.fetch(db_session, [annotation.id], query_processor=query_processor)
+
+        assert annotation.id not in svc._entries
+
+    def test_fetch_reloads_expired_annotations(self, svc, clock, db_session, factories):
+        annotation = factories.Annotation()
+        svc.fetch(db_session, [annotation.id])
+        db_session.expunge_all()
+        clock.return_value += 61
+
+        with mock.patch.object(db_session, 'query',
+                               wraps=db_session.query) as query:
+            svc.fetch(db_session, [annotation.id])
+
+        assert mock.call(Annotation) in query.call_args_list
+
+    def test_fetch_evicts_the_least_recently_used_annotation_when_full(self, clock, db_session, factories):
+        svc = AnnotationCacheService(ttl=60, max_entries=2, clock=clock)
+        one, two, three = [factories.Annotation() for _ in range(3)]
+        svc.fetch(db_session, [one.id])
+        svc.fetch(db_session, [two.id])
+        svc.fetch(db_session, [one.id])
+
+        svc.fetch(db_session, [three.id])
+
+        assert set(svc._entries.keys()) == set([one.id, three.id])
+
+    def test_fetch_stores_loaded_annotations_in_the_backend(self, svc, backend, db_session, factories):
+        annotation = factories.Annotation()
+
+        svc.fetch(db_session, [annotation.id])
+
+        snapshots, ttl = backend.set_many.call_args[0]
+        assert snapshots.keys() == [annotation.id]
+        assert snapshots[annotation.id]['updated'] == annotation.updated
+        assert ttl == 60
+
+    def test_fetch_reads_annotations_from_the_backend(self, svc, backend, db_session, factories):
+        annotation = factories.Annotation()
+        other = AnnotationCacheService(ttl=60)
+        other.fetch(db_session, [annotation.id])
+        snapshot = other._entries[annotation.id][1]
+        backend.get_many.return_value = {annotation.id: snapshot}
+        db_session.expunge_all()
+
+        result = svc.fetch(db_session, [annotation.id])
+
+        backend.get_many.assert_called_once_with([annotation.id])
+        assert result[annotation.id].text == annotation.text
+        assert annotation.id in svc._entries
+
+    def test_invalidate_deletes_the_annotation_from_the_backend(self, svc, backend):
+        svc.invalidate('qvJnIGuSEeaOGU_gJ2M7vA')
+
+        backend.delete.assert_called_once_with('qvJnIGuSEeaOGU_gJ2M7vA')
+
+    @pytest.fixture
+    def backend(self):
+        backend = mock.Mock(spec_set=['get_many', 'set_many', 'delete'])
+        backend.get_many.return_value = {}
+        return backend
+
+    @pytest.fixture
+    def clock(self):
+        return mock.Mock(spec_set=[], return_value=1000.0)
+
+    @pytest.fixture
+    def svc(self, backend, clock):
+        return AnnotationCacheService(ttl=60, backend=backend, clock=clock)
+
+
+@pytest.mark.usefixtures('pyramid_config')
+class TestAnnotationCacheFactory(object):
+    def test_returns_none_when_disabled(self, pyramid_request):
+        assert annotation_cache_factory(None, pyramid_request) is None
+
+    def test_returns_the_same_instance_for_every_request(self, pyramid_request):
+        pyramid_request.registry.settings['h.annotation_cache'] = 'true'
+
+        svc = annotation_cache_factory(None, pyramid_request)
+
+        assert isinstance(svc, AnnotationCacheService)
+        assert annotation_cache_factory(None, pyramid_request) is svc
+
+    def test_reads_settings(self, pyramid_request):
+        pyramid_request.registry.settings.update({
+            'h.annotation_cache': 'true',
+            'h.annotation_cache.ttl': '10',
+            'h.annotation_cache.max_entries': '100',
+        })
+
+        svc = annotation_cache_factory(None, pyramid_request)
+
+        assert svc.ttl == 10
+        assert svc.max_entries == 100
+        assert isinstance(svc.backend, NullBackend)
+
+    def test_resolves_the_backend(self, pyramid_request, patch):
+        backend_factory = patch('h.services.annotation_cache.NullBackend')
+        pyramid_request.registry.settings.update({
+            'h.annotation_cache': 'true',
+            'h.annotation_cache.backend': 'h.services.annotation_cache.NullBackend',
+        })
+
+        svc = annotation_cache_factory(None, pyramid_request)
+
+        backend_factory.assert_called_once_with(pyramid_request.registry.settings)
+        assert svc.backend == backend_factory.return_value
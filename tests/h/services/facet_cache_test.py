@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import mock
+import pytest
+
+from h.services.facet_cache import FacetCacheService
+from h.services.facet_cache import facet_cache_factory
+
+
+class TestFacetCacheService(object):
+    def test_get_returns_none_for_unknown_keys(self, svc):
+        assert svc.get('abc123', 'query') == (None, 0)
+
+    def test_get_returns_stored_facets(self, svc):
+        store(svc, 'abc123', 'query', mock.sentinel.facets)
+
+        assert svc.get('abc123', 'query')[0] == mock.sentinel.facets
+
+    def test_get_returns_none_after_ttl_expires(self, svc, clock):
+        store(svc, 'abc123', 'query', mock.sentinel.facets)
+        clock.return_value += 61
+
+        assert svc.get('abc123', 'query')[0] is None
+
+    def test_get_does_not_track_generations_of_groups_it_reads(self, svc):
+        svc.get('abc123', 'query')
+
+        assert 'abc123' not in svc._generations
+
+    def test_invalidate_expires_the_groups_entries(self, svc):
+        store(svc, 'abc123', 'query', mock.sentinel.facets)
+
+        svc.invalidate('abc123')
+
+        assert svc.get('abc123', 'query')[0] is None
+
+    def test_invalidate_does_not_expire_other_groups_entries(self, svc):
+        store(svc, 'def456', 'query', mock.sentinel.facets)
+
+        svc.invalidate('abc123')
+
+        assert svc.get('def456', 'query')[0] == mock.sentinel.facets
+
+    def test_invalidate_expires_ungrouped_entries(self, svc):
+        store(svc, None, 'query', mock.sentinel.facets)
+
+        svc.invalidate('abc123')
+
+        assert svc.get(None, 'query')[0] is None
+
+    def test_set_discards_facets_computed_before_an_invalidation(self, svc):
+        _, generation = svc.get('abc123', 'query')
+        svc.invalidate('abc123')
+
+        svc.set('abc123', 'query', mock.sentinel.stale, generation)
+
+        assert svc.get('abc123', 'query')[0] is None
+
+    def test_set_stores_facets_computed_after_an_invalidation(self, svc):
+        svc.invalidate('abc123')
+
+        store(svc, 'abc123', 'query', mock.sentinel.facets)
+
+        assert svc.get('abc123', 'query')[0] == mock.sentinel.facets
+
+    def test_set_evicts_the_oldest_entry_when_full(self, clock):
+        svc = FacetCacheService(ttl=60, max_entries=2, clock=clock)
+
+        store(svc, 'abc123', 'one', mock.sentinel.one)
+        store(svc, 'abc123', 'two', mock.sentinel.two)
+        store(svc, 'abc123', 'three', mock.sentinel.three)
+
+        assert svc.get('abc123', 'one')[0] is None
+        assert svc.get('abc123', 'two')[0] == mock.sentinel.two
+        assert svc.get('abc123', 'three')[0] == mock.sentinel.three
+
+    def test_invalidate_bounds_the_number_of_generations(self, clock):
+        svc = FacetCacheService(ttl=60, max_entries=2, clock=clock)
+
+        for group in ['one', 'two', 'three', 'four']:
+            svc.invalidate(group)
+
+        assert len(svc._generations) <= 2
+
+    def test_forgotten_generations_never_validate_old_entries(self, clock):
+        svc = FacetCacheService(ttl=60, max_entries=2, clock=clock)
+        svc.invalidate('abc123')
+        store(svc, 'abc123', 'query', mock.sentinel.facets)
+
+        svc.invalidate('def456')
+        svc.invalidate('ghi789')
+        _, generation = svc.get('abc123', 'query')
+
+        assert svc.get('abc123', 'query')[0] is None
+        assert generation == 0
+
+    @pytest.fixture
+    def clock(self):
+        return mock.Mock(spec_set=[], return_value=1000.0)
+
+    @pytest.fixture
+    def svc(self, clock):
+        return FacetCacheService(ttl=60, clock=clock)
+
+
+@pytest.mark.usefixtures('pyramid_config')
+class TestFacetCacheFactory(object):
+    def test_returns_facet_cache_service(self, pyramid_request):
+        svc = facet_cache_factory(None, pyramid_request)
+
+        assert isinstance(svc, FacetCacheService)
+
+    def test_returns_the_same_instance_for_every_request(self, pyramid_request):
+        svc = facet_cache_factory(None, pyramid_request)
+
+        assert facet_cache_factory(None, pyramid_request) is svc
+
+    def test_reads_ttl_from_settings(self, pyramid_request):
+        pyramid_request.registry.settings['h.facet_cache.ttl'] = '10'
+
+        svc = facet_cache_factory(None, pyramid_request)
+
+        assert svc.ttl == 10
+
+
+def store(svc, group, query_key, facets):
+    _, generation = svc.get(group, query_key)
+    svc.set(group, query_key, facets, generation)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import mock
+import pytest
+
+from h.services.http_cache import HTTPCacheService
+from h.services.http_cache import group_key
+from h.services.http_cache import http_cache_factory
+from h.services.http_cache import uri_key
+
+
+class TestHTTPCacheService(object):
+    def test_cache_if_anonymous_sets_cache_control(self, svc, pyramid_request):
+        svc.cache_if_anonymous(pyramid_request, uris=['http://example.com'])
+
+        cache_control = pyramid_request.response.cache_control
+        assert cache_control.public
+        assert cache_control.max_age == 0
+        assert cache_control.s_maxage == 30
+
+    def test_cache_if_anonymous_varies_on_credentials(self, svc, pyramid_request):
+        svc.cache_if_anonymous(pyramid_request, uris=['http://example.com'])
+
+        assert pyramid_request.response.vary == ('Authorization', 'Cookie')
+
+    def test_cache_if_anonymous_tags_response_with_uris_and_groups(self, svc, pyramid_request):
+        svc.cache_if_anonymous(pyramid_request,
+                               uris=['http://example.com/'],
+                               groupids=['abc123'])
+
+        keys = pyramid_request.response.headers['Surrogate-Key'].split(' ')
+        assert keys == [uri_key('httpx://example.com'), group_key('abc123')]
+
+    def test_cache_if_anonymous_tags_response_with_equivalent_uris(self, svc, pyramid_request, factories):
+        document = factories.Document()
+        factories.DocumentURI(document=document,
+                              claimant='http://example.com/a',
+                              uri='http://example.com/a',
+                              type='self-claim')
+        factories.DocumentURI(document=document,
+                              claimant='http://example.com/a',
+                              uri='http://example.com/b',
+                              type='rel-alternate')
+
+        svc.cache_if_anonymous(pyramid_request, uris=['http://example.com/a'])
+
+        keys = pyramid_request.response.headers['Surrogate-Key'].split(' ')
+        assert sorted(keys) == sorted([uri_key('httpx://example.com/a'),
+                                       uri_key('httpx://example.com/b')])
+
+    def test_cache_if_anonymous_does_nothing_for_authenticated_requests(self, svc, pyramid_config, pyramid_request):
+        pyramid_config.testing_securitypolicy('acct:jane@example.com')
+
+        svc.cache_if_anonymous(pyramid_request, uris=['http://example.com'])
+
+        assert 'Cache-Control' not in pyramid_request.response.headers
+        assert 'Surrogate-Key' not in pyramid_request.response.headers
+
+    def test_cache_if_anonymous_does_nothing_if_ttl_is_zero(self, svc, pyramid_request):
+        svc.ttl = 0
+
+        svc.cache_if_anonymous(pyramid_request, uris=['http://example.com'])
+
+        assert 'Cache-Control' not in pyramid_request.response.headers
+        assert 'Surrogate-Key' not in pyramid_request.response.headers
+
+    def test_purge_purges_annotations_uris_and_groups(self, svc, purge_keys):
+        annotations = [
+            annotation('httpx://example.com/a', '__world__'),
+            annotation('httpx://example.com/a', 'abc123'),
+            annotation('httpx://example.com/b', 'abc123'),
+        ]
+
+        svc.purge(annotations)
+
+        purge_keys.assert_called_once_with(sorted([
+            uri_key('httpx://example.com/a'),
+            uri_key('httpx://example.com/b'),
+            group_key('__world__'),
+            group_key('abc123'),
+        ]))
+
+    def test_purge_does_nothing_without_a_purge_url(self, svc, purge_keys):
+        svc.purge_url = None
+
+        svc.purge([annotation('httpx://example.com', '__world__')])
+
+        assert not purge_keys.called
+
+    def test_purge_does_nothing_without_annotations(self, svc, purge_keys):
+        svc.purge([])
+
+        assert not purge_keys.called
+
+    @pytest.fixture
+    def purge_keys(self):
+        return mock.Mock(spec_set=[])
+
+    @pytest.fixture
+    def svc(self, db_session, purge_keys):
+        return HTTPCacheService(db_session,
+                                ttl=30,
+                                purge_url='http://localhost/purge',
+                                purge_keys=purge_keys)
+
+
+class TestHTTPCacheFactory(object):
+    def test_it_returns_an_http_cache_service(self, pyramid_request):
+        svc = http_cache_factory(None, pyramid_request)
+
+        assert isinstance(svc, HTTPCacheService)
+        assert svc.session == pyramid_request.db
+
+    def test_it_is_disabled_by_default(self, pyramid_request):
+        svc = http_cache_factory(None, pyramid_request)
+
+        assert svc.ttl == 0
+        assert svc.purge_url is None
+
+    def test_it_reads_the_settings(self, pyramid_request):
+        pyramid_request.registry.settings.update({
+            'h.http_cache.ttl': '60',
+            'h.http_cache.purge_url': 'http://localhost/purge',
+        })
+
+        svc = http_cache_factory(None, pyramid_request)
+
+        assert svc.ttl == 60
+        assert svc.purge_url == 'http://localhost/purge'
+
+
+def annotation(target_uri_normalized, groupid):
+    return mock.Mock(target_uri_normalized=target_uri_normalized,
+                     groupid=groupid)
@@ -2,10 +2,16 @@
 
 from __future__ import unicode_literals
 
+import mock
 import pytest
 
+from h.models import User
+from h.services.nipsa import FlaggedUseridsCache
 from h.services.nipsa import NipsaService
+from h.services.nipsa import SETTING_VERSION
+from h.services.nipsa import flagged_userids_cache
 from h.services.nipsa import nipsa_factory
+from h.services.settings import SettingsService
 
 
 @pytest.mark.usefixtures('users', 'add_nipsa', 'remove_nipsa')
@@ -56,6 +62,22 @@ class TestNipsaService(object):
 
         remove_nipsa.delay.assert_called_once_with('acct:renata@example.com')
 
+    def test_flag_does_not_trigger_job_with_query_time_filtering(self, db_session, users, add_nipsa):
+        svc = NipsaService(db_session, query_time=True)
+
+        svc.flag(users['dominic'])
+
+        assert users['dominic'].nipsa is True
+        assert not add_nipsa.delay.called
+
+    def test_unflag_does_not_trigger_job_with_query_time_filtering(self, db_session, users, remove_nipsa):
+        svc = NipsaService(db_session, query_time=True)
+
+        svc.unflag(users['renata'])
+
+        assert users['renata'].nipsa is False
+        assert not remove_nipsa.delay.called
+
     def test_clear_resets_cache(self, db_session, users):
         svc = NipsaService(db_session)
 
@@ -70,11 +92,160 @@ class TestNipsaService(object):
                                            'acct:dominic@example.com'])
 
 
-def test_nipsa_factory(pyramid_request):
+@pytest.mark.usefixtures('users', 'add_nipsa', 'remove_nipsa')
+class TestNipsaServiceWithCache(object):
+    def test_it_shares_flagged_userids_between_instances(self, db_session, cache, settings_service):
+        NipsaService(db_session, settings=settings_service, cache=cache).flagged_userids
+        db_session.query = mock.Mock(wraps=db_session.query)
+
+        svc = NipsaService(db_session, settings=settings_service, cache=cache)
+
+        assert svc.flagged_userids == set(['acct:renata@example.com',
+                                           'acct:cecilia@example.com'])
+        assert mock.call(User) not in db_session.query.call_args_list
+
+    def test_it_reloads_when_the_version_changes(self, db_session, users, cache, settings_service):
+        svc = NipsaService(db_session, settings=settings_service, cache=cache)
+        svc.flagged_userids
+
+        # Flag a user in another process...
+        users['dominic'].nipsa = True
+        settings_service.put(SETTING_VERSION, 'new-version')
+        svc.clear()
+
+        assert 'acct:dominic@example.com' in svc.flagged_userids
+
+    def test_clear_does_not_reload_if_the_version_is_unchanged(self, db_session, users, cache, settings_service):
+        svc = NipsaService(db_session, settings=settings_service, cache=cache)
+        svc.flagged_userids
+
+        users['dominic'].nipsa = True
+        svc.clear()
+
+        assert 'acct:dominic@example.com' not in svc.flagged_userids
+
+    def test_flag_updates_the_version(self, db_session, users, cache, settings_service):
+        svc = NipsaService(db_session, settings=settings_service, cache=cache)
+        settings_service.put(SETTING_VERSION, 'old-version')
+
+        svc.flag(users['dominic'])
+
+        assert settings_service.get(SETTING_VERSION) != 'old-version'
+
+    @pytest.mark.parametrize('method,user', [
+        ('flag', 'dominic'),
+        ('unflag', 'renata'),
+    ])
+    def test_flag_and_unflag_refresh_the_cache(self, db_session, users, cache, settings_service, method, user):
+        svc = NipsaService(db_session, settings=settings_service, cache=cache)
+        svc.flagged_userids
+
+        getattr(svc, method)(users[user])
+
+        assert svc.is_flagged(users[user].userid) is (method == 'flag')
+
+    @pytest.mark.parametrize('method,user', [
+        ('flag', 'dominic'),
+        ('unflag', 'renata'),
+    ])
+    def test_flag_and_unflag_publish_the_change(self, db_session, users, method, user):
+        publish = mock.Mock(spec_set=[])
+        svc = NipsaService(db_session, publish=publish)
+
+        getattr(svc, method)(users[user])
+
+        publish.assert_called_once_with(users[user].userid)
+
+    @pytest.fixture
+    def cache(self):
+        return FlaggedUseridsCache()
+
+    @pytest.fixture
+    def settings_service(self, db_session):
+        return SettingsService(db_session)
+
+
+class TestFlaggedUseridsCache(object):
+    def test_it_caches_the_loaded_userids(self):
+        cache = FlaggedUseridsCache()
+        load = mock.Mock(return_value=set(['acct:renata@example.com']))
+
+        cache.get('v1', load)
+        result = cache.get('v1', load)
+
+        assert result == set(['acct:renata@example.com'])
+        assert load.call_count == 1
+
+    def test_it_reloads_when_the_version_changes(self):
+        cache = FlaggedUseridsCache()
+        load = mock.Mock(side_effect=[set(), set(['acct:renata@example.com'])])
+
+        cache.get('v1', load)
+
+        assert cache.get('v2', load) == set(['acct:renata@example.com'])
+
+    def test_it_reloads_when_invalidated(self):
+        cache = FlaggedUseridsCache()
+        load = mock.Mock(side_effect=[set(), set(['acct:renata@example.com'])])
+
+        cache.get(None, load)
+        cache.invalidate()
+
+        assert cache.get(None, load) == set(['acct:renata@example.com'])
+
+    def test_it_reloads_when_expired(self):
+        clock = mock.Mock(return_value=100)
+        cache = FlaggedUseridsCache(ttl=60, clock=clock)
+        load = mock.Mock(side_effect=[set(), set(['acct:renata@example.com'])])
+
+        cache.get(None, load)
+        clock.return_value = 160
+
+        assert cache.get(None, load) == set(['acct:renata@example.com'])
+
+
+def test_nipsa_factory(pyramid_request, settings_service):
     svc = nipsa_factory(None, pyramid_request)
 
     assert isinstance(svc, NipsaService)
     assert svc.session == pyramid_request.db
+    assert svc.query_time is False
+    assert svc.cache is flagged_userids_cache
+    assert svc.settings == settings_service
+
+
+@pytest.mark.usefixtures('settings_service')
+def test_nipsa_factory_publishes_changes_after_commit(pyramid_request):
+    pyramid_request.realtime = mock.Mock(spec_set=['publish_user'])
+    pyramid_request.tm = mock.Mock(spec_set=['get'])
+    svc = nipsa_factory(None, pyramid_request)
+
+    svc.publish('acct:renata@example.com')
+
+    hook = pyramid_request.tm.get.return_value.addAfterCommitHook
+    assert not pyramid_request.realtime.publish_user.called
+    publish = hook.call_args[0][0]
+    publish(True)
+    pyramid_request.realtime.publish_user.assert_called_once_with({
+        'type': 'nipsa-changed',
+        'userid': 'acct:renata@example.com',
+    })
+
+
+@pytest.mark.usefixtures('settings_service')
+def test_nipsa_factory_enables_query_time_filtering(pyramid_request):
+    pyramid_request.registry.settings['h.nipsa.query_time'] = 'true'
+
+    svc = nipsa_factory(None, pyramid_request)
+
+    assert svc.query_time is True
+
+
+@pytest.fixture
+def settings_service(pyramid_config):
+    service = mock.Mock(spec_set=['get', 'put'])
+    pyramid_config.register_service(service, name='settings')
+    return service
 
 
 @pytest.fixture
@@ -10,8 +10,10 @@ import mock
 from memex import schemas
 from memex.models.annotation import Annotation
 from memex.models.document import Document, DocumentURI
+from memex.models.document import update_document_metadata
 
 from h import storage
+from h.services.annotation_cache import AnnotationCacheService
 
 
 class FakeGroup(object):
@@ -30,6 +32,18 @@ class TestFetchAnnotation(object):
     def test_it_does_not_crash_if_id_is_invalid(self, db_session):
         assert storage.fetch_annotation(db_session, 'foo') is None
 
+    def test_it_fetches_the_annotation_through_the_cache(self, db_session, factories):
+        annotation = factories.Annotation()
+        cache = AnnotationCacheService()
+
+        assert storage.fetch_annotation(db_session, annotation.id, cache=cache) == annotation
+        assert cache._entries.keys() == [annotation.id]
+
+    def test_it_does_not_crash_if_id_is_invalid_with_a_cache(self, db_session):
+        cache = AnnotationCacheService()
+
+        assert storage.fetch_annotation(db_session, 'foo', cache=cache) is None
+
 
 class TestFetchOrderedAnnotations(object):
 
@@ -53,6 +67,41 @@ class TestFetchOrderedAnnotations(object):
                                                             [ann_2.id, ann_1.id],
                                                             query_processor=only_maria)
 
+    def test_it_fetches_annotations_through_the_cache(self, db_session, factories):
+        ann_1 = factories.Annotation()
+        ann_2 = factories.Annotation()
+        cache = AnnotationCacheService()
+        storage.fetch_ordered_annotations(db_session, [ann_1.id], cache=cache)
+
+        result = storage.fetch_ordered_annotations(db_session,
+                                                   [ann_2.id, ann_1.id],
+                                                   cache=cache)
+
+        assert result == [ann_2, ann_1]
+        assert set(cache._entries.keys()) == set([ann_1.id, ann_2.id])
+
+
+class TestFetchAnnotationsById(object):
+
+    def test_it_returns_annotations_by_id(self, db_session, factories):
+        annotations = [factories.Annotation() for _ in range(3)]
+
+        result = storage.fetch_annotations_by_id(db_session,
+                                                 [a.id for a in annotations])
+
+        assert result == {a.id: a for a in annotations}
+
+    def test_it_ignores_invalid_ids(self, db_session, factories):
+        annotation = factories.Annotation()
+
+        result = storage.fetch_annotations_by_id(db_session,
+                                                 [annotation.id, 'foo'])
+
+        assert result == {annotation.id: annotation}
+
+    def test_it_returns_an_empty_dict_for_no_ids(self, db_session):
+        assert storage.fetch_annotations_by_id(db_session, []) == {}
+
 
 class TestExpandURI(object):
 
@@ -288,6 +337,125 @@ class TestCreateAnnotation(object):
         }
 
 
+class TestCreateAnnotations(object):
+
+    def test_it_creates_the_annotations_in_order(self, pyramid_request, group_service):
+        annotations = storage.create_annotations(pyramid_request, [
+            annotation_data(text='first'),
+            annotation_data(text='second'),
+        ], group_service)
+
+        assert [a.text for a in annotations] == ['first', 'second']
+        assert all(a.id for a in annotations)
+        assert annotations[0].created == annotations[1].created
+
+    def test_it_updates_document_metadata_once_per_target_uri(self, pyramid_request, group_service):
+        first = annotation_data(document_uri='http://example.com/first')
+        second = annotation_data(document_uri='http://example.com/second')
+        other = annotation_data(target_uri='http://example.org/')
+
+        with mock.patch('h.storage.models.update_document_metadata',
+                        wraps=update_document_metadata) as update_metadata:
+            annotations = storage.create_annotations(pyramid_request,
+                                                     [first, second, other],
+                                                     group_service)
+
+        assert update_metadata.call_count == 2
+        calls = {c[0][1]: c[0][3] for c in update_metadata.call_args_list}
+        assert [d['uri'] for d in calls['http://www.example.com/example.html']] == [
+            'http://example.com/first', 'http://example.com/second']
+        assert annotations[0].document == annotations[1].document
+
+    def test_it_shares_documents_between_annotations(self, pyramid_request, group_service):
+        annotations = storage.create_annotations(pyramid_request, [
+            annotation_data(document_uri='http://example.com/first'),
+            annotation_data(document_uri='http://example.com/second'),
+        ], group_service)
+
+        document = annotations[0].document
+        assert annotations[1].document == document
+        assert set(u.uri for u in document.document_uris) == set([
+            'http://www.example.com/example.html',
+            'http://example.com/first',
+            'http://example.com/second',
+        ])
+
+    def test_it_finds_each_group_once(self, pyramid_request, group_service):
+        storage.create_annotations(pyramid_request,
+                                   [annotation_data(), annotation_data()],
+                                   group_service)
+
+        group_service.find.assert_called_once_with('__world__')
+
+    def test_it_raises_if_the_user_may_not_write_to_a_group(self, pyramid_request, group_service):
+        group_service.find.side_effect = lambda groupid: (
+            None if groupid == 'private' else FakeGroup())
+
+        with pytest.raises(schemas.ValidationError) as exc:
+            storage.create_annotations(pyramid_request, [
+                annotation_data(),
+                annotation_data(groupid='private'),
+            ], group_service)
+
+        assert exc.value.message.startswith('1.group: ')
+
+    def test_it_sets_group_for_replies(self, factories, pyramid_request, group_service):
+        parent = factories.Annotation(groupid='test-group')
+        data = annotation_data(references=[parent.id])
+
+        annotations = storage.create_annotations(pyramid_request, [data],
+                                                 group_service)
+
+        assert annotations[0].groupid == 'test-group'
+
+    def test_it_raises_if_a_parent_annotation_does_not_exist(self, pyramid_request, group_service):
+        data = annotation_data(references=['missing_parent_id'])
+
+        with pytest.raises(schemas.ValidationError) as exc:
+            storage.create_annotations(pyramid_request,
+                                       [annotation_data(), data],
+                                       group_service)
+
+        assert exc.value.message.startswith('1.references.0: ')
+
+    @pytest.fixture
+    def group_service(self, pyramid_config):
+        group_service = mock.Mock(spec_set=['find'])
+        group_service.find.return_value = FakeGroup()
+        return group_service
+
+    @pytest.fixture
+    def pyramid_request(self, db_session, pyramid_request):
+        pyramid_request.db = db_session
+        return pyramid_request
+
+
+def annotation_data(document_uri=None, **kwargs):
+    data = {
+        'userid': 'acct:test@localhost',
+        'text': 'text',
+        'tags': [],
+        'shared': True,
+        'target_uri': 'http://www.example.com/example.html',
+        'groupid': '__world__',
+        'references': [],
+        'target_selectors': [],
+        'document': {
+            'document_uri_dicts': [],
+            'document_meta_dicts': [],
+        },
+    }
+    if document_uri:
+        data['document']['document_uri_dicts'].append({
+            'uri': document_uri,
+            'claimant': document_uri,
+            'type': 'self-claim',
+            'content_type': '',
+        })
+    data.update(kwargs)
+    return data
+
+
 @pytest.mark.usefixtures('models')
 class TestUpdateAnnotation(object):
 
@@ -446,6 +446,17 @@ class TestHandleUserEvent(object):
             'model': session_model,
         }
 
+    def test_nipsa_change_invalidates_flagged_userids_cache(self, patch):
+        cache = patch('h.streamer.messages.flagged_userids_cache')
+        message = {'type': 'nipsa-changed', 'userid': 'amy'}
+        socket = FakeSocket('clientid')
+        socket.authenticated_userid = 'amy'
+
+        messages.handle_user_event(message, [socket], None, None)
+
+        cache.invalidate.assert_called_once_with()
+        assert socket.send_json_payloads == []
+
     def test_no_send_when_socket_is_not_event_users(self):
         """Don't send session-change events if the event user is not the socket user."""
         message = {
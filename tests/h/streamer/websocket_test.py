@@ -147,7 +147,7 @@ class TestWebSocket(object):
 
         client.send_json(payload)
 
-        fake_socket_send.assert_called_once_with(client, '{"foo": "bar"}')
+        fake_socket_send.assert_called_once_with(client, '{"foo":"bar"}')
 
     def test_socket_send_json_skips_when_terminated(self,
                                                     client,
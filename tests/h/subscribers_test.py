@@ -5,6 +5,7 @@ import mock
 import pytest
 
 from h import subscribers
+from memex.events import AnnotationBatchEvent
 from memex.events import AnnotationEvent
 
 
@@ -84,6 +85,20 @@ class TestPublishAnnotationEvent:
             'src_client_id': 'client_id'
         })
 
+    def test_it_publishes_each_event_of_a_batch(self, pyramid_request):
+        pyramid_request.realtime = mock.Mock()
+        batch = AnnotationBatchEvent(pyramid_request, [
+            AnnotationEvent(pyramid_request, 'id-1', 'create'),
+            AnnotationEvent(pyramid_request, 'id-2', 'delete'),
+        ])
+
+        subscribers.publish_annotation_event(batch)
+
+        assert pyramid_request.realtime.publish_annotation.call_args_list == [
+            mock.call({'action': 'create', 'annotation_id': 'id-1', 'src_client_id': None}),
+            mock.call({'action': 'delete', 'annotation_id': 'id-2', 'src_client_id': None}),
+        ]
+
     @pytest.fixture
     def event(self, pyramid_request):
         pyramid_request.realtime = mock.Mock()
@@ -93,6 +108,109 @@ class TestPublishAnnotationEvent:
         return event
 
 
+class TestInvalidateAnnotationCache(object):
+
+    def test_it_invalidates_the_annotation(self, pyramid_config, pyramid_request):
+        annotation_cache = mock.Mock(spec_set=['invalidate'])
+        pyramid_config.register_service(annotation_cache, name='annotation_cache')
+        event = AnnotationEvent(pyramid_request, 'test_annotation_id', 'update')
+
+        subscribers.invalidate_annotation_cache(event)
+
+        annotation_cache.invalidate.assert_called_once_with('test_annotation_id')
+
+    def test_it_invalidates_each_annotation_of_a_batch(self, pyramid_config, pyramid_request):
+        annotation_cache = mock.Mock(spec_set=['invalidate'])
+        pyramid_config.register_service(annotation_cache, name='annotation_cache')
+        batch = AnnotationBatchEvent(pyramid_request, [
+            AnnotationEvent(pyramid_request, 'id-1', 'update'),
+            AnnotationEvent(pyramid_request, 'id-2', 'delete'),
+        ])
+
+        subscribers.invalidate_annotation_cache(batch)
+
+        assert annotation_cache.invalidate.call_args_list == [mock.call('id-1'),
+                                                              mock.call('id-2')]
+
+    def test_it_does_nothing_if_the_cache_is_disabled(self, pyramid_config, pyramid_request):
+        pyramid_config.register_service_factory(lambda context, request: None,
+                                                name='annotation_cache')
+        event = AnnotationEvent(pyramid_request, 'test_annotation_id', 'update')
+
+        subscribers.invalidate_annotation_cache(event)
+
+
+class TestInvalidateFacetCache(object):
+
+    def test_it_invalidates_the_annotations_group(self, pyramid_request, facet_cache):
+        event = AnnotationEvent(pyramid_request, 'test_annotation_id', 'update',
+                                groupid='abc123')
+
+        subscribers.invalidate_facet_cache(event)
+
+        facet_cache.invalidate.assert_called_once_with('abc123')
+
+    def test_it_invalidates_ungrouped_facets_if_group_unknown(self, pyramid_request, facet_cache):
+        event = AnnotationEvent(pyramid_request, 'test_annotation_id', 'update')
+
+        subscribers.invalidate_facet_cache(event)
+
+        facet_cache.invalidate.assert_called_once_with(None)
+
+    def test_it_invalidates_each_group_of_a_batch_once(self, pyramid_request, facet_cache):
+        batch = AnnotationBatchEvent(pyramid_request, [
+            AnnotationEvent(pyramid_request, 'id-1', 'create', groupid='abc123'),
+            AnnotationEvent(pyramid_request, 'id-2', 'create', groupid='abc123'),
+            AnnotationEvent(pyramid_request, 'id-3', 'create', groupid='def456'),
+        ])
+
+        subscribers.invalidate_facet_cache(batch)
+
+        assert sorted(facet_cache.invalidate.call_args_list) == [
+            mock.call('abc123'), mock.call('def456')]
+
+    @pytest.fixture
+    def facet_cache(self, pyramid_config):
+        facet_cache = mock.Mock(spec_set=['invalidate'])
+        pyramid_config.register_service(facet_cache, name='facet_cache')
+        return facet_cache
+
+
+class TestPurgeHTTPCache(object):
+
+    def test_it_purges_the_events_annotations(self, pyramid_request, http_cache, factories):
+        annotations = [factories.Annotation(), factories.Annotation()]
+        batch = AnnotationBatchEvent(pyramid_request, [
+            AnnotationEvent(pyramid_request, annotations[0].id, 'create'),
+            AnnotationEvent(pyramid_request, annotations[1].id, 'delete'),
+        ])
+
+        subscribers.purge_http_cache(batch)
+
+        purged = http_cache.purge.call_args[0][0]
+        assert sorted(purged, key=lambda a: a.id) == sorted(annotations, key=lambda a: a.id)
+
+    def test_it_does_nothing_without_a_purge_url(self, pyramid_request, http_cache, factories):
+        http_cache.purge_url = None
+        event = AnnotationEvent(pyramid_request, factories.Annotation().id, 'update')
+
+        subscribers.purge_http_cache(event)
+
+        assert not http_cache.purge.called
+
+    @pytest.fixture
+    def http_cache(self, pyramid_config):
+        http_cache = mock.Mock(spec_set=['purge', 'purge_url'])
+        http_cache.purge_url = 'http://localhost/purge'
+        pyramid_config.register_service(http_cache, name='http_cache')
+        return http_cache
+
+    @pytest.fixture
+    def pyramid_request(self, pyramid_request):
+        pyramid_request.tm = mock.MagicMock()
+        return pyramid_request
+
+
 @pytest.mark.usefixtures('fetch_annotation')
 class TestSendReplyNotifications(object):
     def test_calls_get_notification_with_request_annotation_and_action(self, fetch_annotation, pyramid_request):
@@ -131,6 +249,24 @@ class TestSendReplyNotifications(object):
                                               mock.sentinel.notification)
         assert send.lastcall == (['foo@example.com'], 'Your email', 'Text body', 'HTML body')
 
+    def test_it_handles_each_event_of_a_batch(self, fetch_annotation, pyramid_request):
+        get_notification = mock.Mock(spec_set=[], return_value=None)
+        batch = AnnotationBatchEvent(pyramid_request, [
+            AnnotationEvent(pyramid_request, 'id-1', 'create'),
+            AnnotationEvent(pyramid_request, 'id-2', 'update'),
+        ])
+
+        subscribers.send_reply_notifications(batch,
+                                             get_notification=get_notification,
+                                             generate_mail=mock.Mock(spec_set=[]),
+                                             send=FakeMailer())
+
+        assert fetch_annotation.call_args_list == [
+            mock.call(pyramid_request.db, 'id-1'),
+            mock.call(pyramid_request.db, 'id-2'),
+        ]
+        assert [c[0][2] for c in get_notification.call_args_list] == ['create', 'update']
+
     @pytest.fixture
     def fetch_annotation(self, patch):
         return patch('h.subscribers.storage.fetch_annotation')
@@ -4,6 +4,7 @@ from __future__ import unicode_literals
 
 from datetime import (datetime, timedelta)
 
+import mock
 import pytest
 
 from h.models import Annotation, AuthTicket, Token
@@ -46,6 +47,37 @@ class TestPurgeDeletedAnnotations(object):
         else:
             assert db_session.query(Annotation).count() == 1
 
+    def test_it_returns_the_number_of_purged_annotations(self, factories):
+        updated = datetime.utcnow() - timedelta(minutes=30)
+        factories.Annotation(deleted=True, updated=updated)
+        factories.Annotation(deleted=True, updated=updated)
+
+        assert purge_deleted_annotations() == 2
+
+    def test_it_purges_with_the_configured_limits(self, celery, purge):
+        celery.request.registry.settings.update({
+            'h.purge.batch_size': '50',
+            'h.purge.rate': '200',
+            'h.purge.time_budget': '30',
+        })
+
+        purge_deleted_annotations()
+
+        purge.purge.assert_called_once_with(mock.ANY,
+                                            commit=celery.request.tm.commit,
+                                            batch_size=50,
+                                            rate=200.0,
+                                            time_budget=30.0)
+
+    def test_it_purges_with_the_default_limits(self, celery, purge):
+        purge_deleted_annotations()
+
+        purge.purge.assert_called_once_with(mock.ANY,
+                                            commit=celery.request.tm.commit,
+                                            batch_size=1000,
+                                            rate=None,
+                                            time_budget=600.0)
+
 
 @pytest.mark.usefixtures('celery')
 class TestPurgeExpiredAuthTickets(object):
@@ -71,6 +103,11 @@ class TestPurgeExpiredAuthTickets(object):
         purge_expired_auth_tickets()
         assert db_session.query(AuthTicket).count() == 1
 
+    def test_it_returns_the_number_of_purged_tickets(self, factories):
+        factories.AuthTicket(expires=datetime(2014, 5, 6, 7, 8, 9))
+
+        assert purge_expired_auth_tickets() == 1
+
 
 @pytest.mark.usefixtures('celery')
 class TestPurgeExpiredTokens(object):
@@ -109,8 +146,16 @@ class TestPurgeRemovedFeatures(object):
         Feature.remove_old_flags.assert_called_once_with(db_session)
 
 
+@pytest.fixture
+def purge(patch):
+    purge = patch('h.tasks.cleanup.purge')
+    purge.DEFAULT_BATCH_SIZE = 1000
+    return purge
+
+
 @pytest.fixture
 def celery(patch, db_session):
     cel = patch('h.tasks.cleanup.celery', autospec=False)
     cel.request.db = db_session
+    cel.request.registry.settings = {}
     return cel
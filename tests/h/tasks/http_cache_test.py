@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import mock
+import pytest
+import requests
+
+from h.tasks import http_cache
+
+
+@pytest.mark.usefixtures('celery')
+class TestPurge(object):
+    def test_it_sends_a_purge_request(self, requests_request):
+        http_cache.purge(['uri:abc', 'group:def'])
+
+        requests_request.assert_called_once_with(
+            'PURGE', 'http://localhost/purge',
+            headers={'Surrogate-Key': 'uri:abc group:def'},
+            timeout=http_cache.TIMEOUT)
+        requests_request.return_value.raise_for_status.assert_called_once_with()
+
+    def test_it_does_nothing_without_a_purge_url(self, celery, requests_request):
+        del celery.request.registry.settings['h.http_cache.purge_url']
+
+        http_cache.purge(['uri:abc'])
+
+        assert not requests_request.called
+
+    def test_it_retries_if_the_request_fails(self, requests_request, retry):
+        requests_request.side_effect = requests.ConnectionError()
+
+        http_cache.purge(['uri:abc'])
+
+        assert retry.called
+
+    def test_it_retries_if_the_cache_returns_an_error(self, requests_request, retry):
+        response = requests_request.return_value
+        response.raise_for_status.side_effect = requests.HTTPError()
+
+        http_cache.purge(['uri:abc'])
+
+        assert retry.called
+
+    @pytest.fixture
+    def celery(self, patch):
+        cel = patch('h.tasks.http_cache.celery', autospec=False)
+        cel.request.registry.settings = {
+            'h.http_cache.purge_url': 'http://localhost/purge',
+        }
+        return cel
+
+    @pytest.fixture
+    def requests_request(self, patch):
+        return patch('h.tasks.http_cache.requests.request')
+
+    @pytest.fixture
+    def retry(self, patch):
+        http_cache.purge.retry = mock.Mock(spec_set=[])
+        yield http_cache.purge.retry
+        del http_cache.purge.retry
@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 
+import os
+import time
+
 import mock
 import pytest
 
@@ -105,6 +108,164 @@ class TestDeleteAnnotation(object):
         return patch('h.tasks.indexer.delete')
 
 
+@pytest.mark.usefixtures('celery', 'nipsa_service', 'settings_service')
+class TestIndexAnnotations(object):
+
+    def test_it_indexes_annotations_in_one_batch(self, BatchIndexer, celery):
+        indexer.index_annotations([batch_request('id-1', 'index'),
+                                   batch_request('id-2', 'index')])
+
+        BatchIndexer.assert_called_once_with(celery.request.db,
+                                             celery.request.es,
+                                             celery.request,
+                                             target_index=None)
+        BatchIndexer.return_value.index.assert_called_once_with(['id-1', 'id-2'])
+        assert not BatchIndexer.return_value.delete.called
+
+    def test_it_deletes_annotations_in_one_batch(self, BatchIndexer):
+        indexer.index_annotations([batch_request('id-1', 'delete'),
+                                   batch_request('id-2', 'delete')])
+
+        BatchIndexer.return_value.delete.assert_called_once_with(['id-1', 'id-2'])
+        assert not BatchIndexer.return_value.index.called
+
+    def test_it_deduplicates_ids(self, BatchIndexer):
+        indexer.index_annotations([batch_request('id-1', 'index'),
+                                   batch_request('id-1', 'index')])
+
+        BatchIndexer.return_value.index.assert_called_once_with(['id-1'])
+
+    def test_it_applies_the_latest_action_for_each_id(self, BatchIndexer):
+        indexer.index_annotations([batch_request('id-1', 'index'),
+                                   batch_request('id-2', 'index'),
+                                   batch_request('id-1', 'delete')])
+
+        BatchIndexer.return_value.index.assert_called_once_with(['id-2'])
+        BatchIndexer.return_value.delete.assert_called_once_with(['id-1'])
+
+    def test_during_reindex_writes_to_new_index(self, BatchIndexer, celery, settings_service):
+        settings_service.put(SETTING_NEW_INDEX, 'hypothesis-abcdef123')
+
+        indexer.index_annotations([batch_request('id-1', 'index')])
+
+        BatchIndexer.assert_any_call(celery.request.db,
+                                     celery.request.es,
+                                     celery.request,
+                                     target_index='hypothesis-abcdef123')
+        assert BatchIndexer.return_value.index.call_count == 2
+
+    def test_it_clears_the_nipsa_cache(self, BatchIndexer, nipsa_service):
+        indexer.index_annotations([batch_request('id-1', 'index')])
+
+        nipsa_service.clear.assert_called_once_with()
+
+    def test_it_ends_the_transaction(self, BatchIndexer, celery):
+        indexer.index_annotations([batch_request('id-1', 'index')])
+
+        celery.request.tm.abort.assert_called_once_with()
+
+    def test_it_ends_the_transaction_on_failure(self, BatchIndexer, celery):
+        BatchIndexer.return_value.index.side_effect = RuntimeError
+
+        with pytest.raises(RuntimeError):
+            indexer.index_annotations([batch_request('id-1', 'index')])
+
+        celery.request.tm.abort.assert_called_once_with()
+
+    @pytest.fixture
+    def BatchIndexer(self, patch):
+        BatchIndexer = patch('h.tasks.indexer.BatchIndexer')
+        BatchIndexer.return_value.index.return_value = set()
+        BatchIndexer.return_value.delete.return_value = set()
+        return BatchIndexer
+
+    @pytest.fixture
+    def nipsa_service(self, pyramid_config):
+        service = mock.Mock(spec_set=['clear'])
+        pyramid_config.register_service(service, name='nipsa')
+        return service
+
+
+def batch_request(*args):
+    return mock.Mock(args=args)
+
+
+class TestReindexStateCache(object):
+
+    def test_it_caches_the_loaded_value(self):
+        cache = indexer._ReindexStateCache()
+        load = mock.Mock(return_value='hypothesis-abcdef123')
+
+        cache.get(load)
+        result = cache.get(load)
+
+        assert result == 'hypothesis-abcdef123'
+        assert load.call_count == 1
+
+    def test_it_reloads_when_invalidated(self):
+        cache = indexer._ReindexStateCache()
+        load = mock.Mock(side_effect=[None, 'hypothesis-abcdef123'])
+
+        cache.get(load)
+        cache.invalidate()
+
+        assert cache.get(load) == 'hypothesis-abcdef123'
+
+    def test_it_reloads_when_expired(self):
+        clock = mock.Mock(return_value=100)
+        cache = indexer._ReindexStateCache(ttl=60, clock=clock)
+        load = mock.Mock(side_effect=[None, 'hypothesis-abcdef123'])
+
+        cache.get(load)
+        clock.return_value = 160
+
+        assert cache.get(load) == 'hypothesis-abcdef123'
+
+    def test_it_is_invalidated_in_forked_processes(self):
+        cache = indexer._ReindexStateCache()
+        cache.get(mock.Mock(return_value=None))
+
+        pid = os.fork()
+        if pid == 0:
+            # In the child: wait to be invalidated by the parent.
+            load = mock.Mock(return_value='hypothesis-abcdef123')
+            for _ in range(500):
+                if cache.get(load) is not None:
+                    os._exit(0)
+                time.sleep(0.01)
+            os._exit(1)
+
+        cache.invalidate()
+        _, status = os.waitpid(pid, 0)
+
+        assert status == 0
+
+
+def test_reindex_state_changed_invalidates_cache(patch):
+    reindex_state = patch('h.tasks.indexer._reindex_state')
+
+    indexer.reindex_state_changed(mock.sentinel.state)
+
+    reindex_state.invalidate.assert_called_once_with()
+
+
+def test_reindex_state_is_only_loaded_once(celery, settings_service):
+    settings_service.put(SETTING_NEW_INDEX, 'hypothesis-abcdef123')
+    settings_service.get = mock.Mock(wraps=settings_service.get)
+
+    indexer._current_reindex_new_name(celery.request)
+    result = indexer._current_reindex_new_name(celery.request)
+
+    assert result == 'hypothesis-abcdef123'
+    assert settings_service.get.call_count == 1
+
+
+@pytest.fixture(autouse=True)
+def reindex_state():
+    # Don't let cached reindex state leak between tests.
+    indexer._reindex_state.invalidate()
+
+
 @pytest.fixture
 def celery(patch, pyramid_request):
     cel = patch('h.tasks.indexer.celery')
@@ -115,6 +276,7 @@ def celery(patch, pyramid_request):
 @pytest.fixture
 def pyramid_request(pyramid_request):
     pyramid_request.es = mock.Mock()
+    pyramid_request.tm = mock.Mock()
     return pyramid_request
 
 
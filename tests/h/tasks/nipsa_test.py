@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import mock
+import pytest
 
 from h.tasks.nipsa import (
     add_nipsa,
@@ -24,70 +25,144 @@ def test_add_nipsa_action():
 
 
 def test_remove_nipsa_action():
-    annotation = {"_id": "test_id", "_source": {"nipsa": True, "foo": "bar"}}
+    annotation = {"_id": "test_id"}
     action = remove_nipsa_action("bar", annotation)
 
     assert action == {
-        "_op_type": "index",
+        "_op_type": "update",
         "_index": "bar",
         "_type": "annotation",
         "_id": "test_id",
-        "_source": {"foo": "bar"},
+        "doc": {"nipsa": False}
     }
 
 
-@mock.patch("h.tasks.nipsa.helpers", autospec=True)
-def test_bulk_update_annotations_scans_with_query(helpers):
-    client = mock.Mock(spec_set=['conn', 'index'])
-
-    bulk_update_annotations(client=client,
-                            query=mock.sentinel.query,
-                            action=mock.sentinel.action)
-
-    helpers.scan.assert_called_once_with(client=client.conn,
-                                         index=client.index,
-                                         query=mock.sentinel.query)
-
-
-@mock.patch("h.tasks.nipsa.helpers", autospec=True)
-def test_bulk_update_annotations_generates_actions_for_each_annotation(helpers):
-    action = mock.Mock(spec_set=[])
-    client = mock.Mock(spec_set=['conn', 'index'])
-    helpers.scan.return_value = [mock.sentinel.anno1,
-                                 mock.sentinel.anno2,
-                                 mock.sentinel.anno3]
-
-    bulk_update_annotations(client=client,
-                            query=mock.sentinel.query,
-                            action=action)
-
-    assert action.call_args_list == [
-        mock.call(client.index, mock.sentinel.anno1),
-        mock.call(client.index, mock.sentinel.anno2),
-        mock.call(client.index, mock.sentinel.anno3),
-    ]
-
-
-@mock.patch("h.tasks.nipsa.helpers", autospec=True)
-def test_bulk_update_annotations_calls_bulk_with_actions(helpers):
-    action = mock.Mock(spec_set=[], side_effect=[
-        mock.sentinel.action1,
-        mock.sentinel.action2,
-        mock.sentinel.action3,
-    ])
-    client = mock.Mock(spec_set=['conn', 'index'])
-    helpers.scan.return_value = [mock.sentinel.anno1,
-                                 mock.sentinel.anno2,
-                                 mock.sentinel.anno3]
-
-    bulk_update_annotations(client=client,
-                            query=mock.sentinel.query,
-                            action=action)
-
-    helpers.bulk.assert_called_once_with(client=client.conn,
-                                         actions=[mock.sentinel.action1,
-                                                  mock.sentinel.action2,
-                                                  mock.sentinel.action3])
+@pytest.mark.usefixtures('helpers', 'sleep')
+class TestBulkUpdateAnnotations(object):
+
+    def test_it_scans_with_query(self, client, helpers):
+        bulk_update_annotations(client=client,
+                                query=mock.sentinel.query,
+                                action=mock.sentinel.action)
+
+        helpers.scan.assert_called_once_with(client=client.conn,
+                                             index=client.index,
+                                             query=mock.sentinel.query,
+                                             _source=False)
+
+    def test_it_generates_actions_for_each_annotation(self, client, helpers):
+        action = mock.Mock(spec_set=[])
+        helpers.scan.return_value = [mock.sentinel.anno1,
+                                     mock.sentinel.anno2,
+                                     mock.sentinel.anno3]
+
+        bulk_update_annotations(client=client,
+                                query=mock.sentinel.query,
+                                action=action)
+
+        assert action.call_args_list == [
+            mock.call(client.index, mock.sentinel.anno1),
+            mock.call(client.index, mock.sentinel.anno2),
+            mock.call(client.index, mock.sentinel.anno3),
+        ]
+
+    def test_it_streams_actions_to_bulk_in_chunks(self, client, helpers, matchers):
+        helpers.streaming_bulk.side_effect = None
+        helpers.streaming_bulk.return_value = iter([])
+        action = mock.Mock(spec_set=[], side_effect=[
+            mock.sentinel.action1,
+            mock.sentinel.action2,
+            mock.sentinel.action3,
+        ])
+        helpers.scan.return_value = [mock.sentinel.anno1,
+                                     mock.sentinel.anno2,
+                                     mock.sentinel.anno3]
+
+        bulk_update_annotations(client=client,
+                                query=mock.sentinel.query,
+                                action=action,
+                                chunk_size=2)
+
+        helpers.streaming_bulk.assert_called_once_with(
+            client=client.conn,
+            actions=matchers.iterable_with([mock.sentinel.action1,
+                                            mock.sentinel.action2,
+                                            mock.sentinel.action3]),
+            chunk_size=2,
+            raise_on_error=False)
+
+    def test_it_does_not_collect_actions_in_memory(self, client, helpers):
+        helpers.scan.return_value = [{"_id": "id-1"}]
+
+        bulk_update_annotations(client=client,
+                                query=mock.sentinel.query,
+                                action=add_nipsa_action)
+
+        _, kwargs = helpers.streaming_bulk.call_args
+        assert not isinstance(kwargs['actions'], list)
+
+    def test_it_retries_failed_annotations(self, client, helpers):
+        helpers.scan.return_value = [{"_id": "id-1"}, {"_id": "id-2"}]
+        helpers.streaming_bulk.side_effect = [
+            bulk_results(failed=["id-2"], succeeded=["id-1"]),
+            bulk_results(succeeded=["id-2"]),
+        ]
+
+        failed = bulk_update_annotations(client=client,
+                                         query=mock.sentinel.query,
+                                         action=add_nipsa_action)
+
+        _, kwargs = helpers.streaming_bulk.call_args
+        assert list(kwargs['actions']) == [add_nipsa_action(client.index,
+                                                            {"_id": "id-2"})]
+        assert failed == set()
+
+    def test_it_backs_off_between_retries(self, client, helpers, sleep):
+        helpers.scan.return_value = [{"_id": "id-1"}]
+        helpers.streaming_bulk.side_effect = lambda **kwargs: bulk_results(
+            failed=[a["_id"] for a in kwargs['actions']])
+
+        bulk_update_annotations(client=client,
+                                query=mock.sentinel.query,
+                                action=add_nipsa_action,
+                                max_retries=3)
+
+        assert sleep.call_args_list == [mock.call(1), mock.call(2), mock.call(4)]
+
+    def test_it_returns_annotations_which_still_fail(self, client, helpers):
+        helpers.scan.return_value = [{"_id": "id-1"}, {"_id": "id-2"}]
+        helpers.streaming_bulk.side_effect = lambda **kwargs: bulk_results(
+            failed=[a["_id"] for a in kwargs['actions']])
+
+        failed = bulk_update_annotations(client=client,
+                                         query=mock.sentinel.query,
+                                         action=add_nipsa_action,
+                                         max_retries=2)
+
+        assert failed == set(["id-1", "id-2"])
+        assert helpers.streaming_bulk.call_count == 3
+
+    @pytest.fixture
+    def client(self):
+        return mock.Mock(spec_set=['conn', 'index'])
+
+    @pytest.fixture
+    def helpers(self, patch):
+        helpers = patch('h.tasks.nipsa.helpers')
+        helpers.streaming_bulk.side_effect = lambda **kwargs: bulk_results(
+            succeeded=[a for a in kwargs['actions']])
+        return helpers
+
+    @pytest.fixture
+    def sleep(self, patch):
+        return patch('h.tasks.nipsa.time.sleep')
+
+
+def bulk_results(failed=(), succeeded=()):
+    results = [(True, {"update": {"_id": id_}}) for id_ in succeeded]
+    results.extend((False, {"update": {"_id": id_, "error": "conflict"}})
+                   for id_ in failed)
+    return iter(results)
 
 
 @mock.patch("h.tasks.nipsa.bulk_update_annotations", autospec=True)
@@ -28,3 +28,8 @@ def test_utc_iso8601():
 def test_utc_iso8601_ignores_timezone():
     t = datetime.datetime(2016, 2, 24, 18, 3, 25, 7685, Berlin())
     assert utc_iso8601(t) == '2016-02-24T18:03:25.007685+00:00'
+
+
+def test_utc_iso8601_includes_zero_microseconds():
+    t = datetime.datetime(2016, 2, 24, 18, 3, 25)
+    assert utc_iso8601(t) == '2016-02-24T18:03:25.000000+00:00'
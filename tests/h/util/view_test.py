@@ -2,9 +2,12 @@
 
 from __future__ import unicode_literals
 
+import datetime
+
 import pytest
 from mock import Mock
 
+from h.util.view import annotation_validators
 from h.util.view import handle_exception, json_view, cors_json_view
 
 
@@ -38,6 +41,43 @@ class TestHandleException(object):
         return pyramid_request
 
 
+class TestAnnotationValidators(object):
+    def test_last_modified_is_the_updated_time(self, context, pyramid_request):
+        _, last_modified = annotation_validators(context, pyramid_request)
+
+        assert last_modified == context.annotation.updated
+
+    def test_etag_is_stable(self, context, pyramid_request):
+        etag, _ = annotation_validators(context, pyramid_request)
+
+        assert etag == annotation_validators(context, pyramid_request)[0]
+
+    def test_etag_changes_when_annotation_is_updated(self, context, pyramid_request):
+        etag, _ = annotation_validators(context, pyramid_request)
+        context.annotation.updated = datetime.datetime(2016, 2, 3, 4, 5, 7)
+
+        assert etag != annotation_validators(context, pyramid_request)[0]
+
+    def test_etag_depends_on_whether_caller_is_logged_in(self, context, pyramid_config, pyramid_request):
+        etag, _ = annotation_validators(context, pyramid_request)
+        pyramid_config.testing_securitypolicy('acct:jane@example.com')
+
+        assert etag != annotation_validators(context, pyramid_request)[0]
+
+    def test_etag_does_not_depend_on_which_user_is_logged_in(self, context, pyramid_config, pyramid_request):
+        policy = pyramid_config.testing_securitypolicy('acct:jane@example.com')
+        etag, _ = annotation_validators(context, pyramid_request)
+        policy.userid = 'acct:bob@example.com'
+
+        assert etag == annotation_validators(context, pyramid_request)[0]
+
+    @pytest.fixture
+    def context(self):
+        annotation = Mock(id='abc123',
+                          updated=datetime.datetime(2016, 2, 3, 4, 5, 6))
+        return Mock(annotation=annotation)
+
+
 @pytest.mark.usefixtures('view_config')
 class TestJsonView(object):
     def test_sets_accept(self):
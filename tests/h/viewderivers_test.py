@@ -2,8 +2,13 @@
 
 from __future__ import unicode_literals
 
+import datetime
+
+import mock
 import pytest
+from pyramid.request import Request
 
+from h.viewderivers import conditional_view
 from h.viewderivers import csp_protected_view
 
 
@@ -88,5 +93,104 @@ class TestCSPProtectedView(object):
         return _impl
 
 
+class TestConditionalView(object):
+
+    def test_noop_without_validators(self, make_request, derive_view, validators):
+        view = derive_view(_dummy_view)
+
+        response = view(None, make_request())
+
+        assert response.etag is None
+        assert not validators.called
+
+    def test_sets_validators_on_response(self, make_request, derive_view, validators):
+        request = make_request()
+        view = derive_view(_dummy_view, validators=validators)
+
+        response = view(mock.sentinel.context, request)
+
+        validators.assert_called_once_with(mock.sentinel.context, request)
+        assert response.status_code == 200
+        assert response.etag == 'abc123'
+        assert response.last_modified.replace(tzinfo=None) == datetime.datetime(2016, 2, 3, 4, 5, 6)
+
+    @pytest.mark.parametrize('if_none_match', ['"abc123"', 'W/"abc123"', '"other", "abc123"'])
+    def test_returns_304_when_etag_matches(self, make_request, derive_view, validators, if_none_match):
+        view = derive_view(_failing_view, validators=validators)
+
+        response = view(None, make_request({'If-None-Match': if_none_match}))
+
+        assert response.status_code == 304
+        assert response.etag == 'abc123'
+
+    def test_calls_view_when_etag_does_not_match(self, make_request, derive_view, validators):
+        request = make_request({'If-None-Match': '"other"',
+                                'If-Modified-Since': 'Sun, 01 Jan 2017 00:00:00 GMT'})
+        view = derive_view(_dummy_view, validators=validators)
+
+        response = view(None, request)
+
+        assert response.status_code == 200
+
+    @pytest.mark.parametrize('since,status', [
+        ('Wed, 03 Feb 2016 04:05:06 GMT', 304),
+        ('Wed, 03 Feb 2016 04:05:07 GMT', 304),
+        ('Wed, 03 Feb 2016 04:05:05 GMT', 200),
+    ])
+    def test_compares_if_modified_since(self, make_request, derive_view, validators, since, status):
+        view = derive_view(_dummy_view, validators=validators)
+
+        response = view(None, make_request({'If-Modified-Since': since}))
+
+        assert response.status_code == status
+
+    def test_ignores_other_methods(self, make_request, derive_view, validators):
+        request = make_request({'If-None-Match': '"abc123"'}, method='PATCH')
+        view = derive_view(_dummy_view, validators=validators, request_method='PATCH')
+
+        response = view(None, request)
+
+        assert response.status_code == 200
+        assert not validators.called
+
+    def test_does_not_set_validators_on_error_responses(self, make_request, derive_view, validators):
+        def error_view(request):
+            request.response.status_int = 404
+            return request.response
+        view = derive_view(error_view, validators=validators)
+
+        response = view(None, make_request())
+
+        assert response.etag is None
+
+    @pytest.fixture
+    def validators(self):
+        return mock.Mock(spec_set=[], return_value=(
+            'abc123', datetime.datetime(2016, 2, 3, 4, 5, 6, 789)))
+
+    @pytest.fixture
+    def make_request(self, pyramid_config):
+        def _impl(headers=None, method='GET'):
+            request = Request.blank('/test', headers=headers, method=method)
+            request.registry = pyramid_config.registry
+            return request
+        return _impl
+
+    @pytest.fixture
+    def derive_view(self, pyramid_config):
+        def _impl(view, **kwargs):
+            pyramid_config.add_view_deriver(conditional_view)
+            pyramid_config.add_route('testview', '/test')
+            pyramid_config.add_view(view, route_name='testview', **kwargs)
+            introspector = pyramid_config.registry.introspector
+            for view in introspector.get_category('views'):
+                if view['introspectable']['route_name'] == 'testview':
+                    return view['introspectable']['derived_callable']
+        return _impl
+
 def _dummy_view(request):
     return request.response
+
+
+def _failing_view(request):
+    raise AssertionError('view should not be called')
@@ -1,16 +1,21 @@
 # -*- coding: utf-8 -*-
 
+from datetime import datetime
+
 import mock
 import pytest
 
 from pyramid.config import Configurator
 from pyramid import testing
+from webob.multidict import MultiDict
 
+from memex.events import AnnotationBatchEvent
 from memex.resources import AnnotationResource
 from memex.schemas import ValidationError
 from memex.search.core import SearchResult
 
 from h import presenters
+from h.services.annotation_cache import AnnotationCacheService
 from h.views import api as views
 
 
@@ -129,6 +134,8 @@ class TestIndex(object):
         pyramid_config.add_route('api.search', '/dummy/search')
         pyramid_config.add_route('api.annotations', '/dummy/annotations')
         pyramid_config.add_route('api.annotation', '/dummy/annotations/:id')
+        pyramid_config.add_route('api.bulk', '/dummy/bulk')
+        pyramid_config.add_route('api.export', '/dummy/export')
 
         result = views.index(testing.DummyResource(), pyramid_request)
 
@@ -148,9 +155,13 @@ class TestIndex(object):
             host + '/dummy/annotations/:id')
         assert links['search']['method'] == 'GET'
         assert links['search']['url'] == host + '/dummy/search'
+        assert links['bulk']['method'] == 'POST'
+        assert links['bulk']['url'] == host + '/dummy/bulk'
+        assert links['export']['method'] == 'GET'
+        assert links['export']['url'] == host + '/dummy/export'
 
 
-@pytest.mark.usefixtures('group_service', 'links_service', 'search_lib')
+@pytest.mark.usefixtures('annotation_cache', 'group_service', 'http_cache', 'links_service', 'search_lib')
 class TestSearch(object):
 
     def test_it_searches(self, pyramid_request, search_lib):
@@ -164,13 +175,14 @@ class TestSearch(object):
                                              stats=pyramid_request.stats)
         search.run.assert_called_once_with(pyramid_request.params)
 
-    def test_it_loads_annotations_from_database(self, pyramid_request, search_run, storage):
+    def test_it_loads_annotations_from_database(self, annotation_cache, pyramid_request, search_run, storage):
         search_run.return_value = SearchResult(2, ['row-1', 'row-2'], [], {})
 
         views.search(pyramid_request)
 
         storage.fetch_ordered_annotations.assert_called_once_with(
-            pyramid_request.db, ['row-1', 'row-2'], query_processor=mock.ANY)
+            pyramid_request.db, ['row-1', 'row-2'], query_processor=mock.ANY,
+            cache=annotation_cache)
 
     def test_it_renders_search_results(self, links_service, pyramid_request, search_run, factories, group_service):
         ann1 = AnnotationResource(factories.Annotation(userid='luke'), group_service, links_service)
@@ -188,14 +200,15 @@ class TestSearch(object):
 
         assert views.search(pyramid_request) == expected
 
-    def test_it_loads_replies_from_database(self, pyramid_request, search_run, storage):
-        pyramid_request.params = {'_separate_replies': '1'}
+    def test_it_loads_replies_from_database(self, annotation_cache, pyramid_request, search_run, storage):
+        pyramid_request.params = MultiDict({'_separate_replies': '1'})
         search_run.return_value = SearchResult(1, ['row-1'], ['reply-1', 'reply-2'], {})
 
         views.search(pyramid_request)
 
         assert mock.call(pyramid_request.db, ['reply-1', 'reply-2'],
-                         query_processor=mock.ANY) in storage.fetch_ordered_annotations.call_args_list
+                         query_processor=mock.ANY,
+                         cache=annotation_cache) in storage.fetch_ordered_annotations.call_args_list
 
     def test_it_renders_replies(self, links_service, pyramid_request, search_run, factories, group_service):
         ann = AnnotationResource(factories.Annotation(userid='luke'), group_service, links_service)
@@ -206,7 +219,7 @@ class TestSearch(object):
                                                [ann.annotation.id],
                                                [reply1.annotation.id, reply2.annotation.id], {})
 
-        pyramid_request.params = {'_separate_replies': '1'}
+        pyramid_request.params = MultiDict({'_separate_replies': '1'})
 
         expected = {
             'total': 1,
@@ -219,6 +232,31 @@ class TestSearch(object):
 
         assert views.search(pyramid_request) == expected
 
+    def test_it_lets_shared_caches_store_uri_searches(self, http_cache, pyramid_request):
+        pyramid_request.params = MultiDict([('uri', 'http://example.com/a'),
+                                            ('url', 'http://example.com/b'),
+                                            ('group', 'abc123')])
+
+        views.search(pyramid_request)
+
+        http_cache.cache_if_anonymous.assert_called_once_with(
+            pyramid_request,
+            uris=['http://example.com/a', 'http://example.com/b'],
+            groupids=['abc123'])
+
+    def test_it_does_not_let_shared_caches_store_other_searches(self, http_cache, pyramid_request):
+        pyramid_request.params = MultiDict({'group': 'abc123'})
+
+        views.search(pyramid_request)
+
+        assert not http_cache.cache_if_anonymous.called
+
+    @pytest.fixture
+    def http_cache(self, pyramid_config):
+        service = mock.Mock(spec_set=['cache_if_anonymous'])
+        pyramid_config.register_service(service, name='http_cache')
+        return service
+
     @pytest.fixture
     def search_lib(self, patch):
         return patch('h.views.api.search_lib')
@@ -232,6 +270,131 @@ class TestSearch(object):
         return patch('h.views.api.storage')
 
 
+@pytest.mark.usefixtures('group_service', 'links_service', 'nipsa_service')
+class TestExportAnnotations(object):
+
+    def test_it_streams_the_export(self, export_annotations, links_service, pyramid_request):
+        response = views.export_annotations(pyramid_request)
+
+        assert response.content_type == 'application/x-ndjson'
+        assert response.app_iter == export_annotations.return_value
+        export_annotations.assert_called_once_with(
+            pyramid_request.registry['sqlalchemy.engine'],
+            mock.ANY,
+            links_service,
+            pyramid_request.auth_domain,
+            mock.ANY)
+
+    def test_it_exports_the_users_own_annotations(self, export_annotations, pyramid_request):
+        views.export_annotations(pyramid_request)
+
+        assert self.filters(export_annotations) == {
+            'userid': 'acct:alice@example.com',
+            'uris': [],
+            'since': None,
+            'until': None,
+        }
+
+    def test_it_filters_by_uri_and_time(self, export_annotations, pyramid_request):
+        pyramid_request.params = MultiDict([('uri', 'http://example.com/a'),
+                                            ('url', 'http://example.com/b'),
+                                            ('since', '2016-01-01'),
+                                            ('until', '2016-02-01T12:00:00+01:00')])
+
+        views.export_annotations(pyramid_request)
+
+        filters = self.filters(export_annotations)
+        assert filters['uris'] == ['http://example.com/a', 'http://example.com/b']
+        assert filters['since'] == datetime(2016, 1, 1)
+        assert filters['until'] == datetime(2016, 2, 1, 11, 0)
+
+    @pytest.mark.parametrize('param', ['since', 'until'])
+    def test_it_rejects_invalid_times(self, pyramid_request, param):
+        pyramid_request.params = MultiDict({param: 'not a time'})
+
+        with pytest.raises(views.APIError) as exc:
+            views.export_annotations(pyramid_request)
+
+        assert exc.value.status_code == 400
+
+    def test_it_forbids_exporting_another_users_annotations(self, pyramid_request):
+        pyramid_request.params = MultiDict({'user': 'acct:bob@example.com'})
+
+        with pytest.raises(views.APIError) as exc:
+            views.export_annotations(pyramid_request)
+
+        assert exc.value.status_code == 403
+
+    def test_it_exports_readable_annotations_in_a_group(self, export_annotations, group_service, pyramid_request):
+        pyramid_request.params = MultiDict({'group': 'abc123',
+                                            'user': 'acct:bob@example.com'})
+
+        views.export_annotations(pyramid_request)
+
+        group_service.find.assert_called_once_with('abc123')
+        filters = self.filters(export_annotations)
+        assert filters['groupid'] == 'abc123'
+        assert filters['userid'] == 'acct:bob@example.com'
+        assert filters['readable_by'] == 'acct:alice@example.com'
+
+    def test_it_excludes_nipsad_users_from_group_exports(self, export_annotations, nipsa_service, pyramid_request):
+        nipsa_service.flagged_userids = {'acct:alice@example.com',
+                                         'acct:bob@example.com'}
+        pyramid_request.params = MultiDict({'group': 'abc123'})
+
+        views.export_annotations(pyramid_request)
+
+        assert self.filters(export_annotations)['exclude_userids'] == {
+            'acct:bob@example.com'}
+
+    def test_it_404s_if_the_group_does_not_exist(self, group_service, pyramid_request):
+        group_service.find.return_value = None
+        pyramid_request.params = MultiDict({'group': 'abc123'})
+
+        with pytest.raises(views.APIError) as exc:
+            views.export_annotations(pyramid_request)
+
+        assert exc.value.status_code == 404
+
+    def test_it_404s_if_the_user_cannot_read_the_group(self, pyramid_config, pyramid_request):
+        pyramid_config.testing_securitypolicy('acct:alice@example.com',
+                                              permissive=False)
+        pyramid_request.params = MultiDict({'group': 'abc123'})
+
+        with pytest.raises(views.APIError) as exc:
+            views.export_annotations(pyramid_request)
+
+        assert exc.value.status_code == 404
+
+    def test_it_requires_a_user_to_export_the_public_group(self, pyramid_request):
+        pyramid_request.params = MultiDict({'group': '__world__'})
+
+        with pytest.raises(views.APIError) as exc:
+            views.export_annotations(pyramid_request)
+
+        assert exc.value.status_code == 400
+
+    def filters(self, export_annotations):
+        return export_annotations.call_args[0][1]
+
+    @pytest.fixture
+    def export_annotations(self, patch):
+        return patch('h.views.api.export.export_annotations')
+
+    @pytest.fixture
+    def nipsa_service(self, pyramid_config):
+        service = mock.Mock(spec_set=['flagged_userids'])
+        service.flagged_userids = set()
+        pyramid_config.register_service(service, name='nipsa')
+        return service
+
+    @pytest.fixture
+    def pyramid_config(self, pyramid_config):
+        pyramid_config.testing_securitypolicy('acct:alice@example.com')
+        pyramid_config.registry['sqlalchemy.engine'] = mock.sentinel.engine
+        return pyramid_config
+
+
 @pytest.mark.usefixtures('AnnotationEvent',
                          'AnnotationJSONPresenter',
                          'links_service',
@@ -319,10 +482,26 @@ class TestCreate(object):
 
         AnnotationEvent.assert_called_once_with(pyramid_request,
                                                 annotation.id,
-                                                'create')
+                                                'create',
+                                                groupid=annotation.groupid)
         pyramid_request.notify_after_commit.assert_called_once_with(
             AnnotationEvent.return_value)
 
+    def test_it_does_not_add_outbox_event_by_default(self, outbox, pyramid_request):
+        views.create(pyramid_request)
+
+        assert not outbox.add.called
+
+    def test_it_adds_outbox_event_if_enabled(self, outbox, pyramid_request, storage):
+        outbox.enabled.return_value = True
+
+        views.create(pyramid_request)
+
+        outbox.add.assert_called_once_with(
+            pyramid_request,
+            storage.create_annotation.return_value.id,
+            'create')
+
     def test_it_returns_presented_annotation(self,
                                              AnnotationJSONPresenter,
                                              pyramid_request):
@@ -465,7 +644,8 @@ class TestUpdate(object):
 
         AnnotationEvent.assert_called_once_with(pyramid_request,
                                                 storage.update_annotation.return_value.id,
-                                                'update')
+                                                'update',
+                                                groupid=storage.update_annotation.return_value.groupid)
 
     def test_it_fires_the_AnnotationEvent(self, AnnotationEvent, pyramid_request):
         views.update(mock.Mock(), pyramid_request)
@@ -542,7 +722,8 @@ class TestDelete(object):
 
         AnnotationEvent.assert_called_once_with(pyramid_request,
                                                 context.annotation.id,
-                                                'delete')
+                                                'delete',
+                                                groupid=context.annotation.groupid)
         pyramid_request.notify_after_commit.assert_called_once_with(event)
 
     def test_it_returns_object(self, pyramid_request):
@@ -553,6 +734,207 @@ class TestDelete(object):
         assert result == {'id': context.annotation.id, 'deleted': True}
 
 
+@pytest.mark.usefixtures('AnnotationJSONPresenter',
+                         'links_service',
+                         'group_service',
+                         'outbox',
+                         'storage')
+class TestBulk(object):
+
+    def test_it_raises_if_json_parsing_fails(self, pyramid_request):
+        type(pyramid_request).json_body = {}
+        with mock.patch.object(type(pyramid_request),
+                               'json_body',
+                               new_callable=mock.PropertyMock) as json_body:
+            json_body.side_effect = ValueError()
+            with pytest.raises(views.PayloadError):
+                views.bulk(pyramid_request)
+
+    @pytest.mark.parametrize('payload', [
+        [],
+        {},
+        {'operations': {'action': 'create'}},
+    ])
+    def test_it_raises_if_there_is_no_list_of_operations(self, pyramid_request, payload):
+        pyramid_request.json_body = payload
+
+        with pytest.raises(views.APIError) as exc:
+            views.bulk(pyramid_request)
+
+        assert exc.value.status_code == 400
+
+    def test_it_raises_if_there_are_too_many_operations(self, pyramid_request):
+        pyramid_request.json_body = {
+            'operations': [create_op()] * (views.MAX_BULK_OPERATIONS + 1)}
+
+        with pytest.raises(views.APIError) as exc:
+            views.bulk(pyramid_request)
+
+        assert exc.value.status_code == 400
+
+    def test_it_creates_the_annotations_together(self, pyramid_request, storage, group_service):
+        pyramid_request.json_body = {'operations': [
+            create_op('http://example.com/1'),
+            create_op('http://example.com/2'),
+        ]}
+
+        views.bulk(pyramid_request)
+
+        request, data_list, service = storage.create_annotations.call_args[0]
+        assert [d['target_uri'] for d in data_list] == ['http://example.com/1',
+                                                        'http://example.com/2']
+        assert service == group_service
+
+    def test_it_fetches_existing_annotations_with_one_query(self, pyramid_request, storage):
+        pyramid_request.json_body = {'operations': [
+            {'action': 'update', 'id': 'id-1', 'data': {}},
+            {'action': 'delete', 'id': 'id-2'},
+            create_op(),
+        ]}
+
+        views.bulk(pyramid_request)
+
+        storage.fetch_annotations_by_id.assert_called_once_with(
+            pyramid_request.db, set(['id-1', 'id-2']))
+
+    def test_it_updates_annotations(self, pyramid_request, storage, existing):
+        pyramid_request.json_body = {'operations': [
+            {'action': 'update', 'id': existing.id, 'data': {'text': 'new text'}},
+        ]}
+
+        views.bulk(pyramid_request)
+
+        session, id_, appstruct = storage.update_annotation.call_args[0]
+        assert (session, id_) == (pyramid_request.db, existing.id)
+        assert appstruct['text'] == 'new text'
+
+    def test_it_deletes_annotations(self, pyramid_request, storage, existing):
+        pyramid_request.json_body = {'operations': [
+            {'action': 'delete', 'id': existing.id},
+        ]}
+
+        result = views.bulk(pyramid_request)
+
+        storage.delete_annotation.assert_called_once_with(pyramid_request.db,
+                                                          existing.id)
+        assert result == {'results': [{'id': existing.id, 'deleted': True}]}
+
+    def test_it_returns_the_results_in_order(self, AnnotationJSONPresenter, pyramid_request, storage, existing):
+        storage.create_annotations.side_effect = None
+        storage.create_annotations.return_value = [mock.Mock(id='new-id')]
+        pyramid_request.json_body = {'operations': [
+            {'action': 'delete', 'id': existing.id},
+            create_op(),
+        ]}
+
+        result = views.bulk(pyramid_request)
+
+        assert result == {'results': [
+            {'id': existing.id, 'deleted': True},
+            AnnotationJSONPresenter.return_value.asdict.return_value,
+        ]}
+
+    @pytest.mark.parametrize('op,reason', [
+        ('not an object', 'Expected an object.'),
+        ({'action': 'frobnicate'}, "action: 'action' must be one of create, update or delete"),
+        ({'action': 'create', 'data': {}}, "uri: 'uri' is a required property"),
+        ({'action': 'delete', 'id': 'missing-id'}, 'id: Annotation missing-id does not exist'),
+    ])
+    def test_it_reports_invalid_operations(self, pyramid_request, op, reason):
+        pyramid_request.json_body = {'operations': [create_op(), op]}
+
+        result = views.bulk(pyramid_request)
+
+        assert pyramid_request.response.status_code == 400
+        assert result['results'] == [{'status': 'valid'},
+                                     {'status': 'failure', 'reason': reason}]
+
+    def test_it_reports_operations_the_user_may_not_perform(self, pyramid_config, pyramid_request, existing):
+        pyramid_config.testing_securitypolicy('acct:bob@example.com', permissive=False)
+        pyramid_request.json_body = {'operations': [
+            {'action': 'delete', 'id': existing.id},
+        ]}
+
+        result = views.bulk(pyramid_request)
+
+        assert result['results'] == [{
+            'status': 'failure',
+            'reason': 'id: You may not delete annotation {}'.format(existing.id),
+        }]
+
+    def test_it_applies_nothing_if_any_operation_is_invalid(self, pyramid_request, storage, existing):
+        pyramid_request.json_body = {'operations': [
+            create_op(),
+            {'action': 'delete', 'id': existing.id},
+            {'action': 'frobnicate'},
+        ]}
+
+        views.bulk(pyramid_request)
+
+        assert not storage.create_annotations.called
+        assert not storage.delete_annotation.called
+        assert not pyramid_request.notify_after_commit.called
+
+    def test_it_publishes_one_batch_event(self, pyramid_request, storage, existing):
+        created = mock.Mock(id='new-id', groupid='__world__')
+        storage.create_annotations.side_effect = None
+        storage.create_annotations.return_value = [created]
+        pyramid_request.json_body = {'operations': [
+            create_op(),
+            {'action': 'delete', 'id': existing.id},
+        ]}
+
+        views.bulk(pyramid_request)
+
+        event = pyramid_request.notify_after_commit.call_args[0][0]
+        assert isinstance(event, AnnotationBatchEvent)
+        assert [(e.annotation_id, e.action, e.groupid) for e in event.events] == [
+            ('new-id', 'create', '__world__'),
+            (existing.id, 'delete', existing.groupid),
+        ]
+
+    def test_it_adds_outbox_events_if_enabled(self, outbox, pyramid_request, storage, existing):
+        outbox.enabled.return_value = True
+        pyramid_request.json_body = {'operations': [
+            {'action': 'delete', 'id': existing.id},
+        ]}
+
+        views.bulk(pyramid_request)
+
+        outbox.add.assert_called_once_with(pyramid_request, existing.id, 'delete')
+
+    @pytest.fixture
+    def existing(self, factories, storage):
+        annotation = factories.Annotation.build(id='abcdefghijklmnopqrstuv',
+                                                userid=None)
+        storage.fetch_annotations_by_id.return_value = {annotation.id: annotation}
+        return annotation
+
+    @pytest.fixture
+    def pyramid_request(self, pyramid_request):
+        pyramid_request.json_body = {'operations': []}
+        pyramid_request.notify_after_commit = mock.Mock()
+        return pyramid_request
+
+    @pytest.fixture
+    def storage(self, storage):
+        storage.fetch_annotations_by_id.return_value = {}
+        storage.create_annotations.side_effect = lambda request, data_list, _: [
+            mock.Mock(id='new-id-{}'.format(i)) for i in range(len(data_list))]
+        return storage
+
+
+def create_op(uri='http://example.com'):
+    return {'action': 'create', 'data': {'uri': uri}}
+
+
+@pytest.fixture
+def annotation_cache(pyramid_config):
+    cache = mock.Mock(wraps=AnnotationCacheService())
+    pyramid_config.register_service(cache, name='annotation_cache')
+    return cache
+
+
 @pytest.fixture
 def AnnotationEvent(patch):
     return patch('h.views.api.AnnotationEvent')
@@ -588,6 +970,13 @@ def pyramid_request(pyramid_request):
     return pyramid_request
 
 
+@pytest.fixture
+def outbox(patch):
+    outbox = patch('h.views.api.outbox')
+    outbox.enabled.return_value = False
+    return outbox
+
+
 @pytest.fixture
 def search_lib(patch):
     return patch('h.views.api.search_lib')
@@ -37,6 +37,20 @@ def test_badge_returns_0_if_blocked(models, search_run):
     assert result == {'total': 0}
 
 
+@badge_fixtures
+@pytest.mark.parametrize('blocked', [True, False])
+def test_badge_lets_shared_caches_store_the_count(models, blocked):
+    request = mock.Mock(params={'uri': 'test_uri'})
+    models.Blocklist.is_blocked.return_value = blocked
+
+    badge(request)
+
+    request.find_service.assert_called_once_with(name='http_cache')
+    http_cache = request.find_service.return_value
+    http_cache.cache_if_anonymous.assert_called_once_with(request,
+                                                          uris=['test_uri'])
+
+
 @badge_fixtures
 def test_badge_raises_if_no_uri():
     with pytest.raises(httpexceptions.HTTPBadRequest):
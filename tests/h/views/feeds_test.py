@@ -8,7 +8,8 @@ import pytest
 from h.views.feeds import stream_atom, stream_rss
 
 
-@pytest.mark.usefixtures('fetch_ordered_annotations',
+@pytest.mark.usefixtures('annotation_cache',
+                         'fetch_ordered_annotations',
                          'render_atom',
                          'search_run',
                          'routes')
@@ -29,8 +30,20 @@ class TestStreamAtom(object):
 
         assert result == render_atom.return_value
 
+    def test_fetches_annotations_through_the_cache(self,
+                                                   annotation_cache,
+                                                   fetch_ordered_annotations,
+                                                   pyramid_request,
+                                                   search_run):
+        stream_atom(pyramid_request)
+
+        fetch_ordered_annotations.assert_called_once_with(
+            pyramid_request.db, search_run.return_value.annotation_ids,
+            cache=annotation_cache)
+
 
-@pytest.mark.usefixtures('fetch_ordered_annotations',
+@pytest.mark.usefixtures('annotation_cache',
+                         'fetch_ordered_annotations',
                          'render_rss',
                          'search_run',
                          'routes')
@@ -52,6 +65,13 @@ class TestStreamRSS(object):
         assert result == render_rss.return_value
 
 
+@pytest.fixture
+def annotation_cache(pyramid_config):
+    cache = mock.Mock(spec_set=['fetch', 'invalidate'])
+    pyramid_config.register_service(cache, name='annotation_cache')
+    return cache
+
+
 @pytest.fixture
 def fetch_ordered_annotations(patch):
     fetch_ordered_annotations = patch('h.views.feeds.fetch_ordered_annotations')
@@ -2,6 +2,8 @@
 
 from __future__ import unicode_literals
 
+import bleach
+from bleach import callbacks as linkify_callbacks
 import pytest
 
 from memex import markdown
@@ -24,6 +26,20 @@ class TestRender(object):
         markdown.render('foobar')
         sanitize.assert_called_once_with(markdown_render.return_value)
 
+    def test_it_caches_rendered_text(self, markdown_render, sanitize):
+        first = markdown.render('foobar')
+        second = markdown.render('foobar')
+
+        assert first == second
+        markdown_render.assert_called_once_with('foobar')
+        assert sanitize.call_count == 1
+
+    def test_it_renders_different_text_separately(self, markdown_render, sanitize):
+        markdown.render('foo')
+        markdown.render('bar')
+
+        assert sanitize.call_count == 2
+
     @pytest.fixture
     def markdown_render(self, patch):
         return patch('memex.markdown.markdown')
@@ -32,6 +48,39 @@ class TestRender(object):
     def sanitize(self, patch):
         return patch('memex.markdown.sanitize')
 
+    @pytest.fixture(autouse=True)
+    def render_cache(self):
+        markdown.render_cache.clear()
+
+
+class TestRenderCache(object):
+    def test_get_returns_stored_rendering(self):
+        cache = markdown.RenderCache()
+        cache.set('foobar', '<p>foobar</p>')
+
+        assert cache.get('foobar') == '<p>foobar</p>'
+
+    def test_get_returns_none_when_not_stored(self):
+        assert markdown.RenderCache().get('foobar') is None
+
+    def test_set_evicts_least_recently_used_entry_when_full(self):
+        cache = markdown.RenderCache(max_entries=2)
+        cache.set('one', '1')
+        cache.set('two', '2')
+        cache.get('one')
+
+        cache.set('three', '3')
+
+        assert cache.get('one') == '1'
+        assert cache.get('two') is None
+        assert cache.get('three') == '3'
+
+    def test_keys_unicode_and_byte_strings_alike(self):
+        cache = markdown.RenderCache()
+        cache.set('caf\xe9', 'rendered')
+
+        assert cache.get('caf\xe9'.encode('utf-8')) == 'rendered'
+
 
 class TestSanitize(object):
     @pytest.mark.parametrize("text,expected", [
@@ -81,3 +130,21 @@ class TestSanitize(object):
         expected = '<a href="https://example.org" rel="nofollow noopener" target="_blank">Hello</a>'
 
         assert actual == expected
+
+    @pytest.mark.parametrize("text", [
+        '<p>http://example.org</p>',
+        '<script>evil()</script> www.example.org',
+        '<a href="javascript:evil()">foo</a> http://example.org',
+        '<img src="/img.jpg" onerror="evil()"> example.org',
+        '<!-- comment --> <em>http://example.org/path?a=1</em>',
+    ])
+    def test_it_matches_separate_linkify_and_clean(self, text):
+        linkified = bleach.linkify(text, callbacks=[
+            linkify_callbacks.target_blank,
+            markdown.linkify_rel,
+        ])
+        expected = bleach.clean(linkified,
+                                tags=markdown.ALLOWED_TAGS,
+                                attributes=markdown.ALLOWED_ATTRIBUTES)
+
+        assert markdown.sanitize(text) == expected
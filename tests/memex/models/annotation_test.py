@@ -69,6 +69,35 @@ def test_text_setter_renders_markdown(markdown):
     annotation.text_rendered == markdown.render.return_value
 
 
+def test_text_setter_does_not_rerender_unchanged_text(markdown):
+    annotation = Annotation()
+    annotation.text = 'foobar'
+    markdown.render.reset_mock()
+
+    annotation.text = 'foobar'
+
+    assert not markdown.render.called
+
+
+def test_text_setter_rerenders_changed_text(markdown):
+    annotation = Annotation()
+    annotation.text = 'foobar'
+    markdown.render.reset_mock()
+
+    annotation.text = 'bazqux'
+
+    markdown.render.assert_called_once_with('bazqux')
+
+
+def test_text_setter_renders_unchanged_text_which_was_never_rendered(markdown):
+    markdown.render.return_value = '<p>foobar</p>'
+    annotation = Annotation(_text='foobar')
+
+    annotation.text = 'foobar'
+
+    assert annotation.text_rendered == '<p>foobar</p>'
+
+
 def test_setting_extras_inline_is_persisted(db_session, factories):
     """
     In-place changes to Annotation.extra should be persisted.
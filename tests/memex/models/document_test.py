@@ -54,6 +54,30 @@ class TestDocumentFindByURIs(object):
             db_session, ['https://de.wikipedia.org/wiki/Hauptseite'])
         assert actual.count() == 0
 
+    def test_with_many_uris(self, db_session):
+        document1 = document.Document()
+        document1.document_uris.append(document.DocumentURI(
+            claimant='http://example.com/one', uri='http://example.com/one'))
+        document2 = document.Document()
+        document2.document_uris.append(document.DocumentURI(
+            claimant='http://example.com/two', uri='http://example.com/two'))
+        document2.document_uris.append(document.DocumentURI(
+            claimant='http://example.com/2', uri='http://example.com/two'))
+        document3 = document.Document()
+        document3.document_uris.append(document.DocumentURI(
+            claimant='http://example.com/three',
+            uri='http://example.com/three'))
+        db_session.add_all([document1, document2, document3])
+        db_session.flush()
+
+        actual = document.Document.find_by_uris(db_session, [
+            'http://example.com/one',
+            'http://example.com/two',
+            'http://example.com/two/'])
+
+        assert sorted(actual.all(), key=lambda d: d.id) == [document1,
+                                                              document2]
+
 
 class TestDocumentFindOrCreateByURIs(object):
 
@@ -84,8 +108,7 @@ class TestDocumentFindOrCreateByURIs(object):
             ['https://en.wikipedia.org/wiki/http/en.m.wikipedia.org/wiki/Main_Page',
             'https://m.en.wikipedia.org/wiki/Main_Page'])
 
-        assert actual.count() == 1
-        assert actual.first() == document_
+        assert actual == [document_]
 
     def test_with_no_existing_documents(self, db_session):
         """When there are no matching Documents it creates and returns one."""
@@ -103,9 +126,9 @@ class TestDocumentFindOrCreateByURIs(object):
             'https://en.wikipedia.org/wiki/Pluto',
             ['https://m.en.wikipedia.org/wiki/Pluto'])
 
-        assert documents.count() == 1
+        assert len(documents) == 1
 
-        actual = documents.first()
+        actual = documents[0]
         assert isinstance(actual, document.Document)
         assert len(actual.document_uris) == 1
 
@@ -114,6 +137,46 @@ class TestDocumentFindOrCreateByURIs(object):
         assert docuri.uri == 'https://en.wikipedia.org/wiki/Pluto'
         assert docuri.type == 'self-claim'
 
+    def test_with_many_existing_documents(self, db_session):
+        """It returns all the matching documents, oldest first."""
+        documents = []
+        for uri in ['http://example.com/one', 'http://example.com/two']:
+            documents.append(document.Document())
+            documents[-1].document_uris.append(
+                document.DocumentURI(claimant=uri, uri=uri))
+            db_session.add(documents[-1])
+            db_session.flush()
+
+        actual = document.Document.find_or_create_by_uris(
+            db_session,
+            'http://example.com/two',
+            ['http://example.com/one'])
+
+        assert actual == documents
+
+    def test_finds_documents_with_a_single_query(self, db_session):
+        document_ = document.Document()
+        document_.document_uris.append(document.DocumentURI(
+            claimant='http://example.com/', uri='http://example.com/'))
+        db_session.add(document_)
+        db_session.flush()
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        sa.event.listen(db_session.bind, 'before_cursor_execute',
+                        before_cursor_execute)
+        try:
+            document.Document.find_or_create_by_uris(db_session,
+                                                     'http://example.com/',
+                                                     [])
+        finally:
+            sa.event.remove(db_session.bind, 'before_cursor_execute',
+                            before_cursor_execute)
+
+        assert len(statements) == 1
+
     def test_raises_retryable_error_when_flush_fails(self, db_session, monkeypatch):
         def err():
             raise sa.exc.IntegrityError(None, None, None)
@@ -620,6 +683,214 @@ class TestCreateOrUpdateDocumentMeta(object):
                 )
 
 
+@pytest.mark.usefixtures('log')
+class TestUpsertDocumentURIs(object):
+
+    def test_it_creates_new_DocumentURIs(self, db_session, doc):
+        now_ = now()
+
+        document.upsert_document_uris(db_session, doc, [
+            uri_dict('http://example.com/a'),
+            uri_dict('http://example.com/b', type_='rel-canonical'),
+        ], created=now_, updated=now_)
+
+        uris = db_session.query(document.DocumentURI).order_by('uri').all()
+        assert [(u.uri, u.type, u.document) for u in uris] == [
+            ('http://example.com/a', 'self-claim', doc),
+            ('http://example.com/b', 'rel-canonical', doc),
+        ]
+        assert [u.created for u in uris] == [now_, now_]
+
+    def test_it_updates_existing_DocumentURIs(self, db_session, doc):
+        created = yesterday()
+        existing = document.DocumentURI(document=doc,
+                                        created=created,
+                                        updated=created,
+                                        **uri_dict('http://example.com/a'))
+        db_session.add(existing)
+        db_session.flush()
+        now_ = now()
+
+        document.upsert_document_uris(db_session, doc,
+                                      [uri_dict('http://example.com/a')],
+                                      created=now_, updated=now_)
+
+        assert existing.created == created
+        assert existing.updated == now_
+        assert db_session.query(document.DocumentURI).count() == 1
+
+    def test_it_matches_normalized_uris(self, db_session, doc):
+        document.upsert_document_uris(db_session, doc,
+                                      [uri_dict('http://example.com/a')],
+                                      created=now(), updated=now())
+
+        document.upsert_document_uris(db_session, doc,
+                                      [uri_dict('http://example.com/a/')],
+                                      created=now(), updated=now())
+
+        assert db_session.query(document.DocumentURI).count() == 1
+
+    def test_it_collapses_equivalent_dicts(self, db_session, doc):
+        document.upsert_document_uris(db_session, doc, [
+            uri_dict('http://example.com/a'),
+            uri_dict('http://example.com/a'),
+        ], created=now(), updated=now())
+
+        assert db_session.query(document.DocumentURI).count() == 1
+
+    def test_it_reloads_the_documents_uris(self, db_session, doc):
+        assert doc.document_uris == []
+
+        document.upsert_document_uris(db_session, doc,
+                                      [uri_dict('http://example.com/a')],
+                                      created=now(), updated=now())
+
+        assert [u.uri for u in doc.document_uris] == ['http://example.com/a']
+
+    def test_it_uses_one_statement(self, db_session, doc):
+        with mock.patch.object(db_session, 'execute',
+                               wraps=db_session.execute) as execute:
+            document.upsert_document_uris(db_session, doc, [
+                uri_dict('http://example.com/{}'.format(i)) for i in range(10)
+            ], created=now(), updated=now())
+
+        assert execute.call_count == 1
+
+    def test_it_does_nothing_without_dicts(self, db_session, doc):
+        with mock.patch.object(db_session, 'execute') as execute:
+            document.upsert_document_uris(db_session, doc, [],
+                                          created=now(), updated=now())
+
+        assert not execute.called
+
+    def test_it_logs_a_warning_if_document_ids_differ(self, db_session, doc, log):
+        other = document.Document()
+        db_session.add(document.DocumentURI(document=other,
+                                            **uri_dict('http://example.com/a')))
+        db_session.flush()
+
+        document.upsert_document_uris(db_session, doc,
+                                      [uri_dict('http://example.com/a')],
+                                      created=now(), updated=now())
+
+        assert log.warn.call_count == 1
+
+    def test_raises_retryable_error_when_the_statement_fails(self, db_session, doc, monkeypatch):
+        def err(*args, **kwargs):
+            raise sa.exc.IntegrityError(None, None, None)
+        monkeypatch.setattr(db_session, 'execute', err)
+
+        with pytest.raises(document.ConcurrentUpdateError):
+            document.upsert_document_uris(db_session, doc,
+                                          [uri_dict('http://example.com/a')],
+                                          created=now(), updated=now())
+
+    @pytest.fixture
+    def doc(self, db_session):
+        doc = document.Document()
+        db_session.add(doc)
+        db_session.flush()
+        return doc
+
+
+@pytest.mark.usefixtures('log')
+class TestUpsertDocumentMeta(object):
+
+    def test_it_creates_new_DocumentMetas(self, db_session, doc):
+        document.upsert_document_meta(db_session, doc, [
+            meta_dict('title', ['The title']),
+            meta_dict('twitter.site', ['@example']),
+        ], created=now(), updated=now())
+
+        metas = db_session.query(document.DocumentMeta).order_by('type').all()
+        assert [(m.type, m.value, m.document) for m in metas] == [
+            ('title', ['The title'], doc),
+            ('twitter.site', ['@example'], doc),
+        ]
+
+    def test_it_updates_existing_DocumentMetas(self, db_session, doc):
+        created = yesterday()
+        existing = document.DocumentMeta(document=doc,
+                                         created=created,
+                                         updated=created,
+                                         **meta_dict('title', ['Old title']))
+        db_session.add(existing)
+        db_session.flush()
+        now_ = now()
+
+        document.upsert_document_meta(db_session, doc,
+                                      [meta_dict('title', ['New title'])],
+                                      created=now_, updated=now_)
+
+        assert existing.value == ['New title']
+        assert existing.created == created
+        assert existing.updated == now_
+        assert db_session.query(document.DocumentMeta).count() == 1
+
+    def test_it_keeps_the_last_of_equivalent_dicts(self, db_session, doc):
+        document.upsert_document_meta(db_session, doc, [
+            meta_dict('title', ['First title']),
+            meta_dict('title', ['Second title']),
+        ], created=now(), updated=now())
+
+        metas = db_session.query(document.DocumentMeta).all()
+        assert [m.value for m in metas] == [['Second title']]
+
+    def test_it_denormalizes_title_to_document_when_none(self, db_session, doc):
+        document.upsert_document_meta(db_session, doc,
+                                      [meta_dict('title', ['The title'])],
+                                      created=now(), updated=now())
+
+        assert doc.title == 'The title'
+
+    def test_it_skips_denormalizing_title_to_document_when_already_set(self, db_session, doc):
+        doc.title = 'Original title'
+
+        document.upsert_document_meta(db_session, doc,
+                                      [meta_dict('title', ['The title'])],
+                                      created=now(), updated=now())
+
+        assert doc.title == 'Original title'
+
+    def test_it_uses_one_statement(self, db_session, doc):
+        with mock.patch.object(db_session, 'execute',
+                               wraps=db_session.execute) as execute:
+            document.upsert_document_meta(db_session, doc, [
+                meta_dict('type-{}'.format(i), ['value']) for i in range(10)
+            ], created=now(), updated=now())
+
+        assert execute.call_count == 1
+
+    def test_it_logs_a_warning_if_document_ids_differ(self, db_session, doc, log):
+        other = document.Document()
+        db_session.add(document.DocumentMeta(document=other,
+                                             **meta_dict('title', ['Title'])))
+        db_session.flush()
+
+        document.upsert_document_meta(db_session, doc,
+                                      [meta_dict('title', ['Title'])],
+                                      created=now(), updated=now())
+
+        assert log.warn.call_count == 1
+
+    def test_raises_retryable_error_when_the_statement_fails(self, db_session, doc, monkeypatch):
+        def err(*args, **kwargs):
+            raise sa.exc.IntegrityError(None, None, None)
+        monkeypatch.setattr(db_session, 'execute', err)
+
+        with pytest.raises(document.ConcurrentUpdateError):
+            document.upsert_document_meta(db_session, doc,
+                                          [meta_dict('title', ['Title'])],
+                                          created=now(), updated=now())
+
+    @pytest.fixture
+    def doc(self, db_session):
+        doc = document.Document()
+        db_session.add(doc)
+        db_session.flush()
+        return doc
+
+
 @pytest.mark.usefixtures('merge_data')
 class TestMergeDocuments(object):
 
@@ -675,6 +946,58 @@ class TestMergeDocuments(object):
         assert 0 == \
             db_session.query(models.Annotation).filter_by(document_id=duplicate_2.id).count()
 
+    def test_merge_documents_updates_loaded_annotations(self, db_session, merge_data):
+        master, duplicate_1, _ = merge_data
+        annotation = models.Annotation(userid='luke', document=duplicate_1)
+        db_session.add(annotation)
+        db_session.flush()
+
+        document.merge_documents(db_session, merge_data)
+
+        assert annotation.document_id == master.id
+        assert annotation.document == master
+
+    def test_merge_documents_sets_updated_of_moved_claims(self, db_session, merge_data):
+        master, duplicate_1, _ = merge_data
+        docuri = duplicate_1.document_uris[0]
+        docmeta = duplicate_1.meta[0]
+        updated = datetime.datetime(2016, 1, 1)
+
+        document.merge_documents(db_session, merge_data, updated=updated)
+
+        assert docuri.document == master
+        assert docuri.updated == updated
+        assert docmeta.document == master
+        assert docmeta.updated == updated
+
+    def test_merge_documents_removes_duplicates_from_the_session(self, db_session, merge_data):
+        _, duplicate_1, duplicate_2 = merge_data
+
+        document.merge_documents(db_session, merge_data)
+
+        assert duplicate_1 not in db_session
+        assert duplicate_2 not in db_session
+
+    def test_merge_documents_locks_documents_in_id_order(self, db_session, merge_data):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        sa.event.listen(db_session.bind, 'before_cursor_execute',
+                        before_cursor_execute)
+        try:
+            document.merge_documents(db_session, merge_data)
+        finally:
+            sa.event.remove(db_session.bind, 'before_cursor_execute',
+                            before_cursor_execute)
+
+        locks = [s for s in statements if 'FOR UPDATE' in s]
+        assert len(locks) == 1
+        assert 'ORDER BY document.id' in locks[0]
+        assert statements.index(locks[0]) < min(
+            i for i, s in enumerate(statements) if s.startswith('UPDATE'))
+
     def test_raises_retryable_error_when_flush_fails(self, db_session, merge_data, monkeypatch):
         def err():
             raise sa.exc.IntegrityError(None, None, None)
@@ -725,6 +1048,7 @@ class TestMergeDocuments(object):
         return (master, duplicate_1, duplicate_2)
 
 
+@pytest.mark.usefixtures('upsert_document_meta', 'upsert_document_uris')
 class TestUpdateDocumentMetadata(object):
 
     def test_it_uses_the_target_uri_to_get_the_document(self,
@@ -778,8 +1102,9 @@ class TestUpdateDocumentMetadata(object):
             merge_documents,
             session):
         """If it finds more than one document it calls merge_documents()."""
-        Document.find_or_create_by_uris.return_value = mock.Mock(
-            count=mock.Mock(return_value=3))
+        Document.find_or_create_by_uris.return_value = [mock.Mock(),
+                                                        mock.Mock(),
+                                                        mock.Mock()]
 
         document.update_document_metadata(session,
                                           annotation.target_uri,
@@ -793,15 +1118,15 @@ class TestUpdateDocumentMetadata(object):
             Document.find_or_create_by_uris.return_value,
             updated=annotation.updated)
 
-    def test_it_calls_first(self, annotation, session, Document):
-        """If it finds only one document it calls first()."""
-        Document.find_or_create_by_uris.return_value = mock.Mock(
-            count=mock.Mock(return_value=1))
+    def test_it_uses_the_only_document(self, annotation, session, Document, merge_documents):
+        """If it finds only one document it doesn't merge documents."""
+        document_ = mock.Mock()
+        Document.find_or_create_by_uris.return_value = [document_]
 
-        document.update_document_metadata(session, annotation, [], [])
+        result = document.update_document_metadata(session, annotation, [], [])
 
-        Document.find_or_create_by_uris.return_value\
-            .first.assert_called_once_with()
+        assert not merge_documents.called
+        assert result == document_
 
     def test_it_updates_document_updated(self,
                                          annotation,
@@ -811,8 +1136,7 @@ class TestUpdateDocumentMetadata(object):
         yesterday_ = "yesterday"
         document_ = merge_documents.return_value = mock.Mock(
             updated=yesterday_)
-        Document.find_or_create_by_uris.return_value.first.return_value = (
-            document_)
+        Document.find_or_create_by_uris.return_value = [document_]
 
         document.update_document_metadata(session,
                                           annotation.target_uri,
@@ -827,9 +1151,8 @@ class TestUpdateDocumentMetadata(object):
                                             session,
                                             annotation,
                                             Document,
-                                            create_or_update_document_uri):
-        """It creates or updates a DocumentURI for each document URI dict."""
-        Document.find_or_create_by_uris.return_value.count.return_value = 1
+                                            upsert_document_uris):
+        """It creates or updates DocumentURIs for the document URI dicts."""
 
         document_uri_dicts = [
             {
@@ -859,15 +1182,12 @@ class TestUpdateDocumentMetadata(object):
                                           annotation.created,
                                           annotation.updated)
 
-        assert create_or_update_document_uri.call_count == 3
-        for doc_uri_dict in document_uri_dicts:
-            create_or_update_document_uri.assert_any_call(
-                session=session,
-                document=Document.find_or_create_by_uris.return_value.first.return_value,
-                created=annotation.created,
-                updated=annotation.updated,
-                **doc_uri_dict
-            )
+        upsert_document_uris.assert_called_once_with(
+            session,
+            Document.find_or_create_by_uris.return_value[0],
+            document_uri_dicts,
+            created=annotation.created,
+            updated=annotation.updated)
 
     def test_it_updates_document_web_uri(self,
                                          annotation,
@@ -875,8 +1195,7 @@ class TestUpdateDocumentMetadata(object):
                                          factories,
                                          session):
         document_ = mock.Mock(web_uri=None)
-        Document.find_or_create_by_uris.return_value.count.return_value = 1
-        Document.find_or_create_by_uris.return_value.first.return_value = document_
+        Document.find_or_create_by_uris.return_value = [document_]
 
         document.update_document_metadata(session,
                                           annotation.target_uri,
@@ -889,12 +1208,10 @@ class TestUpdateDocumentMetadata(object):
 
     def test_it_saves_all_the_document_metas(self,
                                              annotation,
-                                             create_or_update_document_meta,
+                                             upsert_document_meta,
                                              Document,
                                              session):
-        """It creates or updates a DocumentMeta for each document meta dict."""
-        Document.find_or_create_by_uris.return_value.count\
-            .return_value = 1
+        """It creates or updates DocumentMetas for the document meta dicts."""
 
         document_meta_dicts = [
             {
@@ -921,22 +1238,18 @@ class TestUpdateDocumentMetadata(object):
                                           annotation.created,
                                           annotation.updated)
 
-        assert create_or_update_document_meta.call_count == 3
-        for document_meta_dict in document_meta_dicts:
-            create_or_update_document_meta.assert_any_call(
-                session=session,
-                document=Document.find_or_create_by_uris.return_value.first.return_value,
-                created=annotation.created,
-                updated=annotation.updated,
-                **document_meta_dict
-            )
+        upsert_document_meta.assert_called_once_with(
+            session,
+            Document.find_or_create_by_uris.return_value[0],
+            document_meta_dicts,
+            created=annotation.created,
+            updated=annotation.updated)
 
     def test_it_returns_a_document(self,
                                    annotation,
-                                   create_or_update_document_meta,
+                                   upsert_document_meta,
                                    Document,
                                    session):
-        Document.find_or_create_by_uris.return_value.count.return_value = 1
 
         result = document.update_document_metadata(session,
                                                    annotation.target_uri,
@@ -945,23 +1258,25 @@ class TestUpdateDocumentMetadata(object):
                                                    annotation.created,
                                                    annotation.updated)
 
-        assert result == Document.find_or_create_by_uris.return_value.first.return_value
+        assert result == Document.find_or_create_by_uris.return_value[0]
 
     @pytest.fixture
     def annotation(self):
         return mock.Mock(spec=models.Annotation())
 
     @pytest.fixture
-    def create_or_update_document_meta(self, patch):
-        return patch('memex.models.document.create_or_update_document_meta')
+    def upsert_document_meta(self, patch):
+        return patch('memex.models.document.upsert_document_meta')
 
     @pytest.fixture
-    def create_or_update_document_uri(self, patch):
-        return patch('memex.models.document.create_or_update_document_uri')
+    def upsert_document_uris(self, patch):
+        return patch('memex.models.document.upsert_document_uris')
 
     @pytest.fixture
     def Document(self, patch):
-        return patch('memex.models.document.Document')
+        Document = patch('memex.models.document.Document')
+        Document.find_or_create_by_uris.return_value = [mock.Mock()]
+        return Document
 
     @pytest.fixture
     def merge_documents(self, patch):
@@ -980,6 +1295,19 @@ def yesterday():
     return now() - datetime.timedelta(days=1)
 
 
+def uri_dict(uri, type_='self-claim'):
+    return {'claimant': 'http://example.com/claimant',
+            'uri': uri,
+            'type': type_,
+            'content_type': ''}
+
+
+def meta_dict(type_, value):
+    return {'claimant': 'http://example.com/claimant',
+            'type': type_,
+            'value': value}
+
+
 def mock_db_session():
     """Return a mock db session object."""
     class DB(object):
@@ -11,13 +11,26 @@ from pyramid.authorization import ACLAuthorizationPolicy
 from memex.resources import AnnotationResourceFactory, AnnotationResource
 
 
-@pytest.mark.usefixtures('group_service', 'links_service')
+@pytest.mark.usefixtures('annotation_cache', 'group_service', 'links_service')
 class TestAnnotationResourceFactory(object):
-    def test_get_item_fetches_annotation(self, pyramid_request, storage):
+    def test_get_item_fetches_annotation_through_the_cache(self, pyramid_request, storage, annotation_cache):
+        factory = AnnotationResourceFactory(pyramid_request)
+
+        factory['123']
+        storage.fetch_annotation.assert_called_once_with(pyramid_request.db,
+                                                         '123',
+                                                         cache=annotation_cache)
+
+    @pytest.mark.parametrize('method', ['POST', 'PUT', 'PATCH', 'DELETE'])
+    def test_get_item_does_not_use_the_cache_for_writes(self, pyramid_request, storage, method):
+        pyramid_request.method = method
         factory = AnnotationResourceFactory(pyramid_request)
 
         factory['123']
-        storage.fetch_annotation.assert_called_once_with(pyramid_request.db, '123')
+
+        storage.fetch_annotation.assert_called_once_with(pyramid_request.db,
+                                                         '123',
+                                                         cache=None)
 
     def test_get_item_returns_annotation_resource(self, pyramid_request, storage):
         factory = AnnotationResourceFactory(pyramid_request)
@@ -58,6 +71,12 @@ class TestAnnotationResourceFactory(object):
     def storage(self, patch):
         return patch('memex.resources.storage')
 
+    @pytest.fixture
+    def annotation_cache(self, pyramid_config):
+        cache = Mock(spec_set=['fetch'])
+        pyramid_config.register_service(cache, name='annotation_cache')
+        return cache
+
     @pytest.fixture
     def group_service(self, pyramid_config):
         group_service = Mock(spec_set=['find'])
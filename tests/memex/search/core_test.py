@@ -1,5 +1,6 @@
 import mock
 import pytest
+from elasticsearch.exceptions import ConnectionTimeout
 
 from memex.search import core
 
@@ -114,6 +115,80 @@ class TestSearch(object):
         # This should not raise
         search.search_annotations({})
 
+    def test_search_annotations_records_query_in_query_log(self, pyramid_request, query_log):
+        stats = FakeStatsdClient()
+        search = core.Search(pyramid_request, stats=stats)
+
+        search.search_annotations({})
+
+        query_log.record.assert_called_once_with(
+            search.builder.shape,
+            search.es.conn.search.call_args[1]['body'],
+            search.es.conn.search.return_value,
+            duration=mock.ANY,
+            outcome='success',
+            stats=stats)
+
+    def test_search_replies_records_query_in_query_log(self, pyramid_request, query_log):
+        search = core.Search(pyramid_request, separate_replies=True)
+
+        search.search_replies(['id-1'])
+
+        query_log.record.assert_called_once_with(
+            search.reply_builder.shape,
+            search.es.conn.search.call_args[1]['body'],
+            search.es.conn.search.return_value,
+            duration=mock.ANY,
+            outcome='success',
+            stats=None)
+
+    def test_search_annotations_records_timed_out_queries(self, pyramid_request, query_log):
+        search = core.Search(pyramid_request)
+        search.es.conn.search.side_effect = ConnectionTimeout()
+
+        with pytest.raises(ConnectionTimeout):
+            search.search_annotations({})
+
+        query_log.record.assert_called_once_with(
+            search.builder.shape,
+            search.es.conn.search.call_args[1]['body'],
+            None,
+            duration=mock.ANY,
+            outcome='timeout',
+            stats=None)
+
+    def test_search_annotations_records_failed_queries(self, pyramid_request, query_log):
+        search = core.Search(pyramid_request)
+        search.es.conn.search.side_effect = ValueError()
+
+        with pytest.raises(ValueError):
+            search.search_annotations({})
+
+        assert query_log.record.call_args[1]['outcome'] == 'error'
+
+    def test_search_annotations_coalesces_identical_searches(self, pyramid_config, pyramid_request):
+        singleflight = mock.Mock(spec_set=['do'])
+        singleflight.do.return_value = (dummy_search_results(0), True)
+        pyramid_config.registry[core.singleflight.SINGLEFLIGHT_KEY] = singleflight
+        search = core.Search(pyramid_request)
+
+        search.search_annotations({})
+
+        key, _ = singleflight.do.call_args[0]
+        assert key[0] == 'anonymous'
+        assert not search.es.conn.search.called
+
+    def test_search_annotations_counts_coalesced_searches(self, pyramid_config, pyramid_request):
+        singleflight = mock.Mock(spec_set=['do'])
+        singleflight.do.return_value = (dummy_search_results(0), True)
+        pyramid_config.registry[core.singleflight.SINGLEFLIGHT_KEY] = singleflight
+        stats = mock.Mock(spec_set=['pipeline', 'incr'])
+        search = core.Search(pyramid_request, stats=stats)
+
+        search.search_annotations({})
+
+        stats.incr.assert_called_once_with('memex.search.query.coalesced')
+
     def test_search_replies_skips_search_by_default(self, pyramid_request):
         search = core.Search(pyramid_request)
         search.search_replies(['id-1', 'id-2'])
@@ -229,6 +304,12 @@ class TestSearch(object):
     def log(self, patch):
         return patch('memex.search.core.log')
 
+    @pytest.fixture
+    def query_log(self, pyramid_config):
+        query_log = mock.Mock(spec_set=['record'])
+        pyramid_config.registry[core.QUERY_LOG_KEY] = query_log
+        return query_log
+
 
 # @search_fixtures
 # def test_search_logs_a_warning_if_there_are_too_many_replies(log, pyramid_request):
@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import datetime
+
 import mock
 import pytest
 
 import elasticsearch
+import sqlalchemy.orm
 
 from h import presenters
 from memex.search import client
@@ -100,7 +103,7 @@ class TestBatchIndexer(object):
         indexer.index()
 
         streaming_bulk.assert_called_once_with(
-            indexer.es_client.conn, matchers.iterable_with([ann_1, ann_2]),
+            indexer.es_client.conn, matchers.iterable_with_ids([ann_1.id, ann_2.id]),
             chunk_size=mock.ANY, raise_on_error=False, expand_action_callback=mock.ANY)
 
     def test_index_skips_deleted_annotations_when_indexing_all(self, db_session, indexer, matchers, streaming_bulk, factories):
@@ -112,7 +115,7 @@ class TestBatchIndexer(object):
         indexer.index()
 
         streaming_bulk.assert_called_once_with(
-            indexer.es_client.conn, matchers.iterable_with([ann_1, ann_2]),
+            indexer.es_client.conn, matchers.iterable_with_ids([ann_1.id, ann_2.id]),
             chunk_size=mock.ANY, raise_on_error=False, expand_action_callback=mock.ANY)
 
     def test_index_indexes_filtered_annotations_to_es(self, db_session, indexer, matchers, streaming_bulk, factories):
@@ -121,7 +124,7 @@ class TestBatchIndexer(object):
         indexer.index([ann_2.id])
 
         streaming_bulk.assert_called_once_with(
-            indexer.es_client.conn, matchers.iterable_with([ann_2]),
+            indexer.es_client.conn, matchers.iterable_with_ids([ann_2.id]),
             chunk_size=mock.ANY, raise_on_error=False, expand_action_callback=mock.ANY)
 
     def test_index_skips_deleted_annotations_when_indexing_filtered(self, db_session, indexer, matchers, streaming_bulk, factories):
@@ -134,7 +137,7 @@ class TestBatchIndexer(object):
         indexer.index([ann_2.id])
 
         streaming_bulk.assert_called_once_with(
-            indexer.es_client.conn, matchers.iterable_with([ann_2]),
+            indexer.es_client.conn, matchers.iterable_with_ids([ann_2.id]),
             chunk_size=mock.ANY, raise_on_error=False, expand_action_callback=mock.ANY)
 
     def test_index_correctly_presents_bulk_actions(self,
@@ -231,6 +234,51 @@ class TestBatchIndexer(object):
             rendered
         )
 
+    def test_index_presents_annotation_documents(self,
+                                                 db_session,
+                                                 indexer,
+                                                 streaming_bulk,
+                                                 factories):
+        document = factories.Document(title='Example', web_uri='http://example.com')
+        annotation = factories.Annotation(document=document,
+                                          references=[factories.Annotation().id])
+        db_session.flush()
+        results = []
+
+        def fake_streaming_bulk(*args, **kwargs):
+            callback = kwargs.get('expand_action_callback')
+            for row in args[1]:
+                results.append(callback(row)[1])
+            return set()
+
+        streaming_bulk.side_effect = fake_streaming_bulk
+
+        indexer.index([annotation.id])
+
+        rendered = presenters.AnnotationSearchIndexPresenter(annotation).asdict()
+        assert results == [rendered]
+        assert set(rendered['document']) == set(['title', 'web_uri'])
+
+    def test_index_does_not_create_events_without_subscribers(self,
+                                                              db_session,
+                                                              indexer,
+                                                              streaming_bulk,
+                                                              factories,
+                                                              AnnotationTransformEvent):
+        factories.Annotation()
+
+        def fake_streaming_bulk(*args, **kwargs):
+            callback = kwargs.get('expand_action_callback')
+            for row in args[1]:
+                callback(row)
+            return set()
+
+        streaming_bulk.side_effect = fake_streaming_bulk
+
+        indexer.index()
+
+        assert not AnnotationTransformEvent.called
+
     def test_index_returns_failed_bulk_actions_for_default_op_type(self, db_session, indexer, streaming_bulk, factories):
         ann_success_1, ann_success_2 = factories.Annotation(), factories.Annotation()
         ann_fail_1, ann_fail_2 = factories.Annotation(), factories.Annotation()
@@ -287,6 +335,83 @@ class TestBatchIndexer(object):
         result = indexer.index()
         assert len(result) == 0
 
+    def test_index_window_indexes_annotations_in_window(self, db_session, indexer, matchers, streaming_bulk, factories):
+        ann_1 = factories.Annotation(updated=datetime.datetime(2016, 1, 1))
+        ann_2 = factories.Annotation(updated=datetime.datetime(2016, 2, 1))
+        factories.Annotation(updated=datetime.datetime(2016, 3, 1))
+        factories.Annotation(updated=datetime.datetime(2016, 1, 15), deleted=True)
+
+        indexer.index_window(index.Window(datetime.datetime(2016, 1, 1),
+                                          datetime.datetime(2016, 3, 1)))
+
+        streaming_bulk.assert_called_once_with(
+            indexer.es_client.conn, matchers.iterable_with_ids([ann_1.id, ann_2.id]),
+            chunk_size=mock.ANY, raise_on_error=False, expand_action_callback=mock.ANY)
+
+    @pytest.mark.parametrize('method,args', [
+        ('index', ()),
+        ('index', (['AVxOO3jVmdnI6Dr8ktFOEA'],)),
+        ('index_window', (index.Window(None, None),)),
+    ])
+    def test_it_streams_annotations_with_the_fetch_size(self, db_session, es, pyramid_request, streaming_bulk, method, args):
+        indexer = index.BatchIndexer(db_session, es, pyramid_request,
+                                     fetch_size=50)
+        streaming_bulk.side_effect = lambda conn, rows, **kwargs: list(rows)
+        yield_per = sqlalchemy.orm.Query.yield_per
+
+        with mock.patch.object(sqlalchemy.orm.Query, 'yield_per',
+                               autospec=True,
+                               side_effect=yield_per) as spy:
+            getattr(indexer, method)(*args)
+
+        spy.assert_called_once_with(mock.ANY, 50)
+
+    def test_delete_writes_deleted_markers_in_bulk(self, indexer, streaming_bulk):
+        actions = []
+
+        def fake_streaming_bulk(*args, **kwargs):
+            actions.extend(args[1])
+            return []
+
+        streaming_bulk.side_effect = fake_streaming_bulk
+
+        indexer.delete(['id-1', 'id-2'])
+
+        assert actions == [
+            {'_op_type': 'index',
+             '_index': 'hypothesis',
+             '_type': 'annotation',
+             '_id': id_,
+             '_source': {'deleted': True}}
+            for id_ in ['id-1', 'id-2']]
+
+    def test_delete_writes_to_target_index(self, db_session, es, pyramid_request, streaming_bulk):
+        indexer = index.BatchIndexer(db_session, es, pyramid_request,
+                                     target_index='hypothesis-new')
+        actions = []
+
+        def fake_streaming_bulk(*args, **kwargs):
+            actions.extend(args[1])
+            return []
+
+        streaming_bulk.side_effect = fake_streaming_bulk
+
+        indexer.delete(['id-1'])
+
+        assert actions[0]['_index'] == 'hypothesis-new'
+
+    def test_delete_returns_failed_bulk_actions(self, indexer, streaming_bulk):
+        def fake_streaming_bulk(*args, **kwargs):
+            for action in args[1]:
+                ok = action['_id'] != 'id-2'
+                yield (ok, {'index': {'_id': action['_id']}})
+
+        streaming_bulk.side_effect = fake_streaming_bulk
+
+        result = indexer.delete(['id-1', 'id-2'])
+
+        assert result == set(['id-2'])
+
     @pytest.fixture
     def indexer(self, db_session, es, pyramid_request):
         return index.BatchIndexer(db_session, es, pyramid_request)
@@ -300,6 +425,35 @@ class TestBatchIndexer(object):
         return patch('memex.search.index.es_helpers.streaming_bulk')
 
 
+class TestAnnotationWindows(object):
+    def test_it_splits_annotations_into_windows(self, db_session, factories):
+        for month in range(1, 6):
+            factories.Annotation(updated=datetime.datetime(2016, month, 1))
+        factories.Annotation(updated=datetime.datetime(2016, 2, 15), deleted=True)
+        db_session.flush()
+
+        windows = index.annotation_windows(db_session, windowsize=2)
+
+        assert windows == [
+            index.Window(datetime.datetime(2016, 1, 1), datetime.datetime(2016, 3, 1)),
+            index.Window(datetime.datetime(2016, 3, 1), datetime.datetime(2016, 5, 1)),
+            index.Window(datetime.datetime(2016, 5, 1), None),
+        ]
+
+    def test_it_only_includes_annotations_updated_since(self, db_session, factories):
+        for month in range(1, 6):
+            factories.Annotation(updated=datetime.datetime(2016, month, 1))
+        db_session.flush()
+
+        windows = index.annotation_windows(db_session, windowsize=2,
+                                           since=datetime.datetime(2016, 2, 15))
+
+        assert windows == [
+            index.Window(datetime.datetime(2016, 3, 1), datetime.datetime(2016, 5, 1)),
+            index.Window(datetime.datetime(2016, 5, 1), None),
+        ]
+
+
 @pytest.fixture
 def es():
     mock_es = mock.Mock(spec=client.Client('localhost', 'hypothesis'))
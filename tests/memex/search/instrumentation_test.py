@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import mock
+import pytest
+
+from memex.search import instrumentation
+from memex.search.query import QueryShape
+
+
+class TestFingerprint(object):
+    def test_ignores_literal_values(self):
+        one = {'query': {'terms': {'target.scope': ['http://a.com']}}, 'size': 20}
+        two = {'query': {'terms': {'target.scope': ['http://b.com',
+                                                    'http://c.com']}},
+               'size': 200}
+
+        assert instrumentation.fingerprint(one)[0] == instrumentation.fingerprint(two)[0]
+
+    def test_distinguishes_query_structure(self):
+        one = {'query': {'terms': {'target.scope': ['http://a.com']}}}
+        two = {'query': {'terms': {'user': ['acct:a@example.com']}}}
+
+        assert instrumentation.fingerprint(one)[0] != instrumentation.fingerprint(two)[0]
+
+    def test_ignores_caller_supplied_match_fields(self):
+        one = {'query': {'bool': {'must': [{'match': {'junk1': 'x'}}]}}}
+        two = {'query': {'bool': {'must': [{'match': {'junk2': 'x'}}]}}}
+
+        assert instrumentation.fingerprint(one)[0] == instrumentation.fingerprint(two)[0]
+
+    def test_ignores_caller_supplied_sort_fields(self):
+        one = {'sort': [{'updated': {'order': 'desc'}}]}
+        two = {'sort': [{'junk': {'order': 'asc'}}]}
+
+        assert instrumentation.fingerprint(one)[0] == instrumentation.fingerprint(two)[0]
+
+    def test_returns_normalized_body(self):
+        body = {'query': {'bool': {'must': [{'match': {'tags': 'foo'}}]}}}
+
+        _, normalized = instrumentation.fingerprint(body)
+
+        assert normalized == '{"query":{"bool":{"must":[{"match":{"?":"?"}}]}}}'
+
+
+class TestQueryLog(object):
+    def test_aggregates_timings_per_fingerprint(self, query_log):
+        query_log.record(shape(), {'size': 20}, response(took=10))
+        query_log.record(shape(), {'size': 200}, response(took=30))
+
+        [(_, fp_stats)] = query_log.summary()
+        assert fp_stats.count == 2
+        assert fp_stats.total_took == 40
+        assert fp_stats.max_took == 30
+        assert fp_stats.mean_took == 20
+
+    def test_summary_orders_by_total_time(self, query_log):
+        query_log.record(shape(), {'size': 20}, response(took=10))
+        query_log.record(shape(), {'from': 0}, response(took=50))
+
+        summary = query_log.summary()
+
+        assert [s.total_took for _, s in summary] == [50, 10]
+
+    def test_bounds_the_number_of_fingerprints(self, clock):
+        query_log = instrumentation.QueryLog(max_fingerprints=2, clock=clock)
+
+        query_log.record(shape(), {'one': 1}, response())
+        query_log.record(shape(), {'two': 1}, response())
+        query_log.record(shape(), {'one': 1}, response())
+        query_log.record(shape(), {'three': 1}, response())
+
+        normalized = set(s.normalized for _, s in query_log.summary())
+        assert normalized == {'{"one":"?"}', '{"three":"?"}'}
+
+    def test_records_failed_queries(self, query_log):
+        query_log.record(shape(), {'size': 20}, None, duration=10000,
+                         outcome='timeout')
+        query_log.record(shape(), {'size': 20}, None, duration=20,
+                         outcome='error')
+
+        [(_, fp_stats)] = query_log.summary()
+        assert fp_stats.timeout_count == 1
+        assert fp_stats.error_count == 1
+        assert fp_stats.max_took == 10000
+
+    def test_logs_queries_over_threshold(self, query_log, log):
+        query_log.record(shape(), {'size': 20}, response(took=150))
+
+        assert log.warn.call_count == 1
+        assert query_log.summary()[0][1].slow_count == 1
+
+    def test_logs_timed_out_queries(self, query_log, log):
+        query_log.record(shape(), {'size': 20}, None, duration=50,
+                         outcome='timeout')
+
+        assert log.warn.call_count == 1
+
+    def test_does_not_log_queries_under_threshold(self, query_log, log):
+        query_log.record(shape(), {'size': 20}, response(took=99))
+
+        assert not log.warn.called
+
+    def test_does_not_log_queries_without_threshold(self, clock, log):
+        query_log = instrumentation.QueryLog(clock=clock)
+
+        query_log.record(shape(), {'size': 20}, response(took=10000))
+
+        assert not log.warn.called
+
+    def test_periodically_logs_summary(self, query_log, clock, log):
+        query_log.record(shape(), {'size': 20}, response(took=10))
+        assert not log.info.called
+
+        clock.return_value += 60
+        query_log.record(shape(), {'size': 20}, response(took=10))
+
+        assert log.info.call_count == 1
+
+    def test_publishes_metrics(self, query_log):
+        stats = mock.Mock(spec_set=['pipeline'])
+        pipeline = stats.pipeline.return_value
+
+        query_log.record(shape(), {'size': 20}, response(took=10, failed=2),
+                         stats=stats)
+
+        digest, _ = instrumentation.fingerprint({'size': 20})
+        pipeline.timing.assert_any_call('memex.search.query.took', 10)
+        pipeline.timing.assert_any_call(
+            'memex.search.query.fingerprint.' + digest, 10)
+        pipeline.incr.assert_called_once_with(
+            'memex.search.query.shard_failures', 2)
+        pipeline.send.assert_called_once_with()
+
+    def test_publishes_metrics_per_filter_and_matcher(self, query_log):
+        stats = mock.Mock(spec_set=['pipeline'])
+        pipeline = stats.pipeline.return_value
+
+        query_log.record(shape(), {'size': 20}, response(took=10), stats=stats)
+
+        pipeline.timing.assert_any_call('memex.search.query.filter.UriFilter', 10)
+        pipeline.timing.assert_any_call('memex.search.query.matcher.AnyMatcher', 10)
+        pipeline.timing.assert_any_call('memex.search.query.matcher.match', 10)
+        names = [c[0][0] for c in pipeline.timing.call_args_list]
+        assert 'memex.search.query.matcher.match:junk' not in names
+
+    @pytest.fixture
+    def clock(self):
+        return mock.Mock(spec_set=[], return_value=1000.0)
+
+    @pytest.fixture
+    def query_log(self, clock):
+        return instrumentation.QueryLog(slow_threshold=100,
+                                        report_interval=60,
+                                        clock=clock)
+
+    @pytest.fixture
+    def log(self, patch):
+        return patch('memex.search.instrumentation.log')
+
+
+class TestGetQueryLog(object):
+    def test_reads_threshold_from_settings(self):
+        query_log = instrumentation.get_query_log(
+            {'es.slow_query_threshold': '500'})
+
+        assert query_log.slow_threshold == 500
+
+    def test_threshold_defaults_to_none(self):
+        assert instrumentation.get_query_log({}).slow_threshold is None
+
+    def test_reads_report_interval_from_settings(self):
+        query_log = instrumentation.get_query_log(
+            {'es.query_report_interval': '60'})
+
+        assert query_log.report_interval == 60
+
+
+def shape():
+    return QueryShape(filters=['DeletedFilter', 'UriFilter'],
+                      matchers=['AnyMatcher', 'match:junk'],
+                      aggregations=[],
+                      sort=['updated'],
+                      size=20)
+
+
+def response(took=0, failed=0):
+    return {'took': took,
+            'hits': {'total': 0, 'hits': []},
+            '_shards': {'total': 5, 'successful': 5 - failed, 'failed': failed}}
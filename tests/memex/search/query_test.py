@@ -249,6 +249,22 @@ class TestBuilder(object):
             "foobar": {"terms": {"field": "foo"}}
         }
 
+    def test_records_query_shape(self):
+        builder = query.Builder()
+        builder.append_filter(query.DeletedFilter())
+        builder.append_filter(query.GroupFilter())
+        builder.append_matcher(query.TagsMatcher())
+        builder.append_aggregation(query.TagsAggregation())
+
+        builder.build({"tag": "foo", "text": "bar", "limit": 50})
+
+        assert builder.shape == query.QueryShape(
+            filters=["DeletedFilter"],
+            matchers=["TagsMatcher", "match:text"],
+            aggregations=["tags"],
+            sort=["updated"],
+            size=50)
+
 
 class TestAuthFilter(object):
     def test_unauthenticated(self):
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import threading
+import time
+
+import mock
+import pytest
+
+from memex.search import singleflight
+
+
+class TestSingleFlight(object):
+    def test_do_returns_the_result_of_the_call(self):
+        sf = singleflight.SingleFlight()
+
+        assert sf.do('key', lambda: 'result') == ('result', False)
+
+    def test_do_does_not_cache_finished_calls(self):
+        sf = singleflight.SingleFlight()
+        fn = mock.Mock(spec_set=[], return_value='result')
+
+        sf.do('key', fn)
+        sf.do('key', fn)
+
+        assert fn.call_count == 2
+
+    def test_do_raises_the_calls_exception(self):
+        sf = singleflight.SingleFlight()
+
+        def fn():
+            raise ValueError('boom')
+
+        with pytest.raises(ValueError):
+            sf.do('key', fn)
+
+    def test_concurrent_calls_share_one_call(self):
+        sf = singleflight.SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return 'result'
+
+        results = []
+
+        def worker():
+            results.append(sf.do('key', fn))
+
+        leader = threading.Thread(target=worker)
+        leader.start()
+        started.wait()
+        done = WaitCountingEvent(sf._calls['key'].done)
+        sf._calls['key'].done = done
+
+        followers = [threading.Thread(target=worker) for _ in range(5)]
+        for t in followers:
+            t.start()
+        # Don't let the leader finish until all the followers are waiting.
+        while done.waiting < 5:
+            time.sleep(0.001)
+        release.set()
+        for t in [leader] + followers:
+            t.join()
+
+        assert len(calls) == 1
+        assert sorted(results) == [('result', False)] + [('result', True)] * 5
+
+    def test_concurrent_calls_with_different_keys_are_not_shared(self):
+        sf = singleflight.SingleFlight()
+        fn = mock.Mock(spec_set=[], return_value='result')
+
+        sf.do('one', fn)
+        sf.do('two', fn)
+
+        assert fn.call_count == 2
+
+
+class TestSearchKey(object):
+    def test_distinguishes_anonymous_and_authenticated_searches(self, pyramid_config, pyramid_request):
+        anonymous = singleflight.search_key(pyramid_request, 'index', {})
+        pyramid_config.testing_securitypolicy('acct:jane@example.com')
+        authenticated = singleflight.search_key(pyramid_request, 'index', {})
+
+        assert anonymous != authenticated
+
+    def test_is_independent_of_dict_ordering(self, pyramid_request):
+        one = singleflight.search_key(pyramid_request, 'index', {'a': 1, 'b': 2})
+        two = singleflight.search_key(pyramid_request, 'index', {'b': 2, 'a': 1})
+
+        assert one == two
+
+    def test_distinguishes_query_bodies(self, pyramid_request):
+        one = singleflight.search_key(pyramid_request, 'index', {'a': 1})
+        two = singleflight.search_key(pyramid_request, 'index', {'a': 2})
+
+        assert one != two
+
+
+class WaitCountingEvent(object):
+    def __init__(self, event):
+        self.event = event
+        self.waiters = []
+
+    @property
+    def waiting(self):
+        return len(self.waiters)
+
+    def wait(self):
+        self.waiters.append(threading.current_thread())
+        self.event.wait()
+
+    def set(self):
+        self.event.set()
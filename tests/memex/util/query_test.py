@@ -9,6 +9,8 @@ import pytest
 import sqlalchemy as sa
 
 from memex import models  # noqa
+from memex.util.query import column_window
+from memex.util.query import column_window_bounds
 from memex.util.query import column_windows
 
 
@@ -70,6 +72,31 @@ class TestColumnWindows(object):
 
         assert window_query_results(db_session, windows, filter_) == expected
 
+    def test_window_bounds(self, db_session):
+        testdata = [{'name': l, 'enabled': True}
+                    for l in string.lowercase]
+        db_session.execute(test_cw.insert().values(testdata))
+
+        bounds = column_window_bounds(db_session,
+                                      test_cw.c.name,
+                                      windowsize=10)
+
+        assert bounds == [('a', 'k'), ('k', 'u'), ('u', None)]
+
+    def test_windows_from_bounds(self, db_session):
+        testdata = [{'name': l, 'enabled': True}
+                    for l in string.lowercase]
+        db_session.execute(test_cw.insert().values(testdata))
+
+        bounds = column_window_bounds(db_session,
+                                      test_cw.c.name,
+                                      windowsize=10)
+        windows = [column_window(test_cw.c.name, start, end)
+                   for start, end in bounds]
+
+        assert window_query_results(db_session, windows) == [
+            'abcdefghij', 'klmnopqrst', 'uvwxyz']
+
 
 def window_query_results(session, windows, filter_=None):
     """